@@ -9,10 +9,13 @@ PROJECT_ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
 # 仮想環境のPythonインタープリタへのパス
 VENV_PYTHON="$PROJECT_ROOT/venv/bin/python"
 
+# 常駐ワーカー（2回目以降はPillowの読み込みを省略して起動する）
+RUNNER="$PROJECT_ROOT/resize_common/daemon.py"
+
 while true; do
   # Python 実行
   echo "😎 16:9比率（960x540）に画像をリサイズし、WebP形式で出力します..."
-  "$VENV_PYTHON" "$SCRIPT_DIR/16:9_resize_images.py"
+  "$VENV_PYTHON" "$RUNNER" run "$SCRIPT_DIR/16:9_resize_images.py"
   if [ $? -eq 0 ]; then
     echo "🥳完了しました。"
   else
@@ -9,6 +9,9 @@ PROJECT_ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
 # 仮想環境のPythonインタープリタへのパス
 VENV_PYTHON="$PROJECT_ROOT/venv/bin/python"
 
+# 常駐ワーカー（2回目以降はPillowの読み込みを省略して起動する）
+RUNNER="$PROJECT_ROOT/resize_common/daemon.py"
+
 while true; do
   # ユーザーに画像サイズを入力してもらう
   read -p "画像サイズを入力してください（例: 960）: " image_size
@@ -21,7 +24,7 @@ while true; do
   
   # Python 実行
   echo "😎 1:1比率（${image_size}x${image_size}）に画像をリサイズします..."
-  "$VENV_PYTHON" "$SCRIPT_DIR/1:1_resize_images.py" "$image_size"
+  "$VENV_PYTHON" "$RUNNER" run "$SCRIPT_DIR/1:1_resize_images.py" "$image_size"
   
   if [ $? -eq 0 ]; then
     echo "🥳完了しました。"
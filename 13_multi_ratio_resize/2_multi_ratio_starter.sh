@@ -0,0 +1,43 @@
+#!/bin/bash
+# スクリプトのディレクトリに切り替え
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+cd "$SCRIPT_DIR" || exit 1
+
+# プロジェクトのルートディレクトリを特定
+PROJECT_ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
+
+# 仮想環境のPythonインタープリタへのパス
+VENV_PYTHON="$PROJECT_ROOT/venv/bin/python"
+
+# 常駐ワーカー（2回目以降はPillowの読み込みを省略して起動する）
+RUNNER="$PROJECT_ROOT/resize_common/daemon.py"
+
+while true; do
+  # 1:1の画像サイズを入力してもらう（空欄の場合は1:1を出力しない）
+  read -p "1:1の画像サイズを入力してください（例: 960、不要な場合は空欄）: " image_size
+
+  if [ -n "$image_size" ] && ! [[ "$image_size" =~ ^[0-9]+$ ]]; then
+    echo "エラー: 数字を入力してください"
+    continue
+  fi
+
+  # Python 実行
+  echo "😎 3:2 / 16:9 / 4:3${image_size:+ / 1:1（${image_size}x${image_size}）}の全比率に画像をリサイズします..."
+  if [ -n "$image_size" ]; then
+    "$VENV_PYTHON" "$RUNNER" run "$SCRIPT_DIR/multi_ratio_resize_images.py" "$image_size"
+  else
+    "$VENV_PYTHON" "$RUNNER" run "$SCRIPT_DIR/multi_ratio_resize_images.py"
+  fi
+
+  if [ $? -eq 0 ]; then
+    echo "🥳完了しました。"
+  else
+    echo "😢失敗しました。"
+  fi
+
+  read -p "もう一度実行しますか？ (y/n): " yn
+  case $yn in
+    [Yy]* ) continue;;
+    * ) echo "終了します。"; break;;
+  esac
+done
@@ -0,0 +1,274 @@
+import os
+import sys
+import argparse
+
+# プロジェクトルートの共通モジュール（resize_common）を読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resize_common.aspect import crop_to_ratio, pad_to_square
+from resize_common.cli import (add_dedup_argument, add_encode_cache_arguments, add_memory_budget_argument,
+                               add_shrink_on_load_argument, add_threads_argument, add_webp_profile_arguments)
+from resize_common.dedup import dedup_summary, new_dedup, print_dedup_report
+from resize_common.encode_cache import (cache_summary, evict_cache, lookup_output, new_encode_cache,
+                                        print_cache_report, store_output)
+from resize_common.encoding import (add_encode_sample, new_encode_stats, print_encode_report, save_webp_measured,
+                                    webp_options_from_args)
+from resize_common.folders import clear_folder
+from resize_common.image_loading import decode_key, open_decoded, reduce_for_target
+from resize_common.manifest import job_digest
+from resize_common.memory_budget import budget_summary, estimate_file_memory, new_memory_budget
+from resize_common.output import link_or_copy
+from resize_common.pipeline import run_pipeline
+from resize_common.run_report import new_run_report, record_image, timed, timed_iter, write_run_report
+from resize_common.scanner import iter_image_files
+
+# フォルダ設定
+input_folder = "0_input_images"
+output_folder = "2_output_images"
+
+# 出力プロファイル（名前: (幅, 高さ)）
+# 3:2 / 16:9 / 4:3 はそれぞれ 9_ / 10_ / 11_ のツールと同じ中央切り取り、
+# 1:1 は 12_ のツールと同じ白背景の正方形化（サイズは引数で指定）。
+# 縮小読み込みもプロファイルごとに各ツールと同じ大きさで行うため、出力は各ツールと画素単位で一致する
+RATIO_PROFILES = {
+    "3:2": (900, 600),
+    "16:9": (960, 540),
+    "4:3": (960, 720),
+}
+SQUARE_PROFILE = "1:1"
+
+def parse_args(argv=None):
+    """コマンド引数を解析する（1:1の画像サイズ、出力するプロファイル）"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("square_size", nargs="?", type=int,
+                        help="1:1の画像サイズ（省略時は1:1を出力しない）")
+    parser.add_argument("--profiles", default=None,
+                        help="出力する比率をカンマ区切りで指定（例: 3:2,16:9）。省略時は全て")
+    add_shrink_on_load_argument(parser)
+    add_threads_argument(parser)
+    add_memory_budget_argument(parser)
+    add_dedup_argument(parser)
+    add_encode_cache_arguments(parser)
+    add_webp_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.square_size is not None and args.square_size <= 0:
+        parser.error("画像サイズは正の整数である必要があります")
+
+    available = list(RATIO_PROFILES) + [SQUARE_PROFILE]
+    if args.profiles is None:
+        profiles = list(RATIO_PROFILES)
+        if args.square_size is not None:
+            profiles.append(SQUARE_PROFILE)
+    else:
+        profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+        unknown = [p for p in profiles if p not in available]
+        if unknown:
+            parser.error(f"不明なプロファイル: {', '.join(unknown)}（指定可能: {', '.join(available)}）")
+        if SQUARE_PROFILE in profiles and args.square_size is None:
+            parser.error("1:1を出力するには画像サイズを指定してください")
+    args.profiles = profiles
+    return args
+
+def profile_size(profile, square_size):
+    """プロファイルの出力サイズを返す"""
+    if profile == SQUARE_PROFILE:
+        return square_size, square_size
+    return RATIO_PROFILES[profile]
+
+def profile_folder_name(profile, square_size):
+    """プロファイルごとの出力フォルダ名（例: 900x600_3-2）"""
+    width, height = profile_size(profile, square_size)
+    return f"{width}x{height}_{profile.replace(':', '-')}"
+
+def render_profile(img, profile, square_size):
+    """デコード済みの画像から1つのプロファイルの出力を作る"""
+    if profile == SQUARE_PROFILE:
+        return pad_to_square(img, square_size)
+    target_width, target_height = RATIO_PROFILES[profile]
+    return crop_to_ratio(img, target_width, target_height)
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiles = args.profiles
+    square_size = args.square_size
+
+    # WebPの保存オプション（デフォルトは従来どおり画質100%の無圧縮）、比率ごとに集計する
+    webp_options = webp_options_from_args(args)
+    encode_stats = {p: new_encode_stats(f"{args.webp_profile} / {p}") for p in profiles}
+
+    # 2_output_imagesをクリア
+    clear_folder(output_folder)
+    os.makedirs(output_folder, exist_ok=True)
+
+    profile_dirs = {p: os.path.join(output_folder, profile_folder_name(p, square_size)) for p in profiles}
+    for profile in profiles:
+        width, height = profile_size(profile, square_size)
+        print(f"出力: {profile}（{width}x{height}） -> {profile_dirs[profile]}")
+
+    print("画像をまとめてデコードし、全ての比率に変換します...")
+    run_report = new_run_report("multi_ratio")
+    # スキャンの完了を待たず、見つかった画像から順に処理する
+    image_files = timed_iter(iter_image_files(input_folder), run_report["run_stages"], "scan")
+
+    # 縮小読み込みが最も小さいプロファイル（最も大きくデコードする）の幅・高さで作業メモリを見積もる
+    load_size = (min(profile_size(p, square_size)[0] for p in profiles),
+                 min(profile_size(p, square_size)[1] for p in profiles))
+    # 全プロファイルの出力を合わせた大きさも見積もりに含める
+    output_area = sum(width * height for width, height in (profile_size(p, square_size) for p in profiles))
+    counts = {"images": 0, "outputs": 0}
+
+    # エンコードキャッシュのキーに使う、プロファイルごとの出力に影響する処理パラメータ
+    # （出力が同じため各ツールと同じパラメータにし、キャッシュを共有する）
+    cache = new_encode_cache(args.cache, args.cache_size)
+    profile_params = {p: {"tool": p, "target_size": list(profile_size(p, square_size)), "filter": "LANCZOS",
+                          "webp": webp_options, "shrink_on_load": args.shrink_on_load} for p in profiles}
+
+    def profile_output_path(job, profile):
+        current_output_dir = os.path.join(profile_dirs[profile], os.path.dirname(job["relative_path"]))
+        os.makedirs(current_output_dir, exist_ok=True)
+        return os.path.join(current_output_dir, f"{os.path.splitext(job['name'])[0]}.webp")
+
+    def pending_jobs():
+        for item_path, item, relative_path in image_files:
+            counts["images"] += 1
+            memory = estimate_file_memory(item_path, load_size, (output_area, 1), args.shrink_on_load)
+            yield {"path": item_path, "source": item_path, "name": item, "relative_path": relative_path, "timings": {},
+                   "memory": memory}
+
+    def read_image(job):
+        # 同じ入力・パラメータのエンコード結果がキャッシュにあるプロファイルは、そのまま出力する
+        job["cached"], job["cache_keys"] = {}, {}
+        if cache is not None:
+            with timed(job["timings"], "cache"):
+                try:
+                    digest = job_digest(job)
+                except OSError:
+                    digest = None  # 読めない入力はデコードでエラーを記録する
+                for profile in profiles if digest else []:
+                    output_path = profile_output_path(job, profile)
+                    key, info = lookup_output(cache, job["path"], profile_params[profile], output_path, digest)
+                    if key is not None:
+                        job["cache_keys"][profile] = key
+                    if info is not None:
+                        job["cached"][profile] = (output_path, tuple(info["size"]))
+        if len(job["cached"]) == len(profiles):
+            # 全てのプロファイルがキャッシュにある場合はデコードしない
+            job["results"] = [(p, *job["cached"][p], None, None) for p in profiles]
+            job["cache_hit"] = True
+            return
+
+        # プロファイルごとに各ツールと同じ大きさで読み込む。draft後の大きさが同じプロファイル同士は
+        # 1回のデコードを共有し、Image.reduce だけを変換の工程でプロファイルごとに行う
+        # （PNGなどdraftのない形式と、ふつうの写真では全プロファイルで1回のデコードになる）
+        job["imgs"], decoded = {}, {}
+        with timed(job["timings"], "decode"):
+            for profile in profiles:
+                if profile in job["cached"]:
+                    continue
+                size = profile_size(profile, square_size)
+                key = decode_key(job["path"], size, args.shrink_on_load)
+                if key not in decoded:
+                    decoded[key] = open_decoded(job["path"], size, args.shrink_on_load)
+                job["imgs"][profile] = decoded[key]
+
+    def render_profiles(job):
+        # プロファイルごとの失敗は記録して、残りのプロファイルは続ける
+        imgs = job.pop("imgs")
+        job["renders"] = []
+        for profile in profiles:
+            if profile in job["cached"]:
+                job["renders"].append((profile, None, None))
+                continue
+            try:
+                with timed(job["timings"], "resize"):
+                    img, shrink = imgs[profile]
+                    if shrink:
+                        # 単独のツールの open_image と同じ縮小（min_size の2倍以上を残す）
+                        img = reduce_for_target(img, profile_size(profile, square_size))
+                    job["renders"].append((profile, render_profile(img, profile, square_size), None))
+            except Exception as e:
+                job["renders"].append((profile, None, e))
+
+    def write_profiles(job):
+        job["results"] = []
+        for profile, processed, error in job.pop("renders"):
+            if error is not None:
+                job["results"].append((profile, None, None, None, error))
+                continue
+            if profile in job["cached"]:
+                job["results"].append((profile, *job["cached"][profile], None, None))
+                continue
+            try:
+                output_path = profile_output_path(job, profile)
+
+                # 指定したプロファイルで保存（デフォルトは画質100%の無圧縮）
+                with timed(job["timings"], "encode"):
+                    encoded = save_webp_measured(processed, output_path, webp_options)
+                with timed(job["timings"], "cache"):
+                    store_output(cache, job["cache_keys"].get(profile), output_path, {"size": processed.size})
+                job["results"].append((profile, output_path, processed.size, encoded, None))
+            except Exception as e:
+                job["results"].append((profile, None, None, None, e))
+
+    def link_profiles(job, original):
+        # 重複した入力は処理せず、元の画像の各プロファイルの出力をハードリンク（またはコピー）する
+        job["results"] = []
+        for profile, original_path, size, encoded, error in original["results"]:
+            if error is not None:
+                job["results"].append((profile, None, None, None, error))
+                continue
+            output_path = link_or_copy(original_path, profile_output_path(job, profile))
+            job["results"].append((profile, output_path, size, None, None))
+
+    def finish_image(job, error):
+        relative_path = job["relative_path"]
+        if cache is not None:
+            # キャッシュのヒット・ミスはプロファイル（出力）ごとに数える
+            hits = len(job.get("cached", {}))
+            cache["hits"] += hits
+            cache["misses"] += len(job.get("cache_keys", {})) - hits
+        if error is not None:
+            print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {error}")
+            record_image(run_report, relative_path, job["timings"], job["path"], error=str(error))
+            return
+
+        if "duplicate_of" in job:
+            print(f"重複: {relative_path} は {job['duplicate_of']} と同じ内容のため、処理せず出力を共有します。")
+        output_filename = f"{os.path.splitext(job['name'])[0]}.webp"
+        rel_dir = os.path.dirname(relative_path)
+        output_paths = []
+        for profile, output_path, size, encoded, profile_error in job["results"]:
+            if profile_error is not None:
+                print(f"エラー: ファイル {relative_path} の {profile} 変換中にエラーが発生しました: {profile_error}")
+                continue
+            if encoded is not None:
+                encode_seconds, output_bytes, raw_bytes = encoded
+                add_encode_sample(encode_stats[profile], raw_bytes, output_bytes, encode_seconds)
+            output_paths.append(output_path)
+            counts["outputs"] += 1
+            print(f"⭕️処理完了 [{profile}]: {relative_path} -> {os.path.join(rel_dir, output_filename)} ({size[0]}x{size[1]})")
+
+        # 全プロファイルの時間と出力バイト数を1枚分として記録する
+        record_image(run_report, relative_path, job["timings"], job["path"], output_paths,
+                     duplicate_of=job.get("duplicate_of"))
+
+    # 読み込み・変換・書き出しを別々のスレッドで重ねて処理する（結果の表示は入力順）
+    budget = new_memory_budget(args.memory_budget * 1024 * 1024)
+    dedup = new_dedup(args.dedup)
+    run_pipeline(pending_jobs(), read_image, render_profiles, write_profiles, finish_image, args.threads, budget=budget,
+                 dedup=dedup, link=link_profiles)
+    image_count, output_count = counts["images"], counts["outputs"]
+
+    print(f"{image_count} 個の画像ファイルが見つかりました。")
+    print_dedup_report(dedup)
+    evict_cache(cache)
+    print_cache_report(cache)
+    for profile in profiles:
+        print_encode_report(encode_stats[profile], webp_options)
+    write_run_report(run_report, output_folder, {"profiles": profiles, "webp": webp_options, "threads": args.threads,
+                                                 "memory": budget_summary(budget), "duplicates": dedup_summary(dedup),
+                                                 "cache": cache_summary(cache)})
+    print(f"⭕️全画像の処理が完了し、{len(profiles)} 種類の比率で計 {output_count} 枚を2_output_imagesに出力しました！")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,34 @@
 import os
 import sys
-import shutil
 import re
+import time
+import argparse
+import multiprocessing
+from functools import partial
 from PIL import Image
 
+# プロジェクトルートの共通モジュール（resize_common）を読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resize_common.cli import (add_dedup_argument, add_encode_cache_arguments, add_incremental_argument,
+                               add_keep_temp_argument, add_max_megapixels_argument, add_memory_budget_argument,
+                               add_plan_only_argument, add_shrink_on_load_argument, add_webp_profile_arguments)
+from resize_common.dedup import dedup_summary, new_dedup, print_dedup_report
+from resize_common.encode_cache import (cache_summary, count_lookup, evict_cache, new_encode_cache,
+                                        print_cache_report, restore_job, store_output)
+from resize_common.encoding import (add_encode_sample, new_encode_stats, print_encode_report, save_webp_measured,
+                                    webp_options_from_args)
+from resize_common.folders import clear_folder
+from resize_common.geometry import GEOMETRY_VERSION, resize_to_band
+from resize_common.image_loading import open_header, open_image
+from resize_common.memory_budget import budget_summary, new_memory_budget, plan_memory
+from resize_common.manifest import (load_previous_entries, new_manifest, output_paths, record_entry,
+                                    remove_stale_outputs, save_manifest, unchanged_entry)
+from resize_common.output import keep_temp_copy, link_or_copy, output_path_for
+from resize_common.pipeline import run_pipeline
+from resize_common.run_report import new_run_report, record_image, timed, timed_iter, write_run_report
+from resize_common.rename_plan import add_to_plan, build_plan, print_rename_plan, stream_plan, warn_collisions
+from resize_common.scanner import iter_image_files
+
 # Check for proper resampling filter based on PIL version
 try:
     # For newer Pillow versions (9.0+)
@@ -21,43 +46,30 @@ input_folder = "0_input_images"
 temp_folder = "1_temp_images"
 output_folder = "2_output_images"
 
-# --- フォルダを先にクリア ---
-def clear_folder(folder_path):
-    if os.path.exists(folder_path):
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f'{file_path} の削除に失敗しました。理由: {e}')
-
-# 1_temp_imagesと2_output_imagesをクリア
-for folder in [temp_folder, output_folder]:
-    clear_folder(folder)
-
-# --- ここまで ---
-
 target_width = 900  # 目標の幅
 target_height = 600  # 目標の高さ
-target_ratio = target_width / target_height  # 3:2 = 1.5
 min_height = 550  # 最小許容高さ
 max_height = 650  # 最大許容高さ
 
-# コマンド引数を入力（施設ID）
-if len(sys.argv) < 2:
-    print("使い方: Facility_resize_rename_images.py 施設ID")
-    print("例: Facility_resize_rename_images.py 123")
-    print("出力例: Facility_123_image_1.webp")
-    sys.exit(1)
-
-facility_id = str(sys.argv[1]).zfill(3)  # 施設ID（3桁）
-
-# フォルダが存在しない場合、作成する
-os.makedirs(temp_folder, exist_ok=True)
-os.makedirs(output_folder, exist_ok=True)
+def parse_args(argv=None):
+    """コマンド引数を解析する（施設ID、並列ジョブ数）"""
+    parser = argparse.ArgumentParser(add_help=True)
+    parser.add_argument("facility_id", nargs="?", help="施設ID")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="並列に処理するプロセス数（デフォルト: CPU数、1で逐次処理）")
+    add_shrink_on_load_argument(parser)
+    add_memory_budget_argument(parser)
+    add_max_megapixels_argument(parser)
+    add_keep_temp_argument(parser)
+    add_plan_only_argument(parser)
+    add_incremental_argument(parser)
+    add_dedup_argument(parser)
+    add_encode_cache_arguments(parser)
+    add_webp_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs は1以上を指定してください")
+    return args
 
 def is_facility_filename(filename):
     """ファイル名がFacility_で始まるかどうかをチェック"""
@@ -72,174 +84,263 @@ def extract_number(filename):
 
 def process_image(img):
     """画像を処理する（リサイズ、必要に応じてトリミング）"""
-    original_width, original_height = img.size
-    original_ratio = original_width / original_height
-
-    # まず900pxに合わせてリサイズ
-    new_width = target_width
-    new_height = int(target_width / original_ratio)
-    img = img.resize((new_width, new_height), RESAMPLING_FILTER)
-
-    # 高さが550-650pxの範囲内の場合、トリミングしない
-    if min_height <= new_height <= max_height:
-        return img
-
-    # 範囲外の場合、3:2比率にトリミング
-    if original_ratio > target_ratio:
-        # 画像が3:2より横長の場合
-        crop_width = int(target_height * target_ratio)
-        img = img.resize((int(crop_width * (new_width/target_width)), target_height), RESAMPLING_FILTER)
-        left = (img.width - target_width) // 2
-        img = img.crop((left, 0, left + target_width, target_height))
-    else:
-        # 画像が3:2より縦長の場合
-        top = (new_height - target_height) // 2
-        img = img.crop((0, top, target_width, top + target_height))
-
-    return img
-
-def scan_directory(dir_path, relative_path=""):
-    """ディレクトリを再帰的にスキャンして画像ファイルを見つける"""
-    image_files = []
-    
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
-        
-        # 相対パスを構築（出力時のディレクトリ構造を維持するため）
-        item_relative_path = os.path.join(relative_path, item) if relative_path else item
-        
-        if os.path.isdir(item_path):
-            # サブディレクトリの場合は再帰的に処理
-            sub_files = scan_directory(item_path, item_relative_path)
-            image_files.extend(sub_files)
-        elif item.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
-            # 画像ファイルの場合はリストに追加
-            image_files.append((item_path, item, item_relative_path))
-    
-    return image_files
-
-# ステップ1: サイズ調整してtemp_imagesに保存
-print("画像のリサイズとトリミングを開始...")
-processed_files = {}  # 処理したファイルと番号を記録
-keep_original_names = {}  # 元の名前を保持するファイル
-auto_number_counter = 1  # 自動番号付けのカウンター
-
-# 入力フォルダを再帰的にスキャン
-image_files = scan_directory(input_folder)
-print(f"{len(image_files)} 個の画像ファイルが見つかりました。")
-
-for file_path, filename, relative_path in image_files:
-    # Facility_で始まるファイル名かどうかをチェック
-    is_facility = is_facility_filename(filename)
-
-    # ファイル名から番号を抽出
-    number = extract_number(filename)
-    
-    # 番号が見つからない場合、自動的に番号を割り当て
-    if number is None:
+    # 出力サイズと元画像上の切り抜き範囲を先に求め、1回のリサイズで仕上げる
+    # （高さが許容範囲外なら目標の比率で中央を切り抜く）
+    return resize_to_band(img, (target_width, target_height), (min_height, max_height), RESAMPLING_FILTER)
+
+def processing_params(shrink_on_load, max_megapixels, webp_options):
+    """出力に影響する処理パラメータ（変わった場合は差分処理せず全て処理し直す）"""
+    return {
+        "tool": "Facility",
+        "target_size": [target_width, target_height],
+        "height_range": [min_height, max_height],
+        "geometry": GEOMETRY_VERSION,
+        "filter": str(RESAMPLING_FILTER),
+        "webp": webp_options,
+        "shrink_on_load": shrink_on_load,
+        "max_megapixels": max_megapixels,
+    }
+
+def read_source(job, shrink_on_load=True, max_pixels=None, keep_temp=False, cache=None, params=None):
+    """1枚の画像を読み込む（read工程。ワーカープロセスでも実行される）
+
+    同じ入力・パラメータ（params）のエンコード結果がcacheにあれば、デコードせずに出力する。
+    """
+    timings = job["timings"]
+    # 出力先のディレクトリ構造を維持し、最終的なファイル名で1回だけ書き込む
+    job["output_path"] = output_path_for(output_folder, job["relative_path"], job["filename"])
+    with timed(timings, "cache"):
+        if restore_job(cache, job, params, job["output_path"]):
+            with open_header(job["source"]) as source:
+                job["source_pixels"] = source.width * source.height
+            job["output_bytes"] = os.path.getsize(job["output_path"])
+            if keep_temp:
+                keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+            return
+
+    with timed(timings, "decode"):
+        with open_header(job["source"]) as source:
+            job["source_pixels"] = source.width * source.height
+        # 最終サイズの2倍以上を保つ範囲で縮小しながら読み込む（画素数が上限を超える画像は常に縮小読み込み）
+        job["img"] = open_image(job["source"], (target_width, max_height), shrink_on_load, max_pixels=max_pixels)
+
+def resize_image(job):
+    """読み込んだ画像をリサイズ・トリミングする（transform工程）"""
+    with timed(job["timings"], "resize"):
+        job["processed"] = process_image(job.pop("img"))
+
+def write_output(job, webp_options, keep_temp=False, cache=None):
+    """WebPで保存し、エンコードキャッシュに登録する（write工程）"""
+    processed = job.pop("processed")
+    job["size"] = processed.size
+    with timed(job["timings"], "encode"):
+        job["encode_seconds"], job["output_bytes"], job["raw_bytes"] = save_webp_measured(
+            processed, job["output_path"], webp_options)
+    with timed(job["timings"], "cache"):
+        store_output(cache, job["cache_key"], job["output_path"], {"size": job["size"]})
+    if keep_temp:
+        with timed(job["timings"], "copy"):
+            keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+
+def link_to_original(job, original, keep_temp=False):
+    """重複した入力は処理せず、元の画像の出力をハードリンク（またはコピー）する"""
+    job["output_path"] = link_or_copy(original["output_path"],
+                                      output_path_for(output_folder, job["relative_path"], job["filename"]))
+    if keep_temp:
+        keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+    job["size"] = original["size"]
+    job["source_pixels"] = original["source_pixels"]
+    job["output_bytes"] = original["output_bytes"]
+
+def rename_planner(facility_id):
+    """1ファイルずつリネーム計画に登録する関数を返す
+
+    自動番号はメインプロセスでスキャン順に割り当てるため、並列処理でも逐次処理と同じ番号になる。
+    """
+    auto_number_counter = 1  # 自動番号付けのカウンター
+
+    def plan_file(plan, file_path, filename, relative_path):
+        nonlocal auto_number_counter
+        # Facility_で始まるファイル名かどうかをチェック
+        is_facility = is_facility_filename(filename)
+
+        # ファイル名から番号を抽出
+        number = extract_number(filename)
+
+        # 番号が見つからない場合、自動的に番号を割り当て
+        if number is None:
+            if is_facility:
+                print(f"警告: {relative_path} はFacility_で始まりますが番号がありません。自動番号を割り当てます。")
+                number = str(auto_number_counter)
+                auto_number_counter += 1
+            else:
+                print(f"警告: {relative_path} から番号を抽出できませんでした。自動番号を割り当てます。")
+                number = str(auto_number_counter)
+                auto_number_counter += 1
+
         if is_facility:
-            print(f"警告: {relative_path} はFacility_で始まりますが番号がありません。自動番号を割り当てます。")
-            number = str(auto_number_counter)
-            auto_number_counter += 1
+            # Facility_で始まるファイル名の場合は元の名前を変更しない
+            add_to_plan(plan, file_path, relative_path, f"{os.path.splitext(filename)[0]}.webp", keep_original=True)
         else:
-            print(f"警告: {relative_path} から番号を抽出できませんでした。自動番号を割り当てます。")
-            number = str(auto_number_counter)
-            auto_number_counter += 1
+            add_to_plan(plan, file_path, relative_path, f"Facility_{facility_id}_image_{number}.webp")
+
+    return plan_file
 
+def estimate_task_memory(file_path, relative_path, shrink_on_load, max_pixels):
+    """ヘッダーから1枚の処理の作業メモリを見積もる（読めない画像は0とし、エラーはワーカーで記録する）"""
     try:
-        img = Image.open(file_path).convert("RGB")
+        probe = plan_memory(file_path, (target_width, max_height), (target_width, max_height), shrink_on_load, max_pixels)
+    except Exception:
+        return 0
+    if probe["oversized"] and not shrink_on_load:
+        width, height = probe["size"]
+        print(f"注意: {relative_path} は {width}x{height} と大きいため、縮小読み込みで処理します。")
+    return probe["bytes"]
 
-        # 画像処理実行
-        processed = process_image(img)
+def print_throughput_summary(results, elapsed, jobs):
+    """実行全体のスループットを表示する"""
+    succeeded = [r for r in results if r["error"] is None]
+    failed_count = len(results) - len(succeeded)
+    megapixels = sum(r["source_pixels"] for r in succeeded) / 1_000_000
+    output_mb = sum(r["output_bytes"] for r in succeeded) / (1024 * 1024)
+    busy_time = sum(sum(r["timings"].values()) for r in results)
 
-        # 出力先のディレクトリ構造を維持
-        rel_dir = os.path.dirname(relative_path)
-        if rel_dir:
-            rel_temp_dir = os.path.join(temp_folder, rel_dir)
-            os.makedirs(rel_temp_dir, exist_ok=True)
-        else:
-            rel_temp_dir = temp_folder
-
-        # 元のファイル名を維持して拡張子だけwebpに変更
-        base_name = os.path.splitext(filename)[0]
-        temp_filename = f"{base_name}.webp"
-        output_path = os.path.join(rel_temp_dir, temp_filename)
-        processed.save(output_path, "WEBP", quality=100, lossless=True)
-        
-        # 処理したファイル情報を記録
-        if is_facility:
-            keep_original_names[relative_path] = True
-            print(f"⭕️処理完了 (名前変更しない): {relative_path} -> {os.path.join(os.path.dirname(relative_path), temp_filename)} ({processed.width}x{processed.height})")
-        else:
-            processed_files[relative_path] = number
-            print(f"⭕️処理完了: {relative_path} -> {os.path.join(os.path.dirname(relative_path), temp_filename)} ({processed.width}x{processed.height})")
-    except Exception as e:
-        print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {e}")
-        continue
-
-print("全画像の処理が完了、出力処理へ...")
-
-# ステップ2: output_imagesに出力（ここで名前を変更）
-for root, dirs, files in os.walk(temp_folder):
-    # temp_folder からの相対パスを取得
-    rel_path = os.path.relpath(root, temp_folder) if root != temp_folder else ""
-    
-    for filename in files:
-        if not filename.lower().endswith(".webp"):
-            continue
-        
-        # 現在のファイルの相対パス
-        if rel_path == "":
-            current_rel_path = filename
-        else:
-            current_rel_path = os.path.join(rel_path, filename)
-        
-        src = os.path.join(root, filename)
-        
-        # 出力先のディレクトリ構造を維持
-        rel_output_dir = os.path.dirname(current_rel_path)
-        if rel_output_dir:
-            full_output_dir = os.path.join(output_folder, rel_output_dir)
-            os.makedirs(full_output_dir, exist_ok=True)
+    print("--- スループット ---")
+    print(f"ジョブ数: {jobs} / 成功: {len(succeeded)} 枚 / 失敗: {failed_count} 枚")
+    print(f"経過時間: {elapsed:.2f} 秒（画像ごとの処理時間の合計: {busy_time:.2f} 秒）")
+    if elapsed > 0:
+        print(f"処理速度: {len(succeeded) / elapsed:.2f} 枚/秒, {megapixels / elapsed:.2f} MP/秒")
+    print(f"入力: {megapixels:.1f} MP / 出力: {output_mb:.1f} MB")
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # コマンド引数を入力（施設ID）
+    if args.facility_id is None:
+        print("使い方: Facility_resize_rename_images.py 施設ID [--jobs N]")
+        print("例: Facility_resize_rename_images.py 123")
+        print("出力例: Facility_123_image_1.webp")
+        sys.exit(1)
+
+    facility_id = str(args.facility_id).zfill(3)  # 施設ID（3桁）
+
+    report = new_run_report("Facility")
+    plan_file = rename_planner(facility_id)
+
+    if args.plan_only:
+        print_rename_plan(build_plan(iter_image_files(input_folder), plan_file))
+        return
+
+    # --incremental指定時は前回のマニフェストと比較し、使えない場合だけクリアする
+    # WebPの保存オプション（デフォルトは従来どおり画質100%の無圧縮）
+    webp_options = webp_options_from_args(args)
+    encode_stats = new_encode_stats(args.webp_profile)
+
+    params = processing_params(args.shrink_on_load, args.max_megapixels, webp_options)
+    previous_entries = load_previous_entries(params) if args.incremental else None
+    if previous_entries is None:
+        # 1_temp_imagesと2_output_imagesをクリア
+        for folder in [temp_folder, output_folder]:
+            clear_folder(folder)
+        previous_entries = {}
+    manifest = new_manifest(params)
+
+    # フォルダが存在しない場合、作成する（1_temp_imagesは--keep-temp指定時のみ使用）
+    if args.keep_temp:
+        os.makedirs(temp_folder, exist_ok=True)
+    os.makedirs(output_folder, exist_ok=True)
+
+    # サイズ調整し、最終的なファイル名でoutput_imagesに直接保存
+    print("画像のリサイズとトリミングを開始...")
+
+    jobs = args.jobs
+    max_pixels = args.max_megapixels * 1_000_000
+    # 実行・ツールをまたいで共有するエンコードキャッシュ（ヒット・ミスはメインプロセスで集計する）
+    cache = new_encode_cache(args.cache, args.cache_size)
+    # 工程の関数はワーカープロセスに渡すため、設定は引数として束ねる
+    read = partial(read_source, shrink_on_load=args.shrink_on_load, max_pixels=max_pixels, keep_temp=args.keep_temp,
+                   cache=cache, params=params)
+    write = partial(write_output, webp_options=webp_options, keep_temp=args.keep_temp, cache=cache)
+    # 並列処理中の画像の作業メモリの見積もりが予算を超えないよう、受け入れを制御する
+    budget = new_memory_budget(args.memory_budget * 1024 * 1024)
+    # 内容が同じ入力画像は1回だけ処理し、出力を共有する
+    dedup = new_dedup(args.dedup)
+    start_time = time.perf_counter()
+    plan = {}
+    current_outputs = []
+    results = []
+    skipped_count = 0
+
+    def pending_jobs():
+        """入力フォルダをスキャンしながら、見つかった画像から順に出力ファイル名を確定して渡す"""
+        nonlocal skipped_count
+        image_files = timed_iter(iter_image_files(input_folder), report["run_stages"], "scan")
+        for relative_path, entry in stream_plan(plan, image_files, plan_file):
+            outputs = output_paths(output_folder, relative_path, entry["filename"],
+                                   temp_folder if args.keep_temp else None)
+            current_outputs.extend(outputs)
+            previous = unchanged_entry(previous_entries, relative_path, entry["source"], outputs)
+            if previous is not None:
+                # 前回から変わっていない画像は処理しない
+                record_entry(manifest, relative_path, entry["source"], outputs, previous)
+                skipped_count += 1
+                continue
+            memory = estimate_task_memory(entry["source"], relative_path, args.shrink_on_load, max_pixels)
+            yield {"source": entry["source"], "relative_path": relative_path, "filename": entry["filename"],
+                   "outputs": outputs, "timings": {}, "memory": memory}
+
+    def finish_image(job, error):
+        """1枚分の結果を記録・表示する（入力順に呼ばれる）"""
+        relative_path = job["relative_path"]
+        results.append(job)
+        count_lookup(cache, job)
+        if error is not None:
+            print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {error}")
+            record_image(report, relative_path, job["timings"], job["source"], error=str(error))
+            return
+
+        record_image(report, relative_path, job["timings"], job["source"], job["output_path"],
+                     duplicate_of=job.get("duplicate_of"))
+        entry = plan[relative_path]
+        if "duplicate_of" in job:
+            print(f"重複: {relative_path} は {job['duplicate_of']} と同じ内容のため、処理せず出力を共有します。")
+        elif not job.get("cache_hit"):
+            add_encode_sample(encode_stats, job["raw_bytes"], job["output_bytes"], job["encode_seconds"])
+        # 重複の判定・エンコードキャッシュのキーに使ったハッシュがあれば、読み直さずに記録する
+        record_entry(manifest, relative_path, job["source"], job["outputs"], digest=job.get("digest"))
+        width, height = job["size"]
+
+        if entry["keep_original"]:
+            print(f"⭕️処理完了 (名前変更しない): {relative_path} -> {entry['target']} ({width}x{height})")
         else:
-            full_output_dir = output_folder
-    
-        # Facility_で始まるファイル名の場合は元の名前を変更しない
-        found = False
-        for orig_path in keep_original_names.keys():
-            orig_filename = os.path.basename(orig_path)
-            orig_basename = os.path.splitext(orig_filename)[0]
-            current_basename = os.path.splitext(filename)[0]
-            
-            if orig_basename == current_basename:
-                dst = os.path.join(full_output_dir, filename)
-                shutil.copy2(src, dst)
-                print(f"出力完了 (元の名前を変更しない): {current_rel_path}")
-                found = True
-                break
-                
-        if found:
-            continue
-        
-        # 対応する番号情報を検索
-        found = False
-        for orig_path in processed_files.keys():
-            orig_filename = os.path.basename(orig_path)
-            orig_basename = os.path.splitext(orig_filename)[0]
-            current_basename = os.path.splitext(filename)[0]
-            
-            if orig_basename == current_basename:
-                # 新しいファイル名を生成
-                number = processed_files[orig_path]
-                new_filename = f"Facility_{facility_id}_image_{number}.webp"
-                
-                dst = os.path.join(full_output_dir, new_filename)
-                shutil.copy2(src, dst)
-                print(f"出力完了: {current_rel_path} -> {os.path.join(rel_output_dir, new_filename) if rel_output_dir else new_filename}")
-                found = True
-                break
-        
-        if not found:
-            print(f"警告: {current_rel_path} の番号情報がありません。スキップします。")
-
-print("⭕️全画像の処理が完了し、2_output_imagesに出力しました！") 
+            print(f"⭕️処理完了: {relative_path} -> {entry['target']} ({width}x{height})")
+
+    if jobs > 1:
+        print(f"{jobs} プロセスで並列処理します。")
+    # 結果は入力順に受け取り、ログと記録を逐次実行と同じ順序にする
+    run_pipeline(pending_jobs(), read, resize_image, write, finish_image, jobs, budget=budget, dedup=dedup,
+                 link=partial(link_to_original, keep_temp=args.keep_temp), processes=True)
+
+    print(f"{len(plan)} 個の画像ファイルが見つかりました。")
+    warn_collisions(plan)
+    # 入力がなくなった画像の出力は、スキャンが終わってから削除する
+    remove_stale_outputs(previous_entries, current_outputs)
+    if skipped_count:
+        print(f"前回から変更のない {skipped_count} 枚をスキップしました。")
+
+    save_manifest(manifest)
+    print_throughput_summary(results, time.perf_counter() - start_time, jobs)
+    print_dedup_report(dedup)
+    evict_cache(cache)
+    print_cache_report(cache)
+    print_encode_report(encode_stats, webp_options)
+    write_run_report(report, output_folder, {"params": params, "jobs": jobs, "skipped": skipped_count,
+                                             "memory": budget_summary(budget), "duplicates": dedup_summary(dedup),
+                                             "cache": cache_summary(cache)})
+
+    print("⭕️全画像の処理が完了し、2_output_imagesに出力しました！")
+
+if __name__ == "__main__":
+    # PyInstallerでビルドした実行ファイルでもプロセスプールを使えるようにする
+    multiprocessing.freeze_support()
+    main()
@@ -7,12 +7,15 @@ cd "$SCRIPT_DIR" || exit 1
 PROJECT_ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
 VENV_PYTHON="$PROJECT_ROOT/venv/bin/python"
 
+# 常駐ワーカー（2回目以降はPillowの読み込みを省略して起動する）
+RUNNER="$PROJECT_ROOT/resize_common/daemon.py"
+
 while true; do
   # 施設IDを入力
   read -p "😎施設IDを入力してください（例：123）: " FACILITY_ID
 
   #  仮想環境のPythonインタープリタへのパス
-  "$VENV_PYTHON" "$SCRIPT_DIR/FloorMap_resize_rename_images.py" "$FACILITY_ID"
+  "$VENV_PYTHON" "$RUNNER" run "$SCRIPT_DIR/FloorMap_resize_rename_images.py" "$FACILITY_ID"
   if [ $? -eq 0 ]; then
     echo "🥳完了しました。"
   else
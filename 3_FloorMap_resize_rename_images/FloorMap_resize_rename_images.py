@@ -1,8 +1,33 @@
 import os
 import sys
-import shutil
 import re
-from PIL import Image, ImageChops
+import argparse
+from PIL import Image
+
+# プロジェクトルートの共通モジュール（resize_common）を読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resize_common.cli import (add_dedup_argument, add_encode_cache_arguments, add_incremental_argument,
+                               add_keep_temp_argument, add_memory_budget_argument, add_plan_only_argument,
+                               add_strip_megapixels_argument, add_threads_argument, add_trim_tolerance_argument,
+                               add_webp_profile_arguments)
+from resize_common.dedup import dedup_summary, new_dedup, print_dedup_report
+from resize_common.encode_cache import (cache_summary, count_lookup, evict_cache, new_encode_cache,
+                                        print_cache_report, restore_job, store_output)
+from resize_common.encoding import (add_encode_sample, new_encode_stats, print_encode_report, save_webp_measured,
+                                    webp_options_from_args)
+from resize_common.folders import clear_folder
+from resize_common.image_loading import shrink_factor
+from resize_common.memory_budget import budget_summary, estimate_file_memory, new_memory_budget
+from resize_common.manifest import (job_digest, load_previous_entries, new_manifest, output_paths,
+                                    record_entry, remove_stale_outputs, save_manifest, unchanged_entry)
+from resize_common.output import keep_temp_copy, link_or_copy, output_path_for
+from resize_common.pipeline import run_pipeline
+from resize_common.run_report import new_run_report, record_image, timed, timed_iter, write_run_report
+from resize_common.rename_plan import (add_to_plan, build_plan, print_rename_plan, skip_in_plan, stream_plan,
+                                       warn_collisions)
+from resize_common.scanner import iter_image_files
+from resize_common.strips import estimate_strip_memory, probe_strips, reduce_strips, strip_content_bbox
+from resize_common.trim import trim
 
 # Check for proper resampling filter based on PIL version
 try:
@@ -21,41 +46,37 @@ input_folder = "0_input_images"
 temp_folder = "1_temp_images"
 output_folder = "2_output_images"
 
-# --- フォルダを先にクリア ---
-def clear_folder(folder_path):
-    if os.path.exists(folder_path):
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f'{file_path} の削除に失敗しました。理由: {e}')
-
-# 1_temp_imagesと2_output_imagesをクリア
-for folder in [temp_folder, output_folder]:
-    clear_folder(folder)
-
-# --- ここまで ---
-
 target_size = (750, 750)  # キャンパスサイズを750x750に変更
 background_color = (255, 255, 255)  # 背景は白
 content_target_size = 700  # 内容エリアの最大辺を700にリサイズ
 
 # コマンド引数を入力（施設ID）
-if len(sys.argv) < 2:
+parser = argparse.ArgumentParser()
+parser.add_argument("facility_id", nargs="?", help="施設ID")
+add_threads_argument(parser)
+add_memory_budget_argument(parser)
+add_keep_temp_argument(parser)
+add_plan_only_argument(parser)
+add_incremental_argument(parser)
+add_dedup_argument(parser)
+add_encode_cache_arguments(parser)
+add_webp_profile_arguments(parser)
+add_trim_tolerance_argument(parser)
+add_strip_megapixels_argument(parser)
+args = parser.parse_args()
+
+# WebPの保存オプション（デフォルトは従来どおり画質100%の無圧縮）
+webp_options = webp_options_from_args(args)
+encode_stats = new_encode_stats(args.webp_profile)
+
+if args.facility_id is None:
     print("使い方: FloorMap_resize_rename_images.py 施設ID")
     print("例: FloorMap_resize_rename_images.py 123")
     print("出力例: FloorMap_123_a11_1.webp")
     sys.exit(1)
 
-facility_id = str(sys.argv[1]).zfill(3)  # 施設ID（3桁）
+facility_id = str(args.facility_id).zfill(3)  # 施設ID（3桁）
 
-# フォルダが存在しない場合、作成する
-os.makedirs(temp_folder, exist_ok=True)
-os.makedirs(output_folder, exist_ok=True)
 
 def extract_floor_number(filename):
     """ファイル名から階数を抽出する"""
@@ -68,160 +89,196 @@ def is_floormap_filename(filename):
     """ファイル名がFloorMap_で始まるかどうかをチェック"""
     return filename.startswith("FloorMap_")
 
-# トリミング関数
-def trim(image, bg_color=(255,255,255)):
-    """背景以外を自動トリミング"""
-    bg = Image.new(image.mode, image.size, bg_color)
-    diff = ImageChops.difference(image, bg)
-    bbox = diff.getbbox()
-    if bbox:
-        return image.crop(bbox)
-    else:
-        return image  # 内容がなければトリミングしない
-
-def scan_directory(dir_path, relative_path=""):
-    """ディレクトリを再帰的にスキャンして画像ファイルを見つける"""
-    image_files = []
-    
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
-        
-        # 相対パスを構築（出力時のディレクトリ構造を維持するため）
-        item_relative_path = os.path.join(relative_path, item) if relative_path else item
-        
-        if os.path.isdir(item_path):
-            # サブディレクトリの場合は再帰的に処理
-            sub_files = scan_directory(item_path, item_relative_path)
-            image_files.extend(sub_files)
-        elif item.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
-            # 画像ファイルの場合はリストに追加
-            image_files.append((item_path, item, item_relative_path))
-    
-    return image_files
-
-# ステップ1: サイズ調整してtemp_imagesに保存
-print("画像のトリミングとリサイズを開始...")
-processed_files = {}  # 処理したファイルと階数を記録
-keep_original_names = {}  # 元の名前を保持するファイル
-
-# 入力フォルダを再帰的にスキャン
-image_files = scan_directory(input_folder)
-print(f"{len(image_files)} 個の画像ファイルが見つかりました。")
-
-for file_path, filename, relative_path in image_files:
+def plan_file(plan, file_path, filename, relative_path):
+    """1ファイルの出力ファイル名をエンコード前に確定する（リネーム計画）"""
     # FloorMap_で始まるファイル名かどうかをチェック
     is_floormap = is_floormap_filename(filename)
     floor_number = extract_floor_number(filename)
     if floor_number is None and not is_floormap:
         print(f"警告: {relative_path} から階数を抽出できませんでした。スキップします。")
-        continue
+        skip_in_plan(plan, file_path, relative_path, "階数なし")
+        return
 
-    try:
-        img = Image.open(file_path).convert("RGB")
-        # 内容エリアを自動トリミング
-        trimmed = trim(img)
+    if is_floormap:
+        # FloorMap_で始まるファイル名の場合は元の名前を変更しない
+        add_to_plan(plan, file_path, relative_path, f"{os.path.splitext(filename)[0]}.webp", keep_original=True)
+    else:
+        add_to_plan(plan, file_path, relative_path, f"FloorMap_{facility_id}_a{floor_number}_1.webp")
+
+run_report = new_run_report("FloorMap")
+
+if args.plan_only:
+    print_rename_plan(build_plan(iter_image_files(input_folder), plan_file))
+    sys.exit(0)
+
+# 出力に影響する処理パラメータ（変わった場合は差分処理せず全て処理し直す）
+params = {
+    "tool": "FloorMap",
+    "target_size": list(target_size),
+    "background_color": list(background_color),
+    "content_target_size": content_target_size,
+    "trim_tolerance": args.trim_tolerance,
+    "filter": str(RESAMPLING_FILTER),
+    "webp": webp_options,
+    # 帯単位で処理する画像は、Image.reduceで縮小してからリサイズする（出力の画素がわずかに変わる）
+    "strip_megapixels": args.strip_megapixels,
+}
+
+# --incremental指定時は前回のマニフェストと比較し、使えない場合だけクリアする
+previous_entries = load_previous_entries(params) if args.incremental else None
+if previous_entries is None:
+    # 1_temp_imagesと2_output_imagesをクリア
+    for folder in [temp_folder, output_folder]:
+        clear_folder(folder)
+    previous_entries = {}
+manifest = new_manifest(params)
+
+# フォルダが存在しない場合、作成する（1_temp_imagesは--keep-temp指定時のみ使用）
+if args.keep_temp:
+    os.makedirs(temp_folder, exist_ok=True)
+os.makedirs(output_folder, exist_ok=True)
+
+# トリミング・リサイズし、最終的なファイル名でoutput_imagesに直接保存
+print("画像のトリミングとリサイズを開始...")
+
+# 入力フォルダをスキャンしながら、見つかった画像から順に出力ファイル名を確定して処理する
+plan = {}
+image_files = timed_iter(iter_image_files(input_folder), run_report["run_stages"], "scan")
+current_outputs = []
+skipped_count = 0
+
+def pending_jobs():
+    """処理が必要な画像を、スキャンしながら1枚ずつ返す（前回から変わっていない画像は記録だけする）"""
+    global skipped_count
+    for relative_path, entry in stream_plan(plan, image_files, plan_file):
+        outputs = output_paths(output_folder, relative_path, entry["filename"], temp_folder if args.keep_temp else None)
+        current_outputs.extend(outputs)
 
+        # 前回から変わっていない画像は処理しない
+        previous = unchanged_entry(previous_entries, relative_path, entry["source"], outputs)
+        if previous is not None:
+            record_entry(manifest, relative_path, entry["source"], outputs, previous)
+            skipped_count += 1
+            continue
+
+        # トリミングのためフル解像度で読み込むので、元のサイズで作業メモリを見積もる
+        # （画素数が多いPNGは帯単位で処理するので、帯の大きさで見積もる）
+        strips = probe_strips(entry["source"], args.strip_megapixels * 1_000_000)
+        if strips is not None:
+            memory = estimate_strip_memory(strips, (content_target_size, content_target_size), target_size)
+        else:
+            memory = estimate_file_memory(entry["source"], output_size=target_size)
+        yield {"relative_path": relative_path, "entry": entry, "source": entry["source"], "outputs": outputs,
+               "timings": {}, "memory": memory, "strips": strips}
+
+def read_image(job):
+    """画像をフル解像度で読み込む"""
+    # 同じ入力・パラメータのエンコード結果がキャッシュにあれば、デコードせずに出力する
+    job["output_path"] = output_path_for(output_folder, job["relative_path"], job["entry"]["filename"])
+    with timed(job["timings"], "cache"):
+        if restore_job(cache, job, params, job["output_path"]):
+            if args.keep_temp:
+                keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+            return
+    if job["strips"] is not None:
+        return  # 帯単位で処理する画像は、トリミングの工程で読み込む
+    with timed(job["timings"], "decode"):
+        job["img"] = Image.open(job["entry"]["source"]).convert("RGB")
+
+def content_size(w, h):
+    """内容エリアの最大辺をcontent_target_sizeにしたときのサイズ"""
+    scale = content_target_size / max(w, h)
+    return int(w * scale), int(h * scale)
+
+def trim_strips(job):
+    """画素数が多いPNGを帯単位で読み込み、トリミング範囲を求めてから縮小する（画像全体をメモリに置かない）"""
+    header = job["strips"]
+    with timed(job["timings"], "trim"):
+        bbox = strip_content_bbox(job["source"], header, tolerance=args.trim_tolerance)
+    if bbox is None:
+        bbox = (0, 0) + header["size"]  # 内容がなければトリミングしない
+    w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    with timed(job["timings"], "decode"):
+        return reduce_strips(job["source"], header, bbox, shrink_factor((w, h), content_size(w, h)))
+
+def trim_and_resize(job):
+    """内容エリアを自動トリミングし、背景の中央に配置する"""
+    if job["strips"] is not None:
+        trimmed = trim_strips(job)
+    else:
+        with timed(job["timings"], "trim"):
+            trimmed = trim(job.pop("img"), tolerance=args.trim_tolerance)
+
+    with timed(job["timings"], "resize"):
         # 内容エリアをcontent_target_sizeにリサイズ
-        w, h = trimmed.size
-        scale = content_target_size / max(w, h)
-        new_w, new_h = int(w * scale), int(h * scale)
-        trimmed = trimmed.resize((new_w, new_h), RESAMPLING_FILTER)
+        trimmed = trimmed.resize(content_size(*trimmed.size), RESAMPLING_FILTER)
 
         # 背景画像を作成し、中央に貼り付け
         background = Image.new("RGB", target_size, background_color)
         x = (target_size[0] - trimmed.width) // 2
         y = (target_size[1] - trimmed.height) // 2
         background.paste(trimmed, (x, y))
+    job["processed"] = background
 
-        # 出力先のディレクトリ構造を維持
-        rel_dir = os.path.dirname(relative_path)
-        if rel_dir:
-            rel_temp_dir = os.path.join(temp_folder, rel_dir)
-            os.makedirs(rel_temp_dir, exist_ok=True)
-        else:
-            rel_temp_dir = temp_folder
-
-        # 元のファイル名を維持して拡張子だけwebpに変更
-        base_name = os.path.splitext(filename)[0]
-        temp_filename = f"{base_name}.webp"
-        temp_path = os.path.join(rel_temp_dir, temp_filename)
-        background.save(temp_path, "WEBP", quality=100, lossless=True)
-
-        # 処理したファイル情報を記録
-        if is_floormap:
-            keep_original_names[relative_path] = True
-            print(f"⭕️トリミング＋リサイズ完了 (名前保持): {relative_path} -> {os.path.join(os.path.dirname(relative_path), temp_filename)}")
-        else:
-            processed_files[relative_path] = floor_number
-            print(f"⭕️トリミング＋リサイズ完了: {relative_path} -> {os.path.join(os.path.dirname(relative_path), temp_filename)}")
-    except Exception as e:
-        print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {e}")
-        continue
-
-
-print("全画像のトリミングとリサイズが完了、出力処理へ...")
-
-# ステップ2: output_imagesに出力（ここで名前を変更）
-for root, dirs, files in os.walk(temp_folder):
-    # temp_folder からの相対パスを取得
-    rel_path = os.path.relpath(root, temp_folder) if root != temp_folder else ""
-    
-    for filename in files:
-        if not filename.lower().endswith(".webp"):
-            continue
-        
-        # 現在のファイルの相対パス
-        if rel_path == "":
-            current_rel_path = filename
-        else:
-            current_rel_path = os.path.join(rel_path, filename)
-        
-        src = os.path.join(root, filename)
-        
-        # 出力先のディレクトリ構造を維持
-        rel_output_dir = os.path.dirname(current_rel_path)
-        if rel_output_dir:
-            full_output_dir = os.path.join(output_folder, rel_output_dir)
-            os.makedirs(full_output_dir, exist_ok=True)
-        else:
-            full_output_dir = output_folder
-    
-        # FloorMap_で始まるファイル名の場合は元の名前を変更しない
-        found = False
-        for orig_path in keep_original_names.keys():
-            orig_filename = os.path.basename(orig_path)
-            orig_basename = os.path.splitext(orig_filename)[0]
-            current_basename = os.path.splitext(filename)[0]
-            
-            if orig_basename == current_basename:
-                dst = os.path.join(full_output_dir, filename)
-                shutil.copy2(src, dst)
-                print(f"出力完了 (元の名前を変更しない): {current_rel_path}")
-                found = True
-                break
-                
-        if found:
-            continue
-        
-        # 対応する階数情報を検索
-        found = False
-        for orig_path in processed_files.keys():
-            orig_filename = os.path.basename(orig_path)
-            orig_basename = os.path.splitext(orig_filename)[0]
-            current_basename = os.path.splitext(filename)[0]
-            
-            if orig_basename == current_basename:
-                # 新しいファイル名を生成
-                floor_number = processed_files[orig_path]
-                new_filename = f"FloorMap_{facility_id}_a{floor_number}_1.webp"
-                
-                dst = os.path.join(full_output_dir, new_filename)
-                shutil.copy2(src, dst)
-                print(f"出力完了: {current_rel_path} -> {os.path.join(rel_output_dir, new_filename) if rel_output_dir else new_filename}")
-                found = True
-                break
-        
-        if not found:
-            print(f"警告: {current_rel_path} の階数情報がありません。スキップします。")
+def write_image(job):
+    """出力先のディレクトリ構造を維持し、最終的なファイル名で1回だけ書き込む"""
+    with timed(job["timings"], "encode"):
+        job["encoded"] = save_webp_measured(job.pop("processed"), job["output_path"], webp_options)
+    with timed(job["timings"], "cache"):
+        store_output(cache, job["cache_key"], job["output_path"], {})
+    if args.keep_temp:
+        with timed(job["timings"], "copy"):
+            keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+
+def link_image(job, original):
+    """重複した入力は処理せず、元の画像の出力をハードリンク（またはコピー）する"""
+    job["output_path"] = output_path_for(output_folder, job["relative_path"], job["entry"]["filename"])
+    link_or_copy(original["output_path"], job["output_path"])
+    if args.keep_temp:
+        keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+
+def finish_image(job, error):
+    """1枚分の結果を記録・表示する（入力順に呼ばれる）"""
+    relative_path, entry = job["relative_path"], job["entry"]
+    count_lookup(cache, job)
+    if error is not None:
+        print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {error}")
+        record_image(run_report, relative_path, job["timings"], entry["source"], error=str(error))
+        return
+
+    if "encoded" in job:
+        encode_seconds, output_bytes, raw_bytes = job["encoded"]
+        add_encode_sample(encode_stats, raw_bytes, output_bytes, encode_seconds)
+    record_entry(manifest, relative_path, entry["source"], job["outputs"], digest=job_digest(job))
+    record_image(run_report, relative_path, job["timings"], entry["source"], job["output_path"],
+                 duplicate_of=job.get("duplicate_of"))
+    if "duplicate_of" in job:
+        print(f"重複: {relative_path} は {job['duplicate_of']} と同じ内容のため、処理せず出力を共有します。")
+
+    if entry["keep_original"]:
+        print(f"⭕️トリミング＋リサイズ完了 (名前保持): {relative_path} -> {entry['target']}")
+    else:
+        print(f"⭕️トリミング＋リサイズ完了: {relative_path} -> {entry['target']}")
+
+# 読み込み・トリミングとリサイズ・書き出しを別々のスレッドで重ねて処理する（結果の表示は入力順）
+budget = new_memory_budget(args.memory_budget * 1024 * 1024)
+dedup = new_dedup(args.dedup)
+cache = new_encode_cache(args.cache, args.cache_size)
+run_pipeline(pending_jobs(), read_image, trim_and_resize, write_image, finish_image, args.threads, budget=budget,
+             dedup=dedup, link=link_image)
 
+print(f"{len(plan)} 個の画像ファイルが見つかりました。")
+warn_collisions(plan)
+# 入力がなくなった画像の出力は、スキャンが終わってから削除する
+remove_stale_outputs(previous_entries, current_outputs)
+save_manifest(manifest)
+if skipped_count:
+    print(f"前回から変更のない {skipped_count} 枚をスキップしました。")
+print_dedup_report(dedup)
+evict_cache(cache)
+print_cache_report(cache)
+print_encode_report(encode_stats, webp_options)
+write_run_report(run_report, output_folder, {"params": params, "skipped": skipped_count, "threads": args.threads,
+                                             "memory": budget_summary(budget), "duplicates": dedup_summary(dedup),
+                                             "cache": cache_summary(cache)})
 print("⭕️全画像のトリミング・リサイズ処理が完了し、2_output_imagesに出力しました！")
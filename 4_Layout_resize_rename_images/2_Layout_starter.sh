@@ -9,12 +9,15 @@ PROJECT_ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
 # 仮想環境のPythonインタープリタへのパス
 VENV_PYTHON="$PROJECT_ROOT/venv/bin/python"
 
+# 常駐ワーカー（2回目以降はPillowの読み込みを省略して起動する）
+RUNNER="$PROJECT_ROOT/resize_common/daemon.py"
+
 while true; do
   # 会场番号を手動で入力
   read -p "😎会場IDを入力してください（例：1234）: " NUMBER
 
   #  仮想環境のPythonインタープリタへのパス
-  "$VENV_PYTHON" "$SCRIPT_DIR/Layout_resize_rename_images.py" "$NUMBER" "$SCRIPT_DIR"
+  "$VENV_PYTHON" "$RUNNER" run "$SCRIPT_DIR/Layout_resize_rename_images.py" "$NUMBER" "$SCRIPT_DIR"
   if [ $? -eq 0 ]; then
     echo "🥳完了しました。"
   else
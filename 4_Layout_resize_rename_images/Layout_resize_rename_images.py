@@ -1,9 +1,32 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
-import shutil
 import re
-from PIL import Image, ImageChops
+import argparse
+from PIL import Image
+
+# プロジェクトルートの共通モジュール（resize_common）を読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resize_common.cli import (add_dedup_argument, add_encode_cache_arguments, add_incremental_argument,
+                               add_keep_temp_argument, add_memory_budget_argument, add_plan_only_argument,
+                               add_threads_argument, add_trim_tolerance_argument, add_webp_profile_arguments)
+from resize_common.dedup import dedup_summary, new_dedup, print_dedup_report
+from resize_common.encode_cache import (cache_summary, count_lookup, evict_cache, new_encode_cache,
+                                        print_cache_report, restore_job, store_output)
+from resize_common.encoding import (add_encode_sample, new_encode_stats, print_encode_report, save_webp_measured,
+                                    webp_options_from_args)
+from resize_common.folders import clear_folder
+from resize_common.memory_budget import budget_summary, estimate_file_memory, new_memory_budget
+from resize_common.manifest import (MANIFEST_FILENAME, job_digest, load_previous_entries, new_manifest,
+                                    output_paths, record_entry, remove_stale_outputs, save_manifest,
+                                    unchanged_entry)
+from resize_common.output import keep_temp_copy, link_or_copy, output_path_for
+from resize_common.pipeline import run_pipeline
+from resize_common.run_report import new_run_report, record_image, timed, timed_iter, write_run_report
+from resize_common.rename_plan import (add_to_plan, build_plan, print_rename_plan, skip_in_plan, stream_plan,
+                                       warn_collisions)
+from resize_common.scanner import iter_image_files
+from resize_common.trim import trim
 
 # Check for proper resampling filter based on PIL version
 try:
@@ -17,126 +40,44 @@ except AttributeError:
         # Fallback to BICUBIC which should be available in all versions
         RESAMPLING_FILTER = Image.BICUBIC
 
+# コマンド引数を解析（会場番号、作業フォルダ）
+parser = argparse.ArgumentParser()
+parser.add_argument("set_number", nargs="?", help="会場番号")
+parser.add_argument("base_dir", nargs="?", default=".", help="0_input_imagesなどがあるフォルダ")
+add_threads_argument(parser)
+add_memory_budget_argument(parser)
+add_keep_temp_argument(parser)
+add_plan_only_argument(parser)
+add_incremental_argument(parser)
+add_dedup_argument(parser)
+add_encode_cache_arguments(parser)
+add_webp_profile_arguments(parser)
+add_trim_tolerance_argument(parser)
+args = parser.parse_args()
+
+# WebPの保存オプション（デフォルトは従来どおり画質100%の無圧縮）
+webp_options = webp_options_from_args(args)
+encode_stats = new_encode_stats(args.webp_profile)
+
 # フォルダ設定
-if len(sys.argv) > 2:
-    base_dir = sys.argv[2]
-else:
-    base_dir = "."
+base_dir = args.base_dir
 input_folder = os.path.join(base_dir, "0_input_images")
 temp_folder = os.path.join(base_dir, "1_temp_images")
 output_folder = os.path.join(base_dir, "2_output_images")
 
-# --- フォルダを先にクリア ---
-def clear_folder(folder_path):
-    if os.path.exists(folder_path):
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f'{file_path} の削除に失敗しました。理由: {e}')
-
-# 1_temp_imagesと2_output_imagesをクリア
-for folder in [temp_folder, output_folder]:
-    clear_folder(folder)
-
-# --- ここまで ---
-
 target_size = (750, 750)  # キャンパスサイズ
 background_color = (255, 255, 255)  # 背景は白
 content_target_size = 700  # 内容エリアの最大辺を650にリサイズ
 
 # コマンド引数を入力（会場番号）
-if len(sys.argv) < 2:
+if args.set_number is None:
     print("使い方: resize_rename_images.py 番号（例: 7、12、123、1234）")
     sys.exit(1)
-set_number = str(sys.argv[1]).zfill(4)  # 会場ID（4桁）
+set_number = str(args.set_number).zfill(4)  # 会場ID（4桁）
 prefix = f"Layout_{set_number}_"
 
-# フォルダが存在しない場合、作成する
-os.makedirs(temp_folder, exist_ok=True)
-os.makedirs(output_folder, exist_ok=True)
-
-# トリミング関数
-def trim(image, bg_color=(255,255,255)):
-    """背景以外を自動トリミング"""
-    bg = Image.new(image.mode, image.size, bg_color)
-    diff = ImageChops.difference(image, bg)
-    bbox = diff.getbbox()
-    if bbox:
-        return image.crop(bbox)
-    else:
-        return image  # 内容がなければトリミングしない
-
-def scan_directory(dir_path, relative_path=""):
-    """ディレクトリを再帰的にスキャンして画像ファイルを見つける"""
-    image_files = []
-    
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
-        
-        # 相対パスを構築（出力時のディレクトリ構造を維持するため）
-        item_relative_path = os.path.join(relative_path, item) if relative_path else item
-        
-        if os.path.isdir(item_path):
-            # サブディレクトリの場合は再帰的に処理
-            sub_files = scan_directory(item_path, item_relative_path)
-            image_files.extend(sub_files)
-        elif item.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
-            # 画像ファイルの場合はリストに追加
-            image_files.append((item_path, item, item_relative_path))
-    
-    return image_files
-
-# ステップ1: サイズ調整してtemp_imagesに保存
-print("画像のトリミングとリサイズを開始...")
-
-# 入力フォルダを再帰的にスキャン
-image_files = scan_directory(input_folder)
-print(f"{len(image_files)} 個の画像ファイルが見つかりました。")
-
-for file_path, filename, relative_path in image_files:
-    try:
-        img = Image.open(file_path).convert("RGB")
-
-        # 内容エリアを自動トリミング
-        trimmed = trim(img)
 
-        # 内容エリアをcontent_target_sizeにリサイズ
-        w, h = trimmed.size
-        scale = content_target_size / max(w, h)
-        new_w, new_h = int(w * scale), int(h * scale)
-        trimmed = trimmed.resize((new_w, new_h), RESAMPLING_FILTER)
-
-        # 背景画像を作成し、中央に貼り付け
-        background = Image.new("RGB", target_size, background_color)
-        x = (target_size[0] - trimmed.width) // 2
-        y = (target_size[1] - trimmed.height) // 2
-        background.paste(trimmed, (x, y))
-
-        # 出力先のディレクトリ構造を維持
-        rel_dir = os.path.dirname(relative_path)
-        if rel_dir:
-            rel_temp_dir = os.path.join(temp_folder, rel_dir)
-            os.makedirs(rel_temp_dir, exist_ok=True)
-        else:
-            rel_temp_dir = temp_folder
-
-        # webp形式でtemp_imagesに保存
-        output_filename = os.path.splitext(filename)[0] + ".webp"
-        output_path = os.path.join(rel_temp_dir, output_filename)
-        background.save(output_path, "WEBP", quality=100, lossless=True)
-        print(f"⭕️トリミング＋リサイズ完了: {relative_path} -> {os.path.join(os.path.dirname(relative_path), output_filename)}")
-    except Exception as e:
-        print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {e}")
-        continue
-
-print("全画像のトリミングとリサイズが完了、リネーム処理へ...")
-
-# ステップ2: リネームしてoutput_imagesに出力
+# 出力ファイル名のルール
 def get_new_name(filename):
     # 既にLayout_で始まる場合はリネームしない
     if filename.startswith("Layout_"):
@@ -200,42 +141,168 @@ def get_new_name(filename):
         return prefix + "3.webp"
     return None
 
-# WebP画像を新しい名前で最終フォルダに出力する
-for root, dirs, files in os.walk(temp_folder):
-    # temp_folder からの相対パスを取得
-    rel_path = os.path.relpath(root, temp_folder) if root != temp_folder else ""
-    
-    for filename in files:
-        if not filename.lower().endswith(".webp"):
+def plan_file(plan, file_path, filename, relative_path):
+    """1ファイルの出力ファイル名をエンコード前に確定する（リネーム計画）"""
+    webp_filename = os.path.splitext(filename)[0] + ".webp"
+    new_name = get_new_name(webp_filename)
+    if not new_name:
+        # ルールに一致しない画像はデコードしない
+        print(f"{os.path.join(os.path.dirname(relative_path), webp_filename)} -> ルールとの不一致により、処理は行われませんでした。")
+        skip_in_plan(plan, file_path, relative_path, "ルールとの不一致")
+    else:
+        # 既にLayout_で始まる場合はリネームしない
+        add_to_plan(plan, file_path, relative_path, new_name, keep_original=(new_name == webp_filename))
+
+run_report = new_run_report("Layout")
+
+if args.plan_only:
+    print_rename_plan(build_plan(iter_image_files(input_folder), plan_file))
+    sys.exit(0)
+
+# 出力に影響する処理パラメータ（変わった場合は差分処理せず全て処理し直す）
+params = {
+    "tool": "Layout",
+    "target_size": list(target_size),
+    "background_color": list(background_color),
+    "content_target_size": content_target_size,
+    "trim_tolerance": args.trim_tolerance,
+    "filter": str(RESAMPLING_FILTER),
+    "webp": webp_options,
+}
+manifest_path = os.path.join(base_dir, MANIFEST_FILENAME)
+
+# --incremental指定時は前回のマニフェストと比較し、使えない場合だけクリアする
+previous_entries = load_previous_entries(params, manifest_path) if args.incremental else None
+if previous_entries is None:
+    # 1_temp_imagesと2_output_imagesをクリア
+    for folder in [temp_folder, output_folder]:
+        clear_folder(folder)
+    previous_entries = {}
+manifest = new_manifest(params)
+
+# フォルダが存在しない場合、作成する（1_temp_imagesは--keep-temp指定時のみ使用）
+if args.keep_temp:
+    os.makedirs(temp_folder, exist_ok=True)
+os.makedirs(output_folder, exist_ok=True)
+
+# トリミング・リサイズし、最終的なファイル名でoutput_imagesに直接保存
+print("画像のトリミングとリサイズを開始...")
+
+# 入力フォルダをスキャンしながら、見つかった画像から順に出力ファイル名を確定して処理する
+plan = {}
+image_files = timed_iter(iter_image_files(input_folder), run_report["run_stages"], "scan")
+current_outputs = []
+skipped_count = 0
+
+def pending_jobs():
+    """処理が必要な画像を、スキャンしながら1枚ずつ返す（前回から変わっていない画像は記録だけする）"""
+    global skipped_count
+    for relative_path, entry in stream_plan(plan, image_files, plan_file):
+        outputs = output_paths(output_folder, relative_path, entry["filename"], temp_folder if args.keep_temp else None)
+        current_outputs.extend(outputs)
+
+        # 前回から変わっていない画像は処理しない
+        previous = unchanged_entry(previous_entries, relative_path, entry["source"], outputs)
+        if previous is not None:
+            record_entry(manifest, relative_path, entry["source"], outputs, previous)
+            skipped_count += 1
             continue
-        
-        # 現在のファイルの相対パス
-        if rel_path == "":
-            current_rel_path = filename
-        else:
-            current_rel_path = os.path.join(rel_path, filename)
-        
-        src = os.path.join(root, filename)
-        
-        # 出力先のディレクトリ構造を維持
-        rel_output_dir = os.path.dirname(current_rel_path)
-        if rel_output_dir:
-            full_output_dir = os.path.join(output_folder, rel_output_dir)
-            os.makedirs(full_output_dir, exist_ok=True)
-        else:
-            full_output_dir = output_folder
-        
-        new_name = get_new_name(filename)
-        if new_name == filename:
-            # 既にLayout_で始まる場合はそのままコピー
-            dst = os.path.join(full_output_dir, filename)
-            shutil.copy2(src, dst)
-            print(f"{current_rel_path} -> {current_rel_path}（リネームせずコピー）")
-        elif new_name:
-            dst = os.path.join(full_output_dir, new_name)
-            shutil.copy2(src, dst)
-            print(f"{current_rel_path} -> {os.path.join(rel_output_dir, new_name) if rel_output_dir else new_name}")
-        else:
-            print(f"{current_rel_path} -> ルールとの不一致により、処理は行われませんでした。")
 
+        # トリミングのためフル解像度で読み込むので、元のサイズで作業メモリを見積もる
+        memory = estimate_file_memory(entry["source"], output_size=target_size)
+        yield {"relative_path": relative_path, "entry": entry, "source": entry["source"], "outputs": outputs,
+               "timings": {}, "memory": memory}
+
+def read_image(job):
+    """画像をフル解像度で読み込む"""
+    # 同じ入力・パラメータのエンコード結果がキャッシュにあれば、デコードせずに出力する
+    job["output_path"] = output_path_for(output_folder, job["relative_path"], job["entry"]["filename"])
+    with timed(job["timings"], "cache"):
+        if restore_job(cache, job, params, job["output_path"]):
+            if args.keep_temp:
+                keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+            return
+    with timed(job["timings"], "decode"):
+        job["img"] = Image.open(job["entry"]["source"]).convert("RGB")
+
+def trim_and_resize(job):
+    """内容エリアを自動トリミングし、背景の中央に配置する"""
+    with timed(job["timings"], "trim"):
+        trimmed = trim(job.pop("img"), tolerance=args.trim_tolerance)
+
+    with timed(job["timings"], "resize"):
+        # 内容エリアをcontent_target_sizeにリサイズ
+        w, h = trimmed.size
+        scale = content_target_size / max(w, h)
+        new_w, new_h = int(w * scale), int(h * scale)
+        trimmed = trimmed.resize((new_w, new_h), RESAMPLING_FILTER)
+
+        # 背景画像を作成し、中央に貼り付け
+        background = Image.new("RGB", target_size, background_color)
+        x = (target_size[0] - trimmed.width) // 2
+        y = (target_size[1] - trimmed.height) // 2
+        background.paste(trimmed, (x, y))
+    job["processed"] = background
+
+def write_image(job):
+    """出力先のディレクトリ構造を維持し、最終的なファイル名で1回だけ書き込む"""
+    with timed(job["timings"], "encode"):
+        job["encoded"] = save_webp_measured(job.pop("processed"), job["output_path"], webp_options)
+    with timed(job["timings"], "cache"):
+        store_output(cache, job["cache_key"], job["output_path"], {})
+    if args.keep_temp:
+        with timed(job["timings"], "copy"):
+            keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+
+def link_image(job, original):
+    """重複した入力は処理せず、元の画像の出力をハードリンク（またはコピー）する"""
+    job["output_path"] = output_path_for(output_folder, job["relative_path"], job["entry"]["filename"])
+    link_or_copy(original["output_path"], job["output_path"])
+    if args.keep_temp:
+        keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+
+def finish_image(job, error):
+    """1枚分の結果を記録・表示する（入力順に呼ばれる）"""
+    relative_path, entry = job["relative_path"], job["entry"]
+    count_lookup(cache, job)
+    if error is not None:
+        print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {error}")
+        record_image(run_report, relative_path, job["timings"], entry["source"], error=str(error))
+        return
+
+    if "encoded" in job:
+        encode_seconds, output_bytes, raw_bytes = job["encoded"]
+        add_encode_sample(encode_stats, raw_bytes, output_bytes, encode_seconds)
+    record_entry(manifest, relative_path, entry["source"], job["outputs"], digest=job_digest(job))
+    record_image(run_report, relative_path, job["timings"], entry["source"], job["output_path"],
+                 duplicate_of=job.get("duplicate_of"))
+    if "duplicate_of" in job:
+        print(f"重複: {relative_path} は {job['duplicate_of']} と同じ内容のため、処理せず出力を共有します。")
+
+    if entry["keep_original"]:
+        print(f"⭕️トリミング＋リサイズ完了: {relative_path} -> {entry['target']}（リネームなし）")
+    else:
+        print(f"⭕️トリミング＋リサイズ完了: {relative_path} -> {entry['target']}")
+
+# 読み込み・トリミングとリサイズ・書き出しを別々のスレッドで重ねて処理する（結果の表示は入力順）
+budget = new_memory_budget(args.memory_budget * 1024 * 1024)
+dedup = new_dedup(args.dedup)
+cache = new_encode_cache(args.cache, args.cache_size)
+run_pipeline(pending_jobs(), read_image, trim_and_resize, write_image, finish_image, args.threads, budget=budget,
+             dedup=dedup, link=link_image)
+
+print(f"{len(plan)} 個の画像ファイルが見つかりました。")
+warn_collisions(plan)
+# 入力がなくなった画像の出力は、スキャンが終わってから削除する
+remove_stale_outputs(previous_entries, current_outputs)
+save_manifest(manifest, manifest_path)
+if skipped_count:
+    print(f"前回から変更のない {skipped_count} 枚をスキップしました。")
+print_dedup_report(dedup)
+evict_cache(cache)
+print_cache_report(cache)
+print_encode_report(encode_stats, webp_options)
+write_run_report(run_report, output_folder, {"params": params, "skipped": skipped_count, "threads": args.threads,
+                                             "memory": budget_summary(budget), "duplicates": dedup_summary(dedup),
+                                             "cache": cache_summary(cache)})
 print("⭕️全画像のトリミング・リサイズ・リネーム処理が完了し、2_output_imagesに出力しました！")
@@ -7,11 +7,14 @@ cd "$SCRIPT_DIR" || exit 1
 PROJECT_ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
 VENV_PYTHON="$PROJECT_ROOT/venv/bin/python"
 
+# 常駐ワーカー（2回目以降はPillowの読み込みを省略して起動する）
+RUNNER="$PROJECT_ROOT/resize_common/daemon.py"
+
 while true; do
   echo "😎画像処理を開始します..."
   
   # 使 仮想環境のPythonインタープリタへのパス
-  "$VENV_PYTHON" "$SCRIPT_DIR/Access_resize_rename_images.py"
+  "$VENV_PYTHON" "$RUNNER" run "$SCRIPT_DIR/Access_resize_rename_images.py"
   if [ $? -eq 0 ]; then
     echo "🥳完了しました。"
   else
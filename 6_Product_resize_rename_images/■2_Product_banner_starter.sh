@@ -9,9 +9,12 @@ PROJECT_ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
 # 仮想環境のPythonインタープリタへのパス
 VENV_PYTHON="$PROJECT_ROOT/venv/bin/python"
 
+# 常駐ワーカー（2回目以降はPillowの読み込みを省略して起動する）
+RUNNER="$PROJECT_ROOT/resize_common/daemon.py"
+
 while true; do
   # 仮想環境のPythonを使用
-  "$VENV_PYTHON" "$SCRIPT_DIR/■Product_banner_resize_rename_images.py"
+  "$VENV_PYTHON" "$RUNNER" run "$SCRIPT_DIR/■Product_banner_resize_rename_images.py"
   if [ $? -eq 0 ]; then
     echo "🥳完了しました。"
   else
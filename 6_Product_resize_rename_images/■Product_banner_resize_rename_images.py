@@ -1,10 +1,32 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
-import shutil
 import re
+import argparse
 from PIL import Image
 
+# プロジェクトルートの共通モジュール（resize_common）を読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resize_common.cli import (add_dedup_argument, add_encode_cache_arguments, add_incremental_argument,
+                               add_keep_temp_argument, add_memory_budget_argument, add_plan_only_argument,
+                               add_shrink_on_load_argument, add_threads_argument, add_webp_profile_arguments)
+from resize_common.dedup import dedup_summary, new_dedup, print_dedup_report
+from resize_common.encode_cache import (cache_summary, count_lookup, evict_cache, new_encode_cache,
+                                        print_cache_report, restore_job, store_output)
+from resize_common.encoding import (add_encode_sample, new_encode_stats, print_encode_report, save_webp_measured,
+                                    webp_options_from_args)
+from resize_common.folders import clear_folder
+from resize_common.geometry import GEOMETRY_VERSION, resize_to_band
+from resize_common.image_loading import open_image
+from resize_common.memory_budget import budget_summary, estimate_file_memory, new_memory_budget
+from resize_common.manifest import (job_digest, load_previous_entries, new_manifest, output_paths,
+                                    record_entry, remove_stale_outputs, save_manifest, unchanged_entry)
+from resize_common.output import keep_temp_copy, link_or_copy, output_path_for
+from resize_common.pipeline import run_pipeline
+from resize_common.run_report import new_run_report, record_image, timed, timed_iter, write_run_report
+from resize_common.rename_plan import (add_to_plan, build_plan, print_rename_plan, stream_plan, warn_collisions)
+from resize_common.scanner import iter_image_files
+
 # Check for proper resampling filter based on PIL version
 try:
     # For newer Pillow versions (9.0+)
@@ -22,34 +44,28 @@ input_folder = "0_input_images"
 temp_folder = "1_temp_images"
 output_folder = "2_output_images"
 
-# --- フォルダを先にクリア ---
-def clear_folder(folder_path):
-    if os.path.exists(folder_path):
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f'{file_path} の削除に失敗しました。理由: {e}')
-
-# 1_temp_imagesと2_output_imagesをクリア
-for folder in [temp_folder, output_folder]:
-    clear_folder(folder)
-
-# --- ここまで ---
-
 target_width = 960  # 目標の幅
 target_height = 540  # 目標の高さ（16:9）
-target_ratio = target_width / target_height  # 16:9 ≈ 1.778
 min_height = 500  # 最小許容高さ
 max_height = 650  # 最大許容高さ
 
-# フォルダが存在しない場合、作成する
-os.makedirs(temp_folder, exist_ok=True)
-os.makedirs(output_folder, exist_ok=True)
+# コマンド引数を解析
+parser = argparse.ArgumentParser()
+add_shrink_on_load_argument(parser)
+add_threads_argument(parser)
+add_memory_budget_argument(parser)
+add_keep_temp_argument(parser)
+add_plan_only_argument(parser)
+add_incremental_argument(parser)
+add_dedup_argument(parser)
+add_encode_cache_arguments(parser)
+add_webp_profile_arguments(parser)
+args = parser.parse_args()
+
+# WebPの保存オプション（デフォルトは従来どおり画質100%の無圧縮）
+webp_options = webp_options_from_args(args)
+encode_stats = new_encode_stats(args.webp_profile)
+
 
 def is_product_filename(filename):
     """ファイル名がProduct_で始まるかどうかをチェック"""
@@ -109,146 +125,162 @@ def extract_info(filename):
 
 def process_image(img):
     """画像を処理する（リサイズ、必要に応じてトリミング）"""
-    original_width, original_height = img.size
-    original_ratio = original_width / original_height
-
-    # まず960pxに合わせてリサイズ
-    new_width = target_width
-    new_height = int(target_width / original_ratio)
-    img = img.resize((new_width, new_height), RESAMPLING_FILTER)
-
-    # 高さが500-650pxの範囲内の場合、トリミングしない
-    if min_height <= new_height <= max_height:
-        return img
-
-    # 範囲外の場合、16:9比率にトリミング
-    if original_ratio > target_ratio:
-        # 画像が16:9より横長の場合
-        crop_width = int(target_height * target_ratio)
-        img = img.resize((int(crop_width * (new_width/target_width)), target_height), RESAMPLING_FILTER)
-        left = (img.width - target_width) // 2
-        img = img.crop((left, 0, left + target_width, target_height))
+    # 出力サイズと元画像上の切り抜き範囲を先に求め、1回のリサイズで仕上げる
+    # （高さが許容範囲外なら目標の比率で中央を切り抜く）
+    return resize_to_band(img, (target_width, target_height), (min_height, max_height), RESAMPLING_FILTER)
+
+def plan_file(plan, file_path, filename, relative_path):
+    """1ファイルの出力ファイル名をエンコード前に確定する（リネーム計画）"""
+    if is_product_filename(filename):
+        # Product_で始まる場合は元のファイル名を変更しない（拡張子のみwebpに変更）
+        add_to_plan(plan, file_path, relative_path, f"{os.path.splitext(filename)[0]}.webp", keep_original=True)
     else:
-        # 画像が16:9より縦長の場合
-        top = (new_height - target_height) // 2
-        img = img.crop((0, top, target_width, top + target_height))
+        # ファイル名から情報を抽出して新しいファイル名を生成
+        letters, number = extract_info(filename)
+        add_to_plan(plan, file_path, relative_path, f"Product_{letters}_{number.zfill(4)}.webp")
 
-    return img
+run_report = new_run_report("Product_banner")
 
-def scan_directory(dir_path, relative_path=""):
-    """ディレクトリを再帰的にスキャンして画像ファイルを見つける"""
-    image_files = []
-    
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
-        
-        # 相対パスを構築（出力時のディレクトリ構造を維持するため）
-        item_relative_path = os.path.join(relative_path, item) if relative_path else item
-        
-        if os.path.isdir(item_path):
-            # サブディレクトリの場合は再帰的に処理
-            sub_files = scan_directory(item_path, item_relative_path)
-            image_files.extend(sub_files)
-        elif item.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
-            # 画像ファイルの場合はリストに追加
-            image_files.append((item_path, item, item_relative_path))
-    
-    return image_files
+if args.plan_only:
+    print_rename_plan(build_plan(iter_image_files(input_folder), plan_file))
+    sys.exit(0)
 
-# ステップ1: サイズ調整してtemp_imagesに保存
-print("画像のリサイズとトリミングを開始...")
-processed_files = {}  # 処理したファイルと元のファイル名を記録
+# 出力に影響する処理パラメータ（変わった場合は差分処理せず全て処理し直す）
+params = {
+    "tool": "Product_banner",
+    "target_size": [target_width, target_height],
+    "height_range": [min_height, max_height],
+    "geometry": GEOMETRY_VERSION,
+    "filter": str(RESAMPLING_FILTER),
+    "webp": webp_options,
+    "shrink_on_load": args.shrink_on_load,
+}
 
-# 入力フォルダを再帰的にスキャン
-image_files = scan_directory(input_folder)
-print(f"{len(image_files)} 個の画像ファイルが見つかりました。")
+# --incremental指定時は前回のマニフェストと比較し、使えない場合だけクリアする
+previous_entries = load_previous_entries(params) if args.incremental else None
+if previous_entries is None:
+    # 1_temp_imagesと2_output_imagesをクリア
+    for folder in [temp_folder, output_folder]:
+        clear_folder(folder)
+    previous_entries = {}
+manifest = new_manifest(params)
 
-for file_path, filename, relative_path in image_files:
-    # Product_で始まるファイル名かどうかをチェック
-    is_product = is_product_filename(filename)
+# フォルダが存在しない場合、作成する（1_temp_imagesは--keep-temp指定時のみ使用）
+if args.keep_temp:
+    os.makedirs(temp_folder, exist_ok=True)
+os.makedirs(output_folder, exist_ok=True)
 
-    try:
-        img = Image.open(file_path).convert("RGB")
-        print(f"読み込み: {relative_path} ({img.width}x{img.height})")
+# サイズ調整し、最終的なファイル名でoutput_imagesに直接保存
+print("画像のリサイズとトリミングを開始...")
 
-        # 画像処理実行
-        processed = process_image(img)
+# 入力フォルダをスキャンしながら、見つかった画像から順に出力ファイル名を確定して処理する
+plan = {}
+image_files = timed_iter(iter_image_files(input_folder), run_report["run_stages"], "scan")
+current_outputs = []
+skipped_count = 0
 
-        # 出力先のディレクトリ構造を維持
-        rel_dir = os.path.dirname(relative_path)
-        if rel_dir:
-            rel_temp_dir = os.path.join(temp_folder, rel_dir)
-            os.makedirs(rel_temp_dir, exist_ok=True)
-        else:
-            rel_temp_dir = temp_folder
-
-        if is_product:
-            # Product_で始まる場合は元のファイル名を変更しない（拡張子のみwebpに変更）
-            base_name = os.path.splitext(filename)[0]
-            output_filename = f"{base_name}.webp"
-            output_path = os.path.join(rel_temp_dir, output_filename)
-            processed.save(output_path, "WEBP", quality=100, lossless=True)
-            processed_files[relative_path] = True  # 元のファイル名を保持するフラグ
-            print(f"⭕️処理完了 (名前変更しない): {relative_path} -> {os.path.join(os.path.dirname(relative_path), output_filename)} ({processed.width}x{processed.height})")
-        else:
-            # ファイル名から情報を抽出
-            letters, number = extract_info(filename)
-            # 新しいファイル名を生成
-            output_filename = f"Product_{letters}_{number.zfill(4)}.webp"
-            output_path = os.path.join(rel_temp_dir, output_filename)
-            processed.save(output_path, "WEBP", quality=100, lossless=True)
-            processed_files[relative_path] = False  # 元のファイル名を保持しないフラグ
-            print(f"⭕️処理完了: {relative_path} -> {os.path.join(os.path.dirname(relative_path), output_filename)} ({processed.width}x{processed.height})")
-    except Exception as e:
-        print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {e}")
-        continue
-
-print("全画像の処理が完了、出力処理へ...")
-
-# ステップ2: output_imagesに出力
-for root, dirs, files in os.walk(temp_folder):
-    # temp_folder からの相対パスを取得
-    rel_path = os.path.relpath(root, temp_folder) if root != temp_folder else ""
-    
-    for filename in files:
-        if not filename.lower().endswith(".webp"):
+def pending_jobs():
+    """処理が必要な画像を、スキャンしながら1枚ずつ返す（前回から変わっていない画像は記録だけする）"""
+    global skipped_count
+    for relative_path, entry in stream_plan(plan, image_files, plan_file):
+        outputs = output_paths(output_folder, relative_path, entry["filename"], temp_folder if args.keep_temp else None)
+        current_outputs.extend(outputs)
+
+        # 前回から変わっていない画像は処理しない
+        previous = unchanged_entry(previous_entries, relative_path, entry["source"], outputs)
+        if previous is not None:
+            record_entry(manifest, relative_path, entry["source"], outputs, previous)
+            skipped_count += 1
             continue
-        
-        # 現在のファイルの相対パス
-        if rel_path == "":
-            current_rel_path = filename
-        else:
-            current_rel_path = os.path.join(rel_path, filename)
-        
-        src = os.path.join(root, filename)
-        
-        # 出力先のディレクトリ構造を維持
-        rel_output_dir = os.path.dirname(current_rel_path)
-        if rel_output_dir:
-            full_output_dir = os.path.join(output_folder, rel_output_dir)
-            os.makedirs(full_output_dir, exist_ok=True)
-        else:
-            full_output_dir = output_folder
-        
-        dst = os.path.join(full_output_dir, filename)
-        shutil.copy2(src, dst)
-    
-        # 対応する元のファイルを検索
-        found = False
-        for orig_path, keep_original in processed_files.items():
-            orig_filename = os.path.basename(orig_path)
-            orig_basename = os.path.splitext(orig_filename)[0]
-            current_basename = os.path.splitext(filename)[0]
-            
-            if current_basename.startswith(orig_basename) or orig_basename.startswith(current_basename):
-                if keep_original:
-                    print(f"出力完了 (元の名前を変更しない): {current_rel_path}")
-                else:
-                    print(f"出力完了: {current_rel_path}")
-                found = True
-                break
-        
-        if not found:
-            print(f"出力完了: {current_rel_path}")
-
-print("⭕️全画像の処理が完了し、2_output_imagesに出力しました！") 
\ No newline at end of file
+
+        memory = estimate_file_memory(entry["source"], (target_width, max_height), (target_width, max_height),
+                                      args.shrink_on_load)
+        yield {"relative_path": relative_path, "entry": entry, "source": entry["source"], "outputs": outputs,
+               "timings": {}, "memory": memory}
+
+def read_image(job):
+    """最終サイズの2倍以上を保つ範囲で縮小しながら読み込む"""
+    # 同じ入力・パラメータのエンコード結果がキャッシュにあれば、デコードせずに出力する
+    job["output_path"] = output_path_for(output_folder, job["relative_path"], job["entry"]["filename"])
+    with timed(job["timings"], "cache"):
+        if restore_job(cache, job, params, job["output_path"]):
+            if args.keep_temp:
+                keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+            return
+    with timed(job["timings"], "decode"):
+        job["img"] = open_image(job["entry"]["source"], (target_width, max_height), args.shrink_on_load)
+    job["source_size"] = job["img"].size
+
+def resize_image(job):
+    """画像処理実行"""
+    with timed(job["timings"], "resize"):
+        job["processed"] = process_image(job.pop("img"))
+
+def write_image(job):
+    """出力先のディレクトリ構造を維持し、最終的なファイル名で1回だけ書き込む"""
+    processed = job.pop("processed")
+    job["size"] = processed.size
+    with timed(job["timings"], "encode"):
+        job["encoded"] = save_webp_measured(processed, job["output_path"], webp_options)
+    with timed(job["timings"], "cache"):
+        store_output(cache, job["cache_key"], job["output_path"], {"size": job["size"]})
+    if args.keep_temp:
+        with timed(job["timings"], "copy"):
+            keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+
+def link_image(job, original):
+    """重複した入力は処理せず、元の画像の出力をハードリンク（またはコピー）する"""
+    job["output_path"] = output_path_for(output_folder, job["relative_path"], job["entry"]["filename"])
+    link_or_copy(original["output_path"], job["output_path"])
+    if args.keep_temp:
+        keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+    job["size"] = original["size"]
+
+def finish_image(job, error):
+    """1枚分の結果を記録・表示する（入力順に呼ばれる）"""
+    relative_path, entry = job["relative_path"], job["entry"]
+    count_lookup(cache, job)
+    if "source_size" in job:
+        print(f"読み込み: {relative_path} ({job['source_size'][0]}x{job['source_size'][1]})")
+    if error is not None:
+        print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {error}")
+        record_image(run_report, relative_path, job["timings"], entry["source"], error=str(error))
+        return
+
+    if "encoded" in job:
+        encode_seconds, output_bytes, raw_bytes = job["encoded"]
+        add_encode_sample(encode_stats, raw_bytes, output_bytes, encode_seconds)
+    record_entry(manifest, relative_path, entry["source"], job["outputs"], digest=job_digest(job))
+    record_image(run_report, relative_path, job["timings"], entry["source"], job["output_path"],
+                 duplicate_of=job.get("duplicate_of"))
+    if "duplicate_of" in job:
+        print(f"重複: {relative_path} は {job['duplicate_of']} と同じ内容のため、処理せず出力を共有します。")
+
+    width, height = job["size"]
+    if entry["keep_original"]:
+        print(f"⭕️処理完了 (名前変更しない): {relative_path} -> {entry['target']} ({width}x{height})")
+    else:
+        print(f"⭕️処理完了: {relative_path} -> {entry['target']} ({width}x{height})")
+
+# 読み込み・リサイズ・書き出しを別々のスレッドで重ねて処理する（結果の表示は入力順）
+budget = new_memory_budget(args.memory_budget * 1024 * 1024)
+dedup = new_dedup(args.dedup)
+cache = new_encode_cache(args.cache, args.cache_size)
+run_pipeline(pending_jobs(), read_image, resize_image, write_image, finish_image, args.threads, budget=budget,
+             dedup=dedup, link=link_image)
+
+print(f"{len(plan)} 個の画像ファイルが見つかりました。")
+warn_collisions(plan)
+# 入力がなくなった画像の出力は、スキャンが終わってから削除する
+remove_stale_outputs(previous_entries, current_outputs)
+save_manifest(manifest)
+if skipped_count:
+    print(f"前回から変更のない {skipped_count} 枚をスキップしました。")
+print_dedup_report(dedup)
+evict_cache(cache)
+print_cache_report(cache)
+print_encode_report(encode_stats, webp_options)
+write_run_report(run_report, output_folder, {"params": params, "skipped": skipped_count, "threads": args.threads,
+                                             "memory": budget_summary(budget), "duplicates": dedup_summary(dedup),
+                                             "cache": cache_summary(cache)})
+print("⭕️全画像の処理が完了し、2_output_imagesに出力しました！")
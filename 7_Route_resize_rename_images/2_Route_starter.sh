@@ -9,6 +9,9 @@ PROJECT_ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
 # 仮想環境のPythonインタープリタへのパス
 VENV_PYTHON="$PROJECT_ROOT/venv/bin/python"
 
+# 常駐ワーカー（2回目以降はPillowの読み込みを省略して起動する）
+RUNNER="$PROJECT_ROOT/resize_common/daemon.py"
+
 while true; do
   # 施設IDを入力
   read -p "😎施設IDを入力してください（例：123）: " facility_id
@@ -20,7 +23,7 @@ while true; do
   read -p "😎ルート番号を入力してください（1,2,3,4など）: " route_number
   
   #  仮想環境のPythonインタープリタへのパス
-  "$VENV_PYTHON" "$SCRIPT_DIR/Route_resize_rename_images.py" "$facility_id" "$route_number"
+  "$VENV_PYTHON" "$RUNNER" run "$SCRIPT_DIR/Route_resize_rename_images.py" "$facility_id" "$route_number"
   
   if [ $? -eq 0 ]; then
     echo "🥳完了しました。"
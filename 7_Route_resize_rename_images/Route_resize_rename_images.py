@@ -1,9 +1,33 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
-import shutil
 import re
-from PIL import Image, ImageChops
+import argparse
+from PIL import Image
+
+# プロジェクトルートの共通モジュール（resize_common）を読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resize_common.cli import (add_dedup_argument, add_encode_cache_arguments, add_incremental_argument,
+                               add_keep_temp_argument, add_memory_budget_argument, add_plan_only_argument,
+                               add_shrink_on_load_argument, add_strip_megapixels_argument, add_threads_argument,
+                               add_webp_profile_arguments)
+from resize_common.dedup import dedup_summary, new_dedup, print_dedup_report
+from resize_common.encode_cache import (cache_summary, count_lookup, evict_cache, new_encode_cache,
+                                        print_cache_report, restore_job, store_output)
+from resize_common.encoding import (add_encode_sample, new_encode_stats, print_encode_report, save_webp_measured,
+                                    webp_options_from_args)
+from resize_common.folders import clear_folder
+from resize_common.image_loading import open_image, reduce_for_target, shrink_factor
+from resize_common.memory_budget import budget_summary, estimate_file_memory, new_memory_budget
+from resize_common.manifest import (job_digest, load_previous_entries, new_manifest, output_paths,
+                                    record_entry, remove_stale_outputs, save_manifest, unchanged_entry)
+from resize_common.output import keep_temp_copy, link_or_copy, output_path_for
+from resize_common.pipeline import run_pipeline
+from resize_common.run_report import new_run_report, record_image, timed, timed_iter, write_run_report
+from resize_common.rename_plan import (add_to_plan, build_plan, print_rename_plan, stream_plan, warn_collisions)
+from resize_common.scanner import iter_image_files
+from resize_common.strips import estimate_strip_memory, probe_strips, reduce_strips, strip_dark_content_bbox
+from resize_common.trim import trim_white_borders
 
 # Check for proper resampling filter based on PIL version
 try:
@@ -22,43 +46,43 @@ input_folder = "0_input_images"
 temp_folder = "1_temp_images"
 output_folder = "2_output_images"
 
-# --- フォルダを先にクリア ---
-def clear_folder(folder_path):
-    if os.path.exists(folder_path):
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f'{file_path} の削除に失敗しました。理由: {e}')
-
-# 1_temp_imagesと2_output_imagesをクリア
-for folder in [temp_folder, output_folder]:
-    clear_folder(folder)
-
-# --- ここまで ---
-
 target_width = 960  # 目標の幅を960に変更
 target_height = 720  # 目標の高さを720に変更
 min_height = 650  # 最小許容高さ
 max_height = 800  # 最大許容高さ
+trim_threshold = 235  # この明るさ以上を空白とみなす
 
 # コマンド引数を入力（施設IDとルート番号）
-if len(sys.argv) < 3:
+parser = argparse.ArgumentParser()
+parser.add_argument("facility_id", nargs="?", help="施設ID")
+parser.add_argument("route_number", nargs="?", help="ルート番号")
+add_shrink_on_load_argument(parser)
+add_threads_argument(parser)
+add_memory_budget_argument(parser)
+add_keep_temp_argument(parser)
+add_plan_only_argument(parser)
+add_incremental_argument(parser)
+add_dedup_argument(parser)
+add_encode_cache_arguments(parser)
+add_webp_profile_arguments(parser)
+add_strip_megapixels_argument(parser)
+parser.add_argument("--trim-per-channel", action="store_true",
+                    help="グレースケールの明るさではなく、いずれかの色チャンネルがしきい値未満の画素を内容とみなす")
+args = parser.parse_args()
+
+# WebPの保存オプション（デフォルトは従来どおり画質100%の無圧縮）
+webp_options = webp_options_from_args(args)
+encode_stats = new_encode_stats(args.webp_profile)
+
+if args.route_number is None:
     print("使い方: Route_resize_rename_images.py 施設ID ルート番号")
     print("例: Route_resize_rename_images.py 123 1")
     print("出力例: Route_123_1_01.webp")
     sys.exit(1)
 
-facility_id = str(sys.argv[1]).zfill(3)  # 施設ID（3桁）
-route_number = str(sys.argv[2])  # ルート番号
+facility_id = str(args.facility_id).zfill(3)  # 施設ID（3桁）
+route_number = str(args.route_number)  # ルート番号
 
-# フォルダが存在しない場合、作成する
-os.makedirs(temp_folder, exist_ok=True)
-os.makedirs(output_folder, exist_ok=True)
 
 def is_route_filename(filename):
     """ファイル名がRoute_で始まるかどうかをチェック"""
@@ -71,43 +95,38 @@ def extract_number(filename):
         return numbers[-1]
     return "00"
 
-def trim_white_borders(img, bg_color=(255, 255, 255), threshold=235):
-    """空白の境界を自動的にトリミングする（しきい値を設定可能）"""
-    # グレースケールに変換
-    img_gray = img.convert('L')
-    
-    # しきい値より明るいピクセルをマスク
-    mask = Image.eval(img_gray, lambda x: 0 if x >= threshold else 255)
-    
-    # 実際のコンテンツの境界を取得
-    bbox = mask.getbbox()
-    
-    if bbox:
-        # 余白を追加せずに直接トリミング
-        return img.crop(bbox)
-    else:
-        return img  # 内容がなければトリミングしない
+def process_image(img, shrink_on_load=True, timings=None, log=print):
+    """画像を処理する（空白の境界をトリミングし、アスペクト比を維持しながらリサイズ）
 
-def process_image(img):
-    """画像を処理する（空白の境界をトリミングし、アスペクト比を維持しながらリサイズ）"""
+    途中経過のメッセージはlogに渡す（パイプラインでは結果と一緒に入力順で表示する）。
+    """
     original_width, original_height = img.size
     
     if original_width <= 0 or original_height <= 0:
-        print(f"警告: 画像サイズが無効です ({original_width}x{original_height})。スキップします。")
+        log(f"警告: 画像サイズが無効です ({original_width}x{original_height})。スキップします。")
         return img
     
     # 空白の境界をトリミング
-    trimmed_img = trim_white_borders(img, threshold=235)
-    print(f"トリミング: {original_width}x{original_height} -> {trimmed_img.width}x{trimmed_img.height}")
+    with timed(timings if timings is not None else {}, "trim"):
+        trimmed_img = trim_white_borders(img, trim_threshold, args.trim_per_channel)
+    log(f"トリミング: {original_width}x{original_height} -> {trimmed_img.width}x{trimmed_img.height}")
+
+    # トリミング範囲はフル解像度で求め、その後で最終サイズの2倍以上を保つ範囲で縮小する
+    if shrink_on_load:
+        trimmed_img = reduce_for_target(trimmed_img, (target_width, max_height))
     
     # トリミング後のサイズ
     trimmed_width, trimmed_height = trimmed_img.size
     
     if trimmed_width <= 0 or trimmed_height <= 0:
-        print("警告: トリミング後のサイズが無効です。元の画像を使用します。")
+        log("警告: トリミング後のサイズが無効です。元の画像を使用します。")
         trimmed_img = img
-        trimmed_width, trimmed_height = original_width, original_height
-        
+
+    return resize_trimmed(trimmed_img)
+
+def resize_trimmed(trimmed_img):
+    """トリミングした画像を、アスペクト比を維持しながら目標サイズにリサイズする"""
+    trimmed_width, trimmed_height = trimmed_img.size
     trimmed_ratio = float(trimmed_width) / float(trimmed_height) if trimmed_height > 0 else 1.0
     target_ratio = float(target_width) / float(target_height)  # 960/720 = 1.33
     
@@ -138,136 +157,197 @@ def process_image(img):
     
     return final_img
 
-def scan_directory(dir_path, relative_path=""):
-    """ディレクトリを再帰的にスキャンして画像ファイルを見つける"""
-    image_files = []
-    
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
-        
-        # 相対パスを構築（出力時のディレクトリ構造を維持するため）
-        item_relative_path = os.path.join(relative_path, item) if relative_path else item
-        
-        if os.path.isdir(item_path):
-            # サブディレクトリの場合は再帰的に処理
-            sub_files = scan_directory(item_path, item_relative_path)
-            image_files.extend(sub_files)
-        elif item.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
-            # 画像ファイルの場合はリストに追加
-            image_files.append((item_path, item, item_relative_path))
-    
-    return image_files
+def plan_file(plan, file_path, filename, relative_path):
+    """1ファイルの出力ファイル名をエンコード前に確定する（リネーム計画）"""
+    if is_route_filename(filename):
+        # Route_で始まる場合は元の名前を保持（拡張子のみwebpに変更）
+        add_to_plan(plan, file_path, relative_path, f"{os.path.splitext(filename)[0]}.webp", keep_original=True)
+    else:
+        # ファイル名から番号を抽出して新しいファイル名を生成
+        number = extract_number(filename)
+        add_to_plan(plan, file_path, relative_path, f"Route_{facility_id}_{route_number}_{number.zfill(2)}.webp")
 
-# ステップ1: サイズ調整してtemp_imagesに保存
-print("画像のリサイズとトリミングを開始...")
-processed_files = {}  # 処理したファイルと抽出された番号を記録
-keep_original_names = {}  # 元の名前を保持するファイル
+run_report = new_run_report("Route")
 
-# 入力フォルダを再帰的にスキャン
-image_files = scan_directory(input_folder)
-print(f"{len(image_files)} 個の画像ファイルが見つかりました。")
+if args.plan_only:
+    print_rename_plan(build_plan(iter_image_files(input_folder), plan_file))
+    sys.exit(0)
 
-for file_path, filename, relative_path in image_files:
-    # Route_で始まるファイル名かどうかをチェック
-    is_route = is_route_filename(filename)
+# 出力に影響する処理パラメータ（変わった場合は差分処理せず全て処理し直す）
+params = {
+    "tool": "Route",
+    "target_size": [target_width, target_height],
+    "height_range": [min_height, max_height],
+    "trim_threshold": trim_threshold,
+    "trim_per_channel": args.trim_per_channel,
+    "filter": str(RESAMPLING_FILTER),
+    "webp": webp_options,
+    "shrink_on_load": args.shrink_on_load,
+    # 帯単位で処理する画像は常にImage.reduceで縮小してからリサイズする（--no-shrink-on-load では出力の画素が変わる）
+    "strip_megapixels": args.strip_megapixels,
+}
 
-    try:
-        img = Image.open(file_path).convert("RGB")
-        
-        print(f"読み込み: {relative_path} ({img.width}x{img.height})")
-        
-        # 画像処理実行
-        processed = process_image(img)
+# --incremental指定時は前回のマニフェストと比較し、使えない場合だけクリアする
+previous_entries = load_previous_entries(params) if args.incremental else None
+if previous_entries is None:
+    # 1_temp_imagesと2_output_imagesをクリア
+    for folder in [temp_folder, output_folder]:
+        clear_folder(folder)
+    previous_entries = {}
+manifest = new_manifest(params)
 
-        # ファイル名から番号を抽出して保存
-        number = extract_number(filename)
-        processed_files[relative_path] = number
-        
-        # Route_で始まる場合は元の名前を保持
-        if is_route:
-            keep_original_names[relative_path] = True
+# フォルダが存在しない場合、作成する（1_temp_imagesは--keep-temp指定時のみ使用）
+if args.keep_temp:
+    os.makedirs(temp_folder, exist_ok=True)
+os.makedirs(output_folder, exist_ok=True)
 
-        # 元のファイル名を保持したまま、WebP形式に変換
-        base_name = os.path.splitext(filename)[0]
-        temp_filename = f"{base_name}.webp"
-        
-        # 出力先のディレクトリ構造を維持
-        rel_dir = os.path.dirname(relative_path)
-        if rel_dir:
-            rel_temp_dir = os.path.join(temp_folder, rel_dir)
-            os.makedirs(rel_temp_dir, exist_ok=True)
-            output_path = os.path.join(rel_temp_dir, temp_filename)
-        else:
-            output_path = os.path.join(temp_folder, temp_filename)
-        
-        # 画質を100%に設定して保存（無圧縮）
-        processed.save(output_path, "WEBP", quality=100, lossless=True)
-        
-        if is_route:
-            print(f"⭕️処理完了 (名前変更しない): {relative_path} -> {os.path.join(os.path.dirname(relative_path), temp_filename)} ({processed.width}x{processed.height})")
-        else:
-            print(f"⭕️処理完了: {relative_path} -> {os.path.join(os.path.dirname(relative_path), temp_filename)} ({processed.width}x{processed.height})")
-    except Exception as e:
-        print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {e}")
-        continue
+# サイズ調整し、最終的なファイル名でoutput_imagesに直接保存
+print("画像のリサイズとトリミングを開始...")
 
-print("全画像の処理が完了、名前の変更と出力処理へ...")
+# 入力フォルダをスキャンしながら、見つかった画像から順に出力ファイル名を確定して処理する
+plan = {}
+image_files = timed_iter(iter_image_files(input_folder), run_report["run_stages"], "scan")
+current_outputs = []
+skipped_count = 0
 
-# ステップ2: 名前を変更してoutput_imagesに出力
-for root, dirs, files in os.walk(temp_folder):
-    # temp_folder からの相対パスを取得
-    rel_path = os.path.relpath(root, temp_folder) if root != temp_folder else ""
-    
-    for filename in files:
-        if not filename.lower().endswith(".webp"):
+def pending_jobs():
+    """処理が必要な画像を、スキャンしながら1枚ずつ返す（前回から変わっていない画像は記録だけする）"""
+    global skipped_count
+    for relative_path, entry in stream_plan(plan, image_files, plan_file):
+        outputs = output_paths(output_folder, relative_path, entry["filename"], temp_folder if args.keep_temp else None)
+        current_outputs.extend(outputs)
+
+        # 前回から変わっていない画像は処理しない
+        previous = unchanged_entry(previous_entries, relative_path, entry["source"], outputs)
+        if previous is not None:
+            record_entry(manifest, relative_path, entry["source"], outputs, previous)
+            skipped_count += 1
             continue
-        
-        # 現在のファイルの相対パス
-        if rel_path == "":
-            current_rel_path = filename
+
+        # トリミングのためフル解像度で読み込むので、元のサイズで作業メモリを見積もる
+        # （画素数が多いPNGは帯単位で処理するので、帯の大きさで見積もる）
+        strips = probe_strips(entry["source"], args.strip_megapixels * 1_000_000)
+        if strips is not None:
+            memory = estimate_strip_memory(strips, (target_width, max_height), (target_width, max_height))
         else:
-            current_rel_path = os.path.join(rel_path, filename)
-        
-        src = os.path.join(root, filename)
-        found = False
-        
-        # 対応する元のファイル名を検索
-        for orig_path in processed_files.keys():
-            orig_filename = os.path.basename(orig_path)
-            orig_basename = os.path.splitext(orig_filename)[0]
-            current_basename = os.path.splitext(filename)[0]
-            
-            if orig_basename == current_basename:
-                # 出力先のディレクトリ構造を維持
-                rel_output_dir = os.path.dirname(current_rel_path)
-                if rel_output_dir:
-                    full_output_dir = os.path.join(output_folder, rel_output_dir)
-                    os.makedirs(full_output_dir, exist_ok=True)
-                else:
-                    full_output_dir = output_folder
-                
-                # 元の名前を保持するかどうか確認
-                if orig_path in keep_original_names:
-                    # 元の名前を変更しない（拡張子のみwebpに変更）
-                    dst = os.path.join(full_output_dir, filename)
-                    shutil.copy2(src, dst)
-                    print(f"出力完了 (元の名前を変更しない): {current_rel_path}")
-                    found = True
-                    break
-                
-                # 対応する番号を見つける
-                number = processed_files[orig_path]
-                
-                # 新しいファイル名を生成
-                new_filename = f"Route_{facility_id}_{route_number}_{number.zfill(2)}.webp"
-                
-                dst = os.path.join(full_output_dir, new_filename)
-                shutil.copy2(src, dst)
-                print(f"出力完了: {current_rel_path} -> {os.path.join(rel_output_dir, new_filename) if rel_output_dir else new_filename}")
-                found = True
-                break
-        
-        if not found:
-            print(f"警告: {current_rel_path} に対応する元のファイル名が見つかりませんでした。")
+            memory = estimate_file_memory(entry["source"], output_size=(target_width, max_height))
+        yield {"relative_path": relative_path, "entry": entry, "source": entry["source"], "outputs": outputs,
+               "timings": {}, "memory": memory, "messages": [], "strips": strips}
+
+def read_image(job):
+    """ルート図は余白をトリミングしてからリサイズするため、読み込みはフル解像度で行う"""
+    # 同じ入力・パラメータのエンコード結果がキャッシュにあれば、デコードせずに出力する
+    job["output_path"] = output_path_for(output_folder, job["relative_path"], job["entry"]["filename"])
+    with timed(job["timings"], "cache"):
+        if restore_job(cache, job, params, job["output_path"]):
+            if args.keep_temp:
+                keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+            return
+    if job["strips"] is not None:
+        # 帯単位で処理する画像は、リサイズの工程で読み込む
+        width, height = job["strips"]["size"]
+        job["messages"].append(f"読み込み: {job['relative_path']} ({width}x{height}、帯単位で処理)")
+        return
+    with timed(job["timings"], "decode"):
+        img = open_image(job["entry"]["source"])
+    job["messages"].append(f"読み込み: {job['relative_path']} ({img.width}x{img.height})")
+    job["img"] = img
+
+def process_strips(job):
+    """画素数が多いPNGを帯単位で読み込み、トリミング範囲を求めてから縮小する（画像全体をメモリに置かない）
+
+    トリミング範囲・縮小率とも process_image と同じになるため、出力も同じになる
+    （帯単位では --no-shrink-on-load を指定しても縮小する）。
+    """
+    header, timings = job["strips"], job["timings"]
+    width, height = header["size"]
+    with timed(timings, "trim"):
+        bbox = strip_dark_content_bbox(job["source"], header, trim_threshold, args.trim_per_channel)
+    if bbox is None:
+        bbox = (0, 0, width, height)  # 内容がなければトリミングしない
+    trimmed_size = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+    job["messages"].append(f"トリミング: {width}x{height} -> {trimmed_size[0]}x{trimmed_size[1]}")
+    with timed(timings, "decode"):
+        reduced = reduce_strips(job["source"], header, bbox, shrink_factor(trimmed_size, (target_width, max_height)))
+    with timed(timings, "resize"):
+        job["processed"] = resize_trimmed(reduced)
+
+def resize_image(job):
+    """画像処理実行"""
+    if job["strips"] is not None:
+        process_strips(job)
+        return
+    timings = job["timings"]
+    with timed(timings, "resize"):
+        job["processed"] = process_image(job.pop("img"), args.shrink_on_load, timings, job["messages"].append)
+    # process_image内で計測したトリミングの時間はリサイズから除く
+    timings["resize"] -= timings.get("trim", 0.0)
+
+def write_image(job):
+    """出力先のディレクトリ構造を維持し、最終的なファイル名で1回だけ書き込む（画質100%、無圧縮）"""
+    processed = job.pop("processed")
+    job["size"] = processed.size
+    with timed(job["timings"], "encode"):
+        job["encoded"] = save_webp_measured(processed, job["output_path"], webp_options)
+    with timed(job["timings"], "cache"):
+        store_output(cache, job["cache_key"], job["output_path"], {"size": job["size"]})
+    if args.keep_temp:
+        with timed(job["timings"], "copy"):
+            keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+
+def link_image(job, original):
+    """重複した入力は処理せず、元の画像の出力をハードリンク（またはコピー）する"""
+    job["output_path"] = output_path_for(output_folder, job["relative_path"], job["entry"]["filename"])
+    link_or_copy(original["output_path"], job["output_path"])
+    if args.keep_temp:
+        keep_temp_copy(job["output_path"], temp_folder, job["relative_path"])
+    job["size"] = original["size"]
+
+def finish_image(job, error):
+    """1枚分の途中経過と結果を記録・表示する（入力順に呼ばれる）"""
+    relative_path, entry = job["relative_path"], job["entry"]
+    count_lookup(cache, job)
+    for message in job["messages"]:
+        print(message)
+    if error is not None:
+        print(f"エラー: ファイル {relative_path} の処理中にエラーが発生しました: {error}")
+        record_image(run_report, relative_path, job["timings"], entry["source"], error=str(error))
+        return
+
+    if "encoded" in job:
+        encode_seconds, output_bytes, raw_bytes = job["encoded"]
+        add_encode_sample(encode_stats, raw_bytes, output_bytes, encode_seconds)
+    record_entry(manifest, relative_path, entry["source"], job["outputs"], digest=job_digest(job))
+    record_image(run_report, relative_path, job["timings"], entry["source"], job["output_path"],
+                 duplicate_of=job.get("duplicate_of"))
+    if "duplicate_of" in job:
+        print(f"重複: {relative_path} は {job['duplicate_of']} と同じ内容のため、処理せず出力を共有します。")
+
+    width, height = job["size"]
+    if entry["keep_original"]:
+        print(f"⭕️処理完了 (名前変更しない): {relative_path} -> {entry['target']} ({width}x{height})")
+    else:
+        print(f"⭕️処理完了: {relative_path} -> {entry['target']} ({width}x{height})")
+
+# 読み込み・トリミングとリサイズ・書き出しを別々のスレッドで重ねて処理する（結果の表示は入力順）
+budget = new_memory_budget(args.memory_budget * 1024 * 1024)
+dedup = new_dedup(args.dedup)
+cache = new_encode_cache(args.cache, args.cache_size)
+run_pipeline(pending_jobs(), read_image, resize_image, write_image, finish_image, args.threads, budget=budget,
+             dedup=dedup, link=link_image)
 
-print("⭕️全画像の処理が完了し、2_output_imagesに出力しました！") 
\ No newline at end of file
+print(f"{len(plan)} 個の画像ファイルが見つかりました。")
+warn_collisions(plan)
+# 入力がなくなった画像の出力は、スキャンが終わってから削除する
+remove_stale_outputs(previous_entries, current_outputs)
+save_manifest(manifest)
+if skipped_count:
+    print(f"前回から変更のない {skipped_count} 枚をスキップしました。")
+print_dedup_report(dedup)
+evict_cache(cache)
+print_cache_report(cache)
+print_encode_report(encode_stats, webp_options)
+write_run_report(run_report, output_folder, {"params": params, "skipped": skipped_count, "threads": args.threads,
+                                             "memory": budget_summary(budget), "duplicates": dedup_summary(dedup),
+                                             "cache": cache_summary(cache)})
+print("⭕️全画像の処理が完了し、2_output_imagesに出力しました！")
@@ -1,6 +1,24 @@
 import os
-import shutil
-from PIL import Image
+import sys
+import argparse
+
+# プロジェクトルートの共通モジュール（resize_common）を読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resize_common.aspect import crop_to_ratio
+from resize_common.cli import (add_dedup_argument, add_encode_cache_arguments, add_memory_budget_argument,
+                               add_shrink_on_load_argument, add_threads_argument, add_webp_profile_arguments)
+from resize_common.dedup import dedup_summary, new_dedup, print_dedup_report
+from resize_common.encode_cache import (cache_summary, count_lookup, evict_cache, new_encode_cache,
+                                        print_cache_report, restore_job, store_output)
+from resize_common.encoding import (add_encode_sample, new_encode_stats, print_encode_report, save_webp_measured,
+                                    webp_options_from_args)
+from resize_common.folders import clear_folder
+from resize_common.image_loading import open_image
+from resize_common.memory_budget import budget_summary, estimate_file_memory, new_memory_budget
+from resize_common.output import link_or_copy
+from resize_common.pipeline import run_pipeline
+from resize_common.run_report import new_run_report, record_image, timed, timed_iter, write_run_report
+from resize_common.scanner import iter_image_files
 
 # フォルダ設定
 input_folder = "0_input_images"
@@ -9,18 +27,6 @@ output_folder = "2_output_images"
 # --- フォルダを先にクリア ---
 folders_to_clear = [output_folder]
 
-def clear_folder(folder_path):
-    if os.path.exists(folder_path):
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f'{file_path} の削除に失敗しました。理由: {e}')
-
 # 2_output_imagesをクリア
 for folder in folders_to_clear:
     clear_folder(folder)
@@ -29,74 +35,117 @@ for folder in folders_to_clear:
 
 target_width = 900  # 目標の幅
 target_height = 600  # 目標の高さ（3:2）
-target_ratio = target_width / target_height  # 3:2 = 1.5
+
+# コマンド引数を解析
+parser = argparse.ArgumentParser()
+add_shrink_on_load_argument(parser)
+add_threads_argument(parser)
+add_memory_budget_argument(parser)
+add_dedup_argument(parser)
+add_encode_cache_arguments(parser)
+add_webp_profile_arguments(parser)
+args = parser.parse_args()
+
+# WebPの保存オプション（デフォルトは従来どおり画質100%の無圧縮）
+webp_options = webp_options_from_args(args)
+encode_stats = new_encode_stats(args.webp_profile)
 
 # フォルダが存在しない場合、作成する
 os.makedirs(output_folder, exist_ok=True)
 
-def process_image(img):
-    """画像を処理する（リサイズ、トリミング）"""
-    original_width, original_height = img.size
-    original_ratio = original_width / original_height
-
-    if original_ratio > target_ratio:
-        # 画像が3:2より横長の場合
-        # 高さを600pxに合わせる
-        new_height = target_height
-        new_width = int(new_height * original_ratio)
-        img = img.resize((new_width, new_height), Image.LANCZOS)
-        # 中央から切り取り
-        left = (new_width - target_width) // 2
-        img = img.crop((left, 0, left + target_width, target_height))
-    else:
-        # 画像が3:2より縦長の場合
-        # 幅を900pxに合わせる
-        new_width = target_width
-        new_height = int(new_width / original_ratio)
-        img = img.resize((new_width, new_height), Image.LANCZOS)
-        # 中央から切り取り
-        top = (new_height - target_height) // 2
-        img = img.crop((0, top, target_width, top + target_height))
-
-    return img
-
-def process_files_in_directory(input_dir, output_dir, relative_path=""):
-    """指定されたディレクトリ内のファイルを処理（サブディレクトリも含む）"""
-    current_input_dir = os.path.join(input_dir, relative_path)
-    current_output_dir = os.path.join(output_dir, relative_path)
-    
-    # 出力ディレクトリが存在しない場合は作成
-    os.makedirs(current_output_dir, exist_ok=True)
-    
-    # ディレクトリ内のファイルとサブディレクトリを処理
-    for item in os.listdir(current_input_dir):
-        item_path = os.path.join(current_input_dir, item)
-        
-        # サブディレクトリの場合は再帰的に処理
-        if os.path.isdir(item_path):
-            new_relative_path = os.path.join(relative_path, item)
-            process_files_in_directory(input_dir, output_dir, new_relative_path)
-        
-        # 画像ファイルの場合は処理
-        elif item.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
-            try:
-                img = Image.open(item_path).convert("RGB")
-                
-                # 画像処理実行
-                processed = process_image(img)
-
-                # WebP形式で保存
-                base_name = os.path.splitext(item)[0]
-                output_filename = f"{base_name}.webp"
-                output_path = os.path.join(current_output_dir, output_filename)
-                
-                # 画質を100%に設定して保存（無圧縮）
-                processed.save(output_path, "WEBP", quality=100, lossless=True)
-                print(f"⭕️処理完了: {os.path.join(relative_path, item)} -> {os.path.join(relative_path, output_filename)} ({processed.width}x{processed.height})")
-            except Exception as e:
-                print(f"エラー: ファイル {os.path.join(relative_path, item)} の処理中にエラーが発生しました: {e}")
+# 出力に影響する処理パラメータ（エンコードキャッシュのキーに使う）
+params = {
+    "tool": "3:2",
+    "target_size": [target_width, target_height],
+    "filter": "LANCZOS",
+    "webp": webp_options,
+    "shrink_on_load": args.shrink_on_load,
+}
+
+def process_files_in_directory(input_dir, output_dir):
+    """指定されたディレクトリ内のファイルを処理（サブディレクトリも含む）
+
+    スキャン中に見つかった画像から順に、読み込み・リサイズ・書き出しを別々のスレッドで重ねて処理する
+    （結果の表示は入力順）。
+    """
+    def pending_jobs():
+        image_files = timed_iter(iter_image_files(input_dir), run_report["run_stages"], "scan")
+        for item_path, item, item_relative_path in image_files:
+            memory = estimate_file_memory(item_path, (target_width, target_height), (target_width, target_height), args.shrink_on_load)
+            yield {"path": item_path, "source": item_path, "name": item, "input": item_relative_path,
+                   "relative_path": os.path.dirname(item_relative_path), "timings": {}, "memory": memory}
+
+    def output_path_of(job):
+        # 出力ディレクトリが存在しない場合は作成し、WebP形式の出力パスを返す
+        current_output_dir = os.path.join(output_dir, job["relative_path"])
+        os.makedirs(current_output_dir, exist_ok=True)
+        job["output_filename"] = f"{os.path.splitext(job['name'])[0]}.webp"
+        return os.path.join(current_output_dir, job["output_filename"])
+
+    def read_image(job):
+        # 同じ入力・パラメータのエンコード結果がキャッシュにあれば、デコードせずに出力する
+        job["output_path"] = output_path_of(job)
+        with timed(job["timings"], "cache"):
+            if restore_job(cache, job, params, job["output_path"]):
+                return
+        # 最終サイズの2倍以上を保つ範囲で縮小しながら読み込む
+        with timed(job["timings"], "decode"):
+            job["img"] = open_image(job["path"], (target_width, target_height), args.shrink_on_load)
+
+    def resize_image(job):
+        # 画像処理実行
+        with timed(job["timings"], "resize"):
+            job["processed"] = crop_to_ratio(job.pop("img"), target_width, target_height)
+
+    def write_image(job):
+        processed = job.pop("processed")
+        job["size"] = processed.size
+
+        # 指定したプロファイルで保存（デフォルトは画質100%の無圧縮）
+        with timed(job["timings"], "encode"):
+            job["encoded"] = save_webp_measured(processed, job["output_path"], webp_options)
+        with timed(job["timings"], "cache"):
+            store_output(cache, job["cache_key"], job["output_path"], {"size": job["size"]})
+
+    def link_image(job, original):
+        # 重複した入力は処理せず、元の画像の出力をハードリンク（またはコピー）する
+        job["output_path"] = link_or_copy(original["output_path"], output_path_of(job))
+        job["size"] = original["size"]
+
+    def finish_image(job, error):
+        relative_path, item = job["relative_path"], job["name"]
+        count_lookup(cache, job)
+        if error is not None:
+            print(f"エラー: ファイル {os.path.join(relative_path, item)} の処理中にエラーが発生しました: {error}")
+            record_image(run_report, os.path.join(relative_path, item), job["timings"], job["path"], error=str(error))
+            return
+
+        if "encoded" in job:
+            encode_seconds, output_bytes, raw_bytes = job["encoded"]
+            add_encode_sample(encode_stats, raw_bytes, output_bytes, encode_seconds)
+        record_image(run_report, os.path.join(relative_path, item), job["timings"], job["path"], job["output_path"],
+                     duplicate_of=job.get("duplicate_of"))
+        if "duplicate_of" in job:
+            print(f"重複: {os.path.join(relative_path, item)} は {job['duplicate_of']} と同じ内容のため、処理せず出力を共有します。")
+        width, height = job["size"]
+        print(f"⭕️処理完了: {os.path.join(relative_path, item)} -> {os.path.join(relative_path, job['output_filename'])} ({width}x{height})")
+
+    run_pipeline(pending_jobs(), read_image, resize_image, write_image, finish_image, args.threads, budget=budget,
+                 dedup=dedup, link=link_image)
+
+run_report = new_run_report("3:2")
 
 # 画像処理を実行
 print("画像のリサイズとトリミングを開始...")
+budget = new_memory_budget(args.memory_budget * 1024 * 1024)
+dedup = new_dedup(args.dedup)
+cache = new_encode_cache(args.cache, args.cache_size)
 process_files_in_directory(input_folder, output_folder)
+print_dedup_report(dedup)
+evict_cache(cache)
+print_cache_report(cache)
+print_encode_report(encode_stats, webp_options)
+write_run_report(run_report, output_folder, {"webp": webp_options, "threads": args.threads,
+                                             "memory": budget_summary(budget), "duplicates": dedup_summary(dedup),
+                                             "cache": cache_summary(cache)})
 print("処理が完了しました！")
\ No newline at end of file
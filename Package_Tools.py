@@ -10,6 +10,61 @@ import sys
 import subprocess
 import shutil
 import time
+import ast
+import json
+import hashlib
+import platform
+import tempfile
+import filecmp
+import statistics
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# 构建模式 -> 输出目录
+# onefile: 单文件，每次启动都要把Python运行时和Pillow解压到临时目录
+# onedir: 目录（可执行文件 + _internal），启动时不解压，启动更快
+BUILD_MODES = {"onefile": "dist", "onedir": "dist_onedir"}
+
+# 工具读写的图像格式所需的Pillow插件（onedir构建只收集这些）
+# Bmp/Gif/Ppm 在Pillow打开图像时总会加载，Mpo/Tiff 在读取带多图或EXIF的JPEG时使用
+PILLOW_PLUGINS_USED = {
+    "JpegImagePlugin", "MpoImagePlugin", "PngImagePlugin", "WebPImagePlugin", "TiffImagePlugin",
+    "BmpImagePlugin", "GifImagePlugin", "PpmImagePlugin",
+}
+
+# 需要打包的Python脚本: (脚本路径, 输出名, 启动测试时的参数)
+SCRIPTS_TO_BUILD = [
+    ("1_Facility_resize_rename_images/Facility_resize_rename_images.py", "Facility_Resizer", ["123"]),
+    ("2_ServiceResource_resize_rename_images/ServiceResource_resize_rename_images.py", "ServiceResource_Resizer", ["1234"]),
+    ("3_FloorMap_resize_rename_images/FloorMap_resize_rename_images.py", "FloorMap_Resizer", ["123"]),
+    ("4_Layout_resize_rename_images/Layout_resize_rename_images.py", "Layout_Resizer", ["1"]),
+    ("5_Access_resize_rename_images/Access_resize_rename_images.py", "Access_Resizer", []),
+    ("6_Product_resize_rename_images/⚫︎Product_singlefood_resize_rename_images.py", "Product_SingleFood_Resizer", []),
+    ("6_Product_resize_rename_images/■Product_banner_resize_rename_images.py", "Product_Banner_Resizer", []),
+    ("7_Route_resize_rename_images/Route_resize_rename_images.py", "Route_Resizer", ["123", "1"]),
+    ("9_900x600(3:2)_resize/3:2_resize_images.py", "3_2_Resizer", []),
+    ("10_960x540(16:9)_resize/16:9_resize_images.py", "16_9_Resizer", []),
+    ("11_960x720(4:3)_resize/4:3_resize_images.py", "4_3_Resizer", []),
+    ("12_(1:1)_resize/1:1_resize_images.py", "1_1_Resizer", ["960"]),
+    ("13_multi_ratio_resize/multi_ratio_resize_images.py", "Multi_Ratio_Resizer", ["960"]),
+]
+
+# 同时运行的PyInstaller数（每个构建占用数百MB内存，因此最多4个）
+BUILD_JOBS = max(1, min(os.cpu_count() or 1, 4))
+# 上次构建时各目标的指纹（脚本、依赖的 resize_common 模块、PyInstaller/Pillow版本），相同时跳过构建
+BUILD_STATE_FILE = os.path.join("build", "build_state.json")
+
+# 部署包目录（可执行文件按构建模式放在子目录 onefile/ onedir/ 中，启动脚本和说明共用）
+DEPLOY_DIR = "Image_Resize_Tools_Standalone"
+# 查找启动脚本时跳过的目录（虚拟环境、构建输出、部署包本身、图像目录；另外跳过所有以"."开头的目录）
+PRUNED_DIRS = {
+    "venv", "venv_package", "build", "__pycache__", "benchmarks", DEPLOY_DIR,
+    "0_input_images", "1_temp_images", "2_output_images", *BUILD_MODES.values(),
+}
+
+# 启动时间测试: 每个工具冷启动1次后，再热启动的次数
+STARTUP_BENCHMARK_RUNS = 5
+STARTUP_BENCHMARK_FILE = "startup_benchmark.json"
 
 def print_banner():
     """打印横幅"""
@@ -30,6 +85,12 @@ def print_menu():
     print()
     print("3. 📁 查看输出目录")
     print()
+    print("4. ⚡ 构建所有工具为目录版（onedir）")
+    print("   - 优点：启动时不解压，启动快；只包含用到的Pillow图像格式插件")
+    print("   - 缺点：每个工具是一个文件夹，需要整个文件夹一起复制")
+    print()
+    print("5. ⏱  启动时间测试（已构建的工具，空输入目录，冷启动/热启动）")
+    print()
     print("0. ❌ 退出")
     print()
 
@@ -75,22 +136,129 @@ def install_dependencies():
         print(f"✗ PyInstaller安装失败: {e}")
         return False
 
-def build_executable(venv_python, script_path, output_name, index, total):
-    """构建单个可执行文件"""
+def find_executable(dist_dir, output_name):
+    """查找构建出的可执行文件（单文件、onedir目录或macOS应用包），找不到时返回None"""
+    candidates = [
+        os.path.join(dist_dir, output_name, output_name),  # onedir
+        os.path.join(dist_dir, output_name, output_name + ".exe"),
+        os.path.join(dist_dir, output_name),  # onefile
+        os.path.join(dist_dir, output_name + ".exe"),
+        os.path.join(dist_dir, output_name + ".app", "Contents", "MacOS", output_name),
+    ]
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return None
+
+def bundle_size(path):
+    """文件或目录（onedir）的合计字节数"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            if not os.path.islink(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+def unused_pillow_plugins(venv_python):
+    """虚拟环境中的Pillow里，工具不使用的图像格式插件（获取失败时返回空列表，即全部收集）"""
+    try:
+        output = subprocess.check_output(
+            [venv_python, "-c", "import PIL; print(' '.join(PIL._plugins))"], text=True)
+    except (subprocess.CalledProcessError, OSError):
+        return []
+    return sorted(set(output.split()) - PILLOW_PLUGINS_USED)
+
+def imported_names(path):
+    """脚本中import的模块名（from X import Y 时也包括 X.Y，它不一定是模块）"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return []
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names += [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+    return names
+
+def dependency_files(script_path):
+    """脚本（递归地）导入的 resize_common 模块的文件"""
+    found = set()
+    pending = [script_path]
+    while pending:
+        for name in imported_names(pending.pop()):
+            parts = name.split(".")
+            if parts[0] != "resize_common":
+                continue
+            # 包本身的 __init__.py 也会被打包
+            for module_path in (os.path.join("resize_common", "__init__.py"),
+                                os.path.join(*parts) + ".py"):
+                if os.path.isfile(module_path) and module_path not in found:
+                    found.add(module_path)
+                    pending.append(module_path)
+    return sorted(found)
+
+def toolchain_versions(venv_python):
+    """构建环境的Python、PyInstaller、Pillow版本（获取失败时返回None，此时不跳过构建）"""
+    try:
+        return subprocess.check_output(
+            [venv_python, "-c",
+             "import sys, PyInstaller, PIL; print(sys.version.split()[0], PyInstaller.__version__, PIL.__version__)"],
+            text=True).strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+def build_fingerprint(script_paths, mode, excludes, toolchain):
+    """构建结果取决于的所有输入（脚本及其依赖）的哈希"""
+    files = {}
+    for script_path in script_paths:
+        for path in [script_path] + dependency_files(script_path):
+            with open(path, "rb") as f:
+                files[path] = hashlib.sha256(f.read()).hexdigest()
+    identity = {"files": files, "mode": mode, "excludes": list(excludes), "toolchain": toolchain}
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()
+
+def load_build_state():
+    try:
+        with open(BUILD_STATE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_build_state(state):
+    os.makedirs(os.path.dirname(BUILD_STATE_FILE), exist_ok=True)
+    with open(BUILD_STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+
+def build_executable(venv_python, script_path, output_name, index, total, mode="onefile", excludes=()):
+    """构建单个可执行文件（mode为onedir时构建为目录），返回 (是否成功, 构建秒数)
+    
+    各目标使用各自的工作目录（build/模式/输出名），可以同时构建多个。
+    """
     print(f"[{index}/{total}] 正在构建: {script_path}")
+    dist_dir = BUILD_MODES[mode]
     
     # PyInstaller命令
     cmd = [
         venv_python, "-m", "PyInstaller",
-        "--onefile",  # 单文件
+        "--onefile" if mode == "onefile" else "--onedir",  # 单文件 / 目录
         "--console",  # 有控制台窗口（macOS兼容）
         "--name", output_name,
-        "--distpath", "dist",
-        "--workpath", "build",
-        "--specpath", "build",
-        "--clean",  # 清理临时文件
-        script_path
+        "--distpath", dist_dir,
+        "--workpath", os.path.join("build", mode),  # PyInstaller在其下按输出名分目录
+        "--specpath", os.path.join("build", mode),
+        "--paths", os.path.abspath("."),  # 共享模块 resize_common 所在的项目根目录
     ]
+    if mode == "onedir":
+        cmd.append("--noconfirm")  # 覆盖已有的输出目录时不询问
+    for module in excludes:
+        cmd += ["--exclude-module", f"PIL.{module}"]
+    cmd.append(script_path)
     
     start_time = time.time()
     
@@ -101,32 +269,31 @@ def build_executable(venv_python, script_path, output_name, index, total):
         
         if result.returncode == 0:
             # 检查输出文件
-            output_file = os.path.join("dist", output_name)
-            if os.path.exists(output_file):
-                size_mb = os.path.getsize(output_file) / (1024 * 1024)
+            output_file = find_executable(dist_dir, output_name)
+            if output_file:
+                bundle = output_file if mode == "onefile" else os.path.join(dist_dir, output_name)
+                size_mb = bundle_size(bundle) / (1024 * 1024)
                 print(f"✓ {output_name} 构建成功 ({size_mb:.1f} MB, {build_time:.1f}s)")
-                return True
+                return True, build_time
             else:
                 print(f"✗ {output_name} 构建失败: 输出文件不存在")
-                return False
+                return False, build_time
         else:
             print(f"✗ {output_name} 构建失败:")
             print(f"  错误信息: {result.stderr}")
-            return False
+            return False, build_time
             
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"✗ {output_name} 构建失败: {e}")
-        return False
+        return False, time.time() - start_time
 
-def run_pyinstaller_build():
-    """运行PyInstaller构建"""
-    print("启动PyInstaller构建...")
-    
+def prepare_pyinstaller():
+    """设置虚拟环境并确认已安装PyInstaller，返回虚拟环境的Python路径（失败时返回None）"""
     # 设置虚拟环境
     venv_python = setup_virtual_environment()
     if not venv_python:
         print("❌ 无法设置虚拟环境")
-        return
+        return None
     
     # 检查PyInstaller是否安装
     try:
@@ -136,116 +303,252 @@ def run_pyinstaller_build():
     except subprocess.CalledProcessError:
         print("PyInstaller未安装，正在安装...")
         if not install_dependencies():
-            return
+            return None
+    return venv_python
+
+def run_pyinstaller_build(mode="onefile"):
+    """运行PyInstaller构建（mode: onefile 或 onedir）"""
+    print(f"启动PyInstaller构建（{mode}）...")
+    
+    venv_python = prepare_pyinstaller()
+    if not venv_python:
+        return
     
     # 创建输出目录
-    os.makedirs("dist", exist_ok=True)
-    os.makedirs("build", exist_ok=True)
-    
-    # 需要打包的Python脚本列表
-    scripts_to_build = [
-        ("1_Facility_resize_rename_images/Facility_resize_rename_images.py", "Facility_Resizer"),
-        ("2_ServiceResource_resize_rename_images/ServiceResource_resize_rename_images.py", "ServiceResource_Resizer"),
-        ("3_FloorMap_resize_rename_images/FloorMap_resize_rename_images.py", "FloorMap_Resizer"),
-        ("4_Layout_resize_rename_images/Layout_resize_rename_images.py", "Layout_Resizer"),
-        ("5_Access_resize_rename_images/Access_resize_rename_images.py", "Access_Resizer"),
-        ("6_Product_resize_rename_images/Product_singlefood_resize_rename_images.py", "Product_SingleFood_Resizer"),
-        ("6_Product_resize_rename_images/Product_banner_resize_rename_images.py", "Product_Banner_Resizer"),
-        ("7_Route_resize_rename_images/Route_resize_rename_images.py", "Route_Resizer"),
-        ("9_900x600(3:2)_resize/3:2_resize_images.py", "3_2_Resizer"),
-        ("10_960x540(16:9)_resize/16:9_resize_images.py", "16_9_Resizer"),
-        ("11_960x720(4:3)_resize/4:3_resize_images.py", "4_3_Resizer"),
-        ("12_(1:1)_resize/1:1_resize_images.py", "1_1_Resizer"),
-    ]
+    dist_dir = BUILD_MODES[mode]
+    os.makedirs(dist_dir, exist_ok=True)
+    os.makedirs(os.path.join("build", mode), exist_ok=True)
+    
+    # onedir构建只收集用到的Pillow插件
+    excludes = unused_pillow_plugins(venv_python) if mode == "onedir" else []
+    if excludes:
+        print(f"不收集 {len(excludes)} 个未使用的Pillow图像格式插件")
     
     # 过滤存在的脚本
-    existing_scripts = [(path, name) for path, name in scripts_to_build if os.path.exists(path)]
+    existing_scripts = [(path, name) for path, name, _ in SCRIPTS_TO_BUILD if os.path.exists(path)]
     
     if not existing_scripts:
         print("❌ 未找到任何Python脚本文件")
         return
     
-    print(f"找到 {len(existing_scripts)} 个脚本文件，开始构建...")
+    # 与上次构建的指纹相同、且输出仍存在的目标跳过构建
+    toolchain = toolchain_versions(venv_python)
+    state = load_build_state()
+    targets, results = [], {}
+    for script_path, output_name in existing_scripts:
+        state_key = f"{mode}/{output_name}"
+        fingerprint = build_fingerprint([script_path], mode, excludes, toolchain) if toolchain else None
+        if fingerprint and state.get(state_key) == fingerprint and find_executable(dist_dir, output_name):
+            results[output_name] = ("缓存命中", 0.0)
+        else:
+            targets.append((script_path, output_name, state_key, fingerprint))
+    
+    print(f"找到 {len(existing_scripts)} 个脚本文件，{len(results)} 个未变更，"
+          f"构建 {len(targets)} 个（并行 {BUILD_JOBS}）...")
     print()
     
-    # 构建所有脚本
-    success_count = 0
+    # 并行构建变更的脚本
+    total_targets = len(targets)
+    with ThreadPoolExecutor(BUILD_JOBS) as executor:
+        futures = [
+            (target, executor.submit(build_executable, venv_python, target[0], target[1],
+                                     i, total_targets, mode, excludes))
+            for i, target in enumerate(targets, 1)
+        ]
+        for (script_path, output_name, state_key, fingerprint), future in futures:
+            success, build_time = future.result()
+            results[output_name] = ("构建" if success else "失败", build_time)
+            if success and fingerprint:
+                state[state_key] = fingerprint
+            else:
+                state.pop(state_key, None)
+    save_build_state(state)
+    success_count = sum(1 for status, _ in results.values() if status != "失败")
     total_scripts = len(existing_scripts)
     
-    for i, (script_path, output_name) in enumerate(existing_scripts, 1):
-        if build_executable(venv_python, script_path, output_name, i, total_scripts):
-            success_count += 1
-    
     print()
     print("=" * 60)
-    print(f"构建完成！成功: {success_count}/{total_scripts}")
+    print(f"{'目标':<28}{'结果':<10}{'耗时':>8}")
+    for _, output_name in existing_scripts:
+        status, build_time = results[output_name]
+        print(f"{output_name:<28}{status:<10}{build_time:>7.1f}s")
+    print("-" * 60)
+    print(f"构建完成！成功: {success_count}/{total_scripts}"
+          f"（缓存命中: {total_scripts - total_targets}，重新构建: {total_targets}）")
     print("=" * 60)
     
     if success_count > 0:
-        print(f"输出目录: dist/")
+        print(f"输出目录: {dist_dir}/")
         
         # 创建部署包
-        create_deployment_package()
+        create_deployment_package(mode)
         
         print("\n🎉 构建成功！现在可以：")
-        print("1. 将 dist/ 目录中的可执行文件复制到其他环境使用")
-        print("2. 或者使用 Image_Resize_Tools_Standalone/ 部署包")
+        print(f"1. 将 {dist_dir}/ 目录中的可执行文件复制到其他环境使用")
+        print(f"2. 或者使用 {DEPLOY_DIR}/ 部署包")
     else:
         print("❌ 所有构建都失败了，请检查错误信息")
 
-def create_deployment_package():
-    """创建部署包"""
+def layout_sizes():
+    """各构建方式的部署大小（字节，单文件版和目录版为所有工具的合计）"""
+    sizes = {}
+    for mode, dist_dir in BUILD_MODES.items():
+        total, count = 0, 0
+        for _, name, _ in SCRIPTS_TO_BUILD:
+            executable = find_executable(dist_dir, name)
+            if executable:
+                total += bundle_size(executable if mode == "onefile" else os.path.join(dist_dir, name))
+                count += 1
+        if count:
+            sizes[mode] = total
+    return sizes
+
+def new_copy_stats():
+    """部署包的复制统计（扫描/复制的文件数和字节数，删除的旧文件数）"""
+    return {"scanned_files": 0, "scanned_bytes": 0, "copied_files": 0, "copied_bytes": 0, "removed_files": 0}
+
+def remove_path(path):
+    """删除文件、链接或目录（不存在时什么也不做）"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.unlink(path)
+
+def sync_file(src, dst, stats, expected):
+    """只在内容有变化时复制文件（大小和修改时间相同则跳过，只有修改时间不同时比较内容）
+    
+    符号链接（例如macOS应用包中的链接）作为链接复制。dst记录到expected中。
+    """
+    expected.add(os.path.normpath(dst))
+    src_stat = os.lstat(src)
+    stats["scanned_files"] += 1
+    stats["scanned_bytes"] += src_stat.st_size
+    
+    if os.path.islink(src):
+        target = os.readlink(src)
+        if os.path.islink(dst) and os.readlink(dst) == target:
+            return
+        remove_path(dst)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        os.symlink(target, dst)
+        stats["copied_files"] += 1
+        return
+    
+    if os.path.isfile(dst) and not os.path.islink(dst):
+        dst_stat = os.stat(dst)
+        if dst_stat.st_size == src_stat.st_size:
+            if dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+                return
+            if filecmp.cmp(src, dst, shallow=False):
+                shutil.copystat(src, dst)  # 下次只比较大小和修改时间
+                return
+    
+    remove_path(dst)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.copy2(src, dst)
+    stats["copied_files"] += 1
+    stats["copied_bytes"] += src_stat.st_size
+
+def sync_tree(src_dir, dst_dir, stats, expected):
+    """目录（onedir、macOS应用包）中有变化的文件复制到dst_dir"""
+    for root, dirs, files in os.walk(src_dir):
+        rel_path = os.path.relpath(root, src_dir)
+        # 指向目录的符号链接不进入，作为链接复制
+        for name in [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            dirs.remove(name)
+            files.append(name)
+        for file in files:
+            sync_file(os.path.join(root, file), os.path.normpath(os.path.join(dst_dir, rel_path, file)), stats, expected)
+
+def remove_stale_files(deploy_dir, expected, stats, keep_dirs=()):
+    """删除部署包中这次没有复制的旧文件（以及变空的目录）
+    
+    keep_dirs（部署包下的子目录名，即其他构建模式的可执行文件）中的文件不删除。
+    """
+    for root, dirs, files in os.walk(deploy_dir, topdown=False):
+        if os.path.relpath(root, deploy_dir).split(os.sep)[0] in keep_dirs:
+            continue
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            path = os.path.normpath(os.path.join(root, name))
+            if path not in expected:
+                os.unlink(path)
+                stats["removed_files"] += 1
+        if root != deploy_dir and not os.listdir(root):
+            os.rmdir(root)
+
+def create_deployment_package(mode="onefile"):
+    """创建部署包（只复制有变化的文件，并删除旧文件）
+    
+    可执行文件复制到以构建模式命名的子目录，不影响其他构建模式已部署的可执行文件。
+    """
     print("\n正在创建部署包...")
     
     # 创建部署目录
-    deploy_dir = "Image_Resize_Tools_Standalone"
-    if os.path.exists(deploy_dir):
-        shutil.rmtree(deploy_dir)
-    os.makedirs(deploy_dir)
+    deploy_dir = DEPLOY_DIR
+    dist_dir = BUILD_MODES[mode]
+    bin_dir = os.path.join(deploy_dir, mode)
+    os.makedirs(bin_dir, exist_ok=True)
+    stats = new_copy_stats()
+    # 这次部署包中应有的文件（其余作为旧文件删除）
+    expected = set()
     
     # 复制可执行文件
-    if os.path.exists("dist"):
-        for file in os.listdir("dist"):
-            file_path = os.path.join("dist", file)
+    if os.path.exists(dist_dir):
+        for file in os.listdir(dist_dir):
+            file_path = os.path.join(dist_dir, file)
             
             # 处理不同类型的可执行文件
             if file.endswith(".exe"):  # Windows
-                shutil.copy2(file_path, deploy_dir)
+                sync_file(file_path, os.path.join(bin_dir, file), stats, expected)
             elif file.endswith(".app"):  # macOS应用包
                 # 复制整个.app文件夹
-                shutil.copytree(file_path, os.path.join(deploy_dir, file))
+                sync_tree(file_path, os.path.join(bin_dir, file), stats, expected)
             elif not file.endswith(".") and os.path.isfile(file_path):  # Unix可执行文件
-                shutil.copy2(file_path, deploy_dir)
+                sync_file(file_path, os.path.join(bin_dir, file), stats, expected)
+            elif find_executable(dist_dir, file):  # onedir目录（可执行文件和 _internal）
+                sync_tree(file_path, os.path.join(bin_dir, file), stats, expected)
     
     # 复制启动脚本
-    copy_starter_scripts(deploy_dir)
+    copy_starter_scripts(deploy_dir, stats, expected)
     
     # 复制用户手册
     if os.path.exists("★User_manual.xlsx"):
-        shutil.copy2("★User_manual.xlsx", deploy_dir)
+        sync_file("★User_manual.xlsx", os.path.join(deploy_dir, "★User_manual.xlsx"), stats, expected)
     
     # 创建README
     create_readme(deploy_dir)
+    expected.add(os.path.normpath(os.path.join(deploy_dir, "README.md")))
     
     # 创建使用说明
     create_usage_guide(deploy_dir)
+    expected.add(os.path.normpath(os.path.join(deploy_dir, "使用说明.md")))
+    
+    remove_stale_files(deploy_dir, expected, stats, keep_dirs=[m for m in BUILD_MODES if m != mode])
     
-    print(f"✓ 部署包已创建: {deploy_dir}/")
+    mb = 1024 * 1024
+    print(f"扫描 {stats['scanned_files']} 个文件 ({stats['scanned_bytes'] / mb:.1f} MB)，"
+          f"复制 {stats['copied_files']} 个 ({stats['copied_bytes'] / mb:.1f} MB)，"
+          f"删除旧文件 {stats['removed_files']} 个")
+    print(f"✓ 部署包已创建: {deploy_dir}/（可执行文件: {bin_dir}/）")
+    return stats
 
-def copy_starter_scripts(deploy_dir):
-    """复制启动脚本"""
+def copy_starter_scripts(deploy_dir, stats=None, expected=None):
+    """复制启动脚本（跳过虚拟环境、构建输出、部署包等目录）"""
+    stats = new_copy_stats() if stats is None else stats
+    expected = set() if expected is None else expected
     scripts_dir = os.path.join(deploy_dir, "启动脚本")
     os.makedirs(scripts_dir, exist_ok=True)
     
     # 复制所有.sh文件
     for root, dirs, files in os.walk("."):
+        dirs[:] = [d for d in dirs if d not in PRUNED_DIRS and not d.startswith(".")]
         for file in files:
             if file.endswith(".sh"):
                 # 创建相对路径
                 rel_path = os.path.relpath(root, ".")
-                target_dir = os.path.join(scripts_dir, rel_path)
-                os.makedirs(target_dir, exist_ok=True)
-                shutil.copy2(os.path.join(root, file), target_dir)
+                target = os.path.normpath(os.path.join(scripts_dir, rel_path, file))
+                sync_file(os.path.join(root, file), target, stats, expected)
+    return stats
 
 def create_readme(deploy_dir):
     """创建README文件"""
@@ -256,7 +559,7 @@ def create_readme(deploy_dir):
 
 ## 使用方法
 1. 将整个文件夹复制到目标环境
-2. 双击对应的可执行文件即可运行
+2. 双击对应的可执行文件即可运行（按构建方式放在 onefile/（单文件版）、onedir/（目录版）中）
 3. 或者使用启动脚本（.sh文件）
 
 ## 工具列表
@@ -272,9 +575,10 @@ def create_readme(deploy_dir):
 - 16_9_Resizer: 16:9比例图像处理
 - 4_3_Resizer: 4:3比例图像处理
 - 1_1_Resizer: 1:1比例图像处理
+- Multi_Ratio_Resizer: 按比例共享解码，同时输出3:2/16:9/4:3/1:1比例（与单比例工具逐像素一致）
 
 ## 注意事项
-- 首次运行可能需要几秒钟启动时间
+- 首次运行可能需要几秒钟启动时间（目录版 onedir 不需要解压，启动更快）
 - 确保有足够的磁盘空间
 - 支持Windows、macOS和Linux系统
 
@@ -326,11 +630,45 @@ def create_usage_guide(deploy_dir):
 - 16:9比例: 16_9_Resizer
 - 4:3比例: 4_3_Resizer
 - 1:1比例: 1_1_Resizer
+- 全比例一次输出: Multi_Ratio_Resizer [1:1尺寸] [--profiles 3:2,16:9]
+  （每张图只解码一次，分别输出到 2_output_images/900x600_3-2/ 等子目录）
 
 ## 输入输出目录
 - 输入图像: 0_input_images/
-- 临时文件: 1_temp_images/
+- 临时文件: 1_temp_images/（仅在重命名工具加 --keep-temp 参数时生成，用于调试）
 - 输出图像: 2_output_images/
+- 增量处理: 重命名工具加 --incremental 参数时不清空输出目录，只处理新增或修改的图像，
+  并删除已不存在的输入对应的输出（记录保存在 .resize_manifest.json）
+- WebP编码: 各工具可用 --webp-profile lossless|high|lossy 选择编码方式（默认 lossless，与以前相同；high 和 lossy 均为有损压缩），
+  可用 --webp-quality / --webp-method 微调；运行结束时显示编码时间、输出大小和压缩率
+- 运行报告: 每次运行后在 2_output_images 旁生成 run_report.json，记录各阶段（扫描、解码、裁剪、缩放、编码、复制）
+  每张图像的耗时和字节数，以及合计、p50、p95、最大值
+- 裁剪容差: FloorMap/Layout/Access 可用 --trim-tolerance N 把与背景色相差 N 以内的像素（扫描噪点）视为空白（默认 0，与以前相同）
+  Route 可用 --trim-per-channel 改为按颜色通道判断（任一通道低于阈值即视为内容）
+- 常驻进程: 启动脚本（.sh）通过 resize_common/daemon.py 在后台保留一个已加载Pillow的进程，
+  第二次起不再重复启动Python和加载库（空闲30分钟后自动退出；设置 RESIZE_TOOLS_NO_DAEMON=1 可直接运行）
+- 内存预算: 解码前读取图像头估算内存占用，Facility 并行处理时只在估算合计不超过 --memory-budget MB（默认 2048）时开始处理下一张；
+  超过 --max-megapixels（默认 100 百万像素）的图像即使指定 --no-shrink-on-load 也按缩小读取处理
+- 多线程流水线: 除 Facility（使用 --jobs 多进程）外，各工具把读取解码、裁剪缩放、编码写出分别放在不同线程中重叠执行，
+  线程数用 --threads N 指定（默认 CPU 数，1 为逐张顺序处理），同样受 --memory-budget 限制；日志按输入顺序显示
+- 批量运行: python resize_common/batch.py 清单.csv 按 CSV/JSON 清单（列: tool, input, id, route, size, args）一次运行多个任务，
+  只启动一次Python；--jobs N 用 N 个工作进程并行，各任务日志写入各自目录的 batch_job.log，汇总写入 batch_report.json
+- 重复输入: 默认 --dedup exact，内容完全相同的输入图片只处理一次，其余输出用硬链接（或复制）共享；
+  --dedup near 还会合并重新保存的近似图片，--dedup off 关闭。重复项记录在 run_report.json 的 duplicates 中
+- 编码缓存: 指定 --cache 时（默认关闭）按（输入内容哈希、工具、尺寸等处理参数、WebP设置）缓存编码结果，保存在用户缓存目录
+  （Linux: ~/.cache/resize_tools/encode_cache，macOS: ~/Library/Caches/resize_tools，Windows: %LOCALAPPDATA%\resize_tools；
+  可用环境变量 RESIZE_TOOLS_CACHE_DIR 更改）。相同输入再次运行（例如只换了施设ID）时不解码，直接复制输出；
+  --cache-size MB 设置上限（超出时删除最久未使用的）。未指定 --cache 时不计算哈希、不写缓存。命中/未命中数显示在运行结果和 run_report.json 中
+- 打包方式: Package_Tools.py 选项1构建单文件版（dist/，每次启动都要解压运行时），选项4构建目录版（dist_onedir/，
+  每个工具一个文件夹，启动时不解压，只包含用到的Pillow插件）；选项5用空输入目录启动各工具，
+  记录冷启动和热启动时间到 startup_benchmark.json，用于比较打包方式对启动时间的影响
+- 增量构建: 各工具并行构建（工作目录 build/模式/工具名），脚本、依赖的 resize_common 模块和 PyInstaller/Pillow 版本
+  都与上次相同的工具跳过构建（记录在 build/build_state.json，删除即可全部重新构建）；结束时显示每个工具的结果和耗时
+  部署包（Image_Resize_Tools_Standalone/）也只复制有变化的文件，并删除已不在构建结果中的旧文件
+- 超大图像: FloorMap/Route 中超过 --strip-megapixels（默认 50 百万像素）的PNG（8位、非隔行）按行分段解码，
+  先逐段求裁剪范围，再逐段缩小，内存只占一段的大小（Route 的输出与整体解码相同）
+- 清空目录: 运行开始时把 1_temp_images/2_output_images 改名为 .2_output_images.trash-* 后立即新建空目录，
+  旧文件在后台线程中删除（处理同时进行）；中断后残留的 .trash-* 目录在下次运行时一并删除
 
 ## 故障排除
 1. 确保输入目录有图像文件
@@ -346,36 +684,109 @@ def show_output_directories():
     print("输出目录信息：")
     print()
     
-    if os.path.exists("dist"):
-        print("📁 dist/ 目录 (可执行文件):")
-        files = os.listdir("dist")
-        if files:
-            for file in files:
-                size = os.path.getsize(os.path.join("dist", file))
-                size_mb = size / (1024 * 1024)
-                print(f"   - {file} ({size_mb:.1f} MB)")
+    for mode, dist_dir in BUILD_MODES.items():
+        if os.path.exists(dist_dir):
+            print(f"📁 {dist_dir}/ 目录 (可执行文件, {mode}):")
+            files = os.listdir(dist_dir)
+            if files:
+                for file in files:
+                    size = bundle_size(os.path.join(dist_dir, file))
+                    size_mb = size / (1024 * 1024)
+                    print(f"   - {file} ({size_mb:.1f} MB)")
+            else:
+                print("   (空)")
         else:
-            print("   (空)")
-    else:
-        print("📁 dist/ 目录不存在")
-    
-    print()
+            print(f"📁 {dist_dir}/ 目录不存在")
+        
+        print()
     
-    if os.path.exists("Image_Resize_Tools_Standalone"):
-        print("📁 Image_Resize_Tools_Standalone/ 目录 (部署包):")
-        files = os.listdir("Image_Resize_Tools_Standalone")
+    if os.path.exists(DEPLOY_DIR):
+        print(f"📁 {DEPLOY_DIR}/ 目录 (部署包):")
+        files = os.listdir(DEPLOY_DIR)
         if files:
             for file in files:
                 print(f"   - {file}")
         else:
             print("   (空)")
     else:
-        print("📁 Image_Resize_Tools_Standalone/ 目录不存在")
+        print(f"📁 {DEPLOY_DIR}/ 目录不存在")
     
     print()
-    print("💡 提示：构建完成后，可以将 Image_Resize_Tools_Standalone/ 目录")
+    print(f"💡 提示：构建完成后，可以将 {DEPLOY_DIR}/ 目录")
     print("   复制到其他环境使用，无需安装Python")
 
+def time_startup(executable, args):
+    """在只有空输入目录的临时目录中启动一次工具，返回 (耗时秒, 退出码)"""
+    with tempfile.TemporaryDirectory(prefix="startup_benchmark_") as work_dir:
+        os.makedirs(os.path.join(work_dir, "0_input_images"))
+        start_time = time.perf_counter()
+        result = subprocess.run([os.path.abspath(executable)] + args, cwd=work_dir,
+                                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return time.perf_counter() - start_time, result.returncode
+
+def run_startup_benchmark(runs=STARTUP_BENCHMARK_RUNS):
+    """已构建的各工具（onefile/onedir）的启动时间测试
+    
+    输入目录为空，因此测得的基本是启动（解压、加载Python和Pillow）的时间。
+    构建后第一次启动记为冷启动，之后的runs次取中位数记为热启动。
+    """
+    results = []
+    for mode, dist_dir in BUILD_MODES.items():
+        for script_path, output_name, args in SCRIPTS_TO_BUILD:
+            executable = find_executable(dist_dir, output_name)
+            bundle = executable if mode == "onefile" else os.path.join(dist_dir, output_name)
+            if not executable:
+                continue
+            print(f"[{mode}] {output_name} ...", end=" ", flush=True)
+            cold_sec, exit_code = time_startup(executable, args)
+            warm = [time_startup(executable, args)[0] for _ in range(runs)]
+            results.append({
+                "tool": output_name,
+                "mode": mode,
+                "size_mb": round(bundle_size(bundle) / (1024 * 1024), 1),
+                "cold_sec": round(cold_sec, 3),
+                "warm_median_sec": round(statistics.median(warm), 3),
+                "warm_min_sec": round(min(warm), 3),
+                "warm_runs": len(warm),
+                "exit_code": exit_code,
+            })
+            print(f"冷启动 {cold_sec:.2f}s / 热启动 {statistics.median(warm):.2f}s")
+    
+    if not results:
+        print("❌ 未找到已构建的可执行文件，请先构建（选项1或4）")
+        return None
+    
+    print()
+    print(f"{'工具':<28}{'模式':<10}{'大小MB':>8}{'冷启动s':>10}{'热启动s':>10}")
+    for result in results:
+        print(f"{result['tool']:<28}{result['mode']:<10}{result['size_mb']:>8.1f}"
+              f"{result['cold_sec']:>10.2f}{result['warm_median_sec']:>10.2f}")
+    
+    # 构建方式之间的比较（部署大小，各工具启动时间的中位数）
+    layouts = {}
+    for mode, size in layout_sizes().items():
+        mode_results = [result for result in results if result["mode"] == mode]
+        layouts[mode] = {
+            "size_mb": round(size / (1024 * 1024), 1),
+            "cold_median_sec": round(statistics.median(r["cold_sec"] for r in mode_results), 3),
+            "warm_median_sec": round(statistics.median(r["warm_median_sec"] for r in mode_results), 3),
+        }
+    print()
+    print(f"{'构建方式':<14}{'部署大小MB':>12}{'冷启动s':>10}{'热启动s':>10}")
+    for mode, layout in layouts.items():
+        print(f"{mode:<14}{layout['size_mb']:>12.1f}{layout['cold_median_sec']:>10.2f}{layout['warm_median_sec']:>10.2f}")
+    
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "layouts": layouts,
+        "results": results,
+    }
+    with open(STARTUP_BENCHMARK_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"\n✓ 结果已保存: {STARTUP_BENCHMARK_FILE}")
+    return report
+
 def main():
     """主函数"""
     while True:
@@ -383,7 +794,7 @@ def main():
         print_menu()
         
         try:
-            choice = input("请输入选择 (0-3): ").strip()
+            choice = input("请输入选择 (0-5): ").strip()
             
             if choice == "0":
                 print("\n👋 再见！")
@@ -397,10 +808,16 @@ def main():
             elif choice == "3":
                 print("\n📁 查看输出目录...")
                 show_output_directories()
+            elif choice == "4":
+                print("\n⚡ 开始构建目录版（onedir）...")
+                run_pyinstaller_build("onedir")
+            elif choice == "5":
+                print("\n⏱  开始启动时间测试...")
+                run_startup_benchmark()
             else:
-                print("\n❌ 无效选择，请输入0-3")
+                print("\n❌ 无效选择，请输入0-5")
             
-            if choice in ["1", "2", "3"]:
+            if choice in ["1", "2", "3", "4", "5"]:
                 input("\n按回车键继续...")
                 
         except KeyboardInterrupt:
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""ベンチマーク用の合成画像セットを作成する
+
+同じシード・枚数・倍率なら毎回同じ画像が作られる（再現可能）。
+- photos: 写真風（解像度・縦横比・形式がさまざま。パノラマ、縦長、正方形を含む）
+- floormaps: 白い余白のあるフロアマップ風（FloorMap / Access 用）
+- layouts: 白い余白のあるレイアウト図風（Layout 用。ファイル名にレイアウト名を含む）
+- routes: 白い余白のあるルート図風（Route 用）
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import numpy as np
+from PIL import Image, ImageDraw
+
+CORPUS_VERSION = 1
+
+# 写真風の画像サイズ（幅, 高さ）と形式
+PHOTO_SIZES = [
+    (4032, 3024),  # スマートフォン（4:3）
+    (6000, 4000),  # 一眼レフ（3:2）
+    (1920, 1080),  # 16:9
+    (7200, 1800),  # パノラマ
+    (1080, 1920),  # 縦長
+    (2400, 2400),  # 正方形
+    (3000, 2000),
+    (800, 600),    # 小さい画像
+]
+PHOTO_FORMATS = [("jpg", "JPEG", {"quality": 90}), ("png", "PNG", {}), ("webp", "WEBP", {"quality": 90})]
+
+# Layout のファイル名（リネーム規則に一致するレイアウト名）
+LAYOUT_NAMES = ["シアター", "スクール", "島型", "T字島型", "ロの字", "正餐", "立食", "コの字"]
+
+DEFAULT_COUNTS = {"photos": 24, "floormaps": 12, "layouts": 16, "routes": 12}
+
+def scaled(size, scale):
+    """倍率を掛けたサイズ（最小16px）"""
+    return tuple(max(16, int(v * scale)) for v in size)
+
+def make_photo(rng, size):
+    """グラデーションとノイズで写真に近いエンコード負荷の画像を作る"""
+    width, height = size
+    np_rng = np.random.default_rng(rng.randrange(2**32))
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :, None]
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+    base = np.array([rng.random() for _ in range(3)], dtype=np.float32)[None, None, :]
+    slope = np.array([rng.random() for _ in range(3)], dtype=np.float32)[None, None, :]
+    pixels = (base * 120 + slope * 100 * x + (1 - slope) * 100 * y) + np_rng.normal(0, 12, (height, width, 3))
+    img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+
+    # 被写体の代わりにいくつか図形を描く
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(3, 8)):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 3 + 1), y0 + rng.randrange(height // 3 + 1)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x0, y0, x1, y1), fill=color)
+    return img
+
+def make_diagram(rng, size, margin_ratio, line_width):
+    """白い余白の中に線と部屋を描いた図面風の画像を作る（余白にわずかなノイズを入れる）"""
+    width, height = size
+    img = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    mx, my = int(width * margin_ratio * rng.uniform(0.5, 1.5)), int(height * margin_ratio * rng.uniform(0.5, 1.5))
+    left, top, right, bottom = mx, my, width - mx, height - my
+    draw.rectangle((left, top, right, bottom), outline=(40, 40, 40), width=line_width)
+    for _ in range(rng.randint(4, 12)):
+        x0, y0 = rng.randint(left, right), rng.randint(top, bottom)
+        x1, y1 = min(right, x0 + rng.randrange(width // 4 + 1)), min(bottom, y0 + rng.randrange(height // 4 + 1))
+        draw.rectangle((x0, y0, x1, y1), outline=(60, 60, 60), fill=tuple(rng.randint(200, 250) for _ in range(3)), width=line_width)
+    for _ in range(rng.randint(1, 4)):
+        points = [(rng.randint(left, right), rng.randint(top, bottom)) for _ in range(rng.randint(2, 6))]
+        draw.line(points, fill=tuple(rng.randrange(200) for _ in range(3)), width=line_width * 2)
+    # スキャンや書き出しで入る、ほぼ白のノイズ
+    for _ in range(rng.randint(0, 20)):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.point((x, y), fill=(rng.randint(245, 254),) * 3)
+    return img
+
+def save_image(img, path, format_name, params):
+    """画像を保存し、記録用の情報を返す"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    img.save(path, format_name, **params)
+    return {"file": path, "width": img.width, "height": img.height, "bytes": os.path.getsize(path)}
+
+def generate_photos(rng, folder, count, scale):
+    files = []
+    for i in range(count):
+        size = scaled(PHOTO_SIZES[i % len(PHOTO_SIZES)], scale)
+        ext, format_name, params = PHOTO_FORMATS[i % len(PHOTO_FORMATS)]
+        # 一部はサブフォルダに置き、ディレクトリ構造の維持も計測に含める
+        subfolder = f"set_{i // 8 + 1}" if i % 3 == 0 else ""
+        path = os.path.join(folder, subfolder, f"photo_{i + 1:03d}.{ext}")
+        files.append(save_image(make_photo(rng, size), path, format_name, params))
+    return files
+
+def generate_floormaps(rng, folder, count, scale):
+    files = []
+    for i in range(count):
+        size = scaled(rng.choice([(3000, 2000), (2480, 3508), (4000, 4000), (1600, 1200)]), scale)
+        img = make_diagram(rng, size, margin_ratio=0.12, line_width=max(1, int(6 * scale)))
+        ext, format_name, params = ("png", "PNG", {}) if i % 2 == 0 else ("jpg", "JPEG", {"quality": 95})
+        # 最初の数字が施設ID（Access）、最後の数字が階数（FloorMap）になる
+        files.append(save_image(img, os.path.join(folder, f"floor_{i + 1:03d}F.{ext}"), format_name, params))
+    return files
+
+def generate_layouts(rng, folder, count, scale):
+    files = []
+    for i in range(count):
+        size = scaled(rng.choice([(2000, 1500), (3000, 2000), (1500, 2000)]), scale)
+        img = make_diagram(rng, size, margin_ratio=0.15, line_width=max(1, int(5 * scale)))
+        # 同じレイアウト名は出力名が重なるため、部屋ごとのフォルダに分ける
+        room = f"room_{i // len(LAYOUT_NAMES) + 1:02d}"
+        name = LAYOUT_NAMES[i % len(LAYOUT_NAMES)]
+        files.append(save_image(img, os.path.join(folder, room, f"{name}.png"), "PNG", {}))
+    return files
+
+def generate_routes(rng, folder, count, scale):
+    files = []
+    for i in range(count):
+        size = scaled(rng.choice([(2400, 1800), (1800, 2400), (3200, 1800), (1200, 1200)]), scale)
+        img = make_diagram(rng, size, margin_ratio=0.2, line_width=max(1, int(4 * scale)))
+        ext, format_name, params = ("png", "PNG", {}) if i % 2 == 0 else ("webp", "WEBP", {"lossless": True})
+        files.append(save_image(img, os.path.join(folder, f"route_{i + 1:02d}.{ext}"), format_name, params))
+    return files
+
+GENERATORS = {
+    "photos": generate_photos,
+    "floormaps": generate_floormaps,
+    "layouts": generate_layouts,
+    "routes": generate_routes,
+}
+
+def corpus_settings(seed, scale, counts):
+    """コーパスを特定する設定（これが同じなら作り直さない）"""
+    return {"version": CORPUS_VERSION, "seed": seed, "scale": scale, "counts": counts}
+
+def load_corpus_info(corpus_dir):
+    """作成済みのコーパス情報（corpus.json）を読み込む"""
+    info_path = os.path.join(corpus_dir, "corpus.json")
+    if not os.path.exists(info_path):
+        return None
+    with open(info_path, encoding="utf-8") as f:
+        return json.load(f)
+
+def generate_corpus(corpus_dir, seed=0, scale=1.0, counts=None):
+    """コーパスを作成し、画像ごとのサイズをcorpus.jsonに記録する（同じ設定で作成済みなら再利用）"""
+    counts = dict(DEFAULT_COUNTS, **(counts or {}))
+    settings = corpus_settings(seed, scale, counts)
+    info = load_corpus_info(corpus_dir)
+    if info is not None and info.get("settings") == settings:
+        return info
+
+    info = {"settings": settings, "kinds": {}}
+    for kind, generate in GENERATORS.items():
+        folder = os.path.join(corpus_dir, kind)
+        if os.path.isdir(folder):
+            for root, _, filenames in os.walk(folder):
+                for filename in filenames:
+                    os.unlink(os.path.join(root, filename))
+        # 種類ごとに独立した乱数にし、枚数を変えても他の種類の画像が変わらないようにする
+        rng = random.Random(f"{seed}:{kind}")
+        files = generate(rng, folder, counts[kind], scale)
+        for item in files:
+            item["file"] = os.path.relpath(item["file"], folder)
+        info["kinds"][kind] = files
+        print(f"{kind}: {len(files)} 枚を作成しました -> {folder}")
+
+    with open(os.path.join(corpus_dir, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=1)
+    return info
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成画像セットを作成する")
+    parser.add_argument("corpus_dir", help="作成先のフォルダ")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード（デフォルト: 0）")
+    parser.add_argument("--scale", type=float, default=1.0, help="画像サイズの倍率（短時間で試す場合は0.25など）")
+    for kind, count in DEFAULT_COUNTS.items():
+        parser.add_argument(f"--{kind}", type=int, default=count, help=f"{kind} の枚数（デフォルト: {count}）")
+    args = parser.parse_args(argv)
+
+    counts = {kind: getattr(args, kind) for kind in DEFAULT_COUNTS}
+    info = generate_corpus(args.corpus_dir, args.seed, args.scale, counts)
+    total = sum(len(files) for files in info["kinds"].values())
+    print(f"⭕️{total} 枚の画像を {args.corpus_dir} に用意しました。")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""全ツールのエンドツーエンド・ベンチマーク
+
+合成画像セット（generate_corpus.py）に対して各ツールを実行し、
+枚数/秒・MP/秒・最大メモリ使用量（RSS）・出力バイト数をJSONに記録する。
+
+使い方:
+  python benchmarks/run_benchmarks.py run -o results.json [--scale 0.25] [--tools Facility,Route]
+  python benchmarks/run_benchmarks.py compare baseline.json results.json [--threshold 10]
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_GENERATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generate_corpus.py")
+CORPUS_KINDS = ["photos", "floormaps", "layouts", "routes"]
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "resize_tools_benchmark_corpus")
+
+# ツール名: (スクリプト, 引数, 使う画像セット)
+TOOLS = {
+    "Facility": ("1_Facility_resize_rename_images/Facility_resize_rename_images.py", ["123"], "photos"),
+    "ServiceResource": ("2_ServiceResource_resize_rename_images/ServiceResource_resize_rename_images.py", ["1234"], "photos"),
+    "FloorMap": ("3_FloorMap_resize_rename_images/FloorMap_resize_rename_images.py", ["123"], "floormaps"),
+    "Layout": ("4_Layout_resize_rename_images/Layout_resize_rename_images.py", ["1"], "layouts"),
+    "Access": ("5_Access_resize_rename_images/Access_resize_rename_images.py", [], "floormaps"),
+    "Product_banner": ("6_Product_resize_rename_images/■Product_banner_resize_rename_images.py", [], "photos"),
+    "Product_singlefood": ("6_Product_resize_rename_images/⚫︎Product_singlefood_resize_rename_images.py", [], "photos"),
+    "Route": ("7_Route_resize_rename_images/Route_resize_rename_images.py", ["123", "1"], "routes"),
+    "3:2": ("9_900x600(3:2)_resize/3:2_resize_images.py", [], "photos"),
+    "16:9": ("10_960x540(16:9)_resize/16:9_resize_images.py", [], "photos"),
+    "4:3": ("11_960x720(4:3)_resize/4:3_resize_images.py", [], "photos"),
+    "1:1": ("12_(1:1)_resize/1:1_resize_images.py", ["960"], "photos"),
+    "multi_ratio": ("13_multi_ratio_resize/multi_ratio_resize_images.py", ["960"], "photos"),
+}
+
+# 指標: 大きい方が良い(True) / 小さい方が良い(False)
+METRICS = {
+    "images_per_sec": True,
+    "megapixels_per_sec": True,
+    "peak_rss_mb": False,
+    "output_bytes": False,
+}
+
+def folder_size(folder):
+    """フォルダ内のファイル数と合計バイト数"""
+    count, total = 0, 0
+    for root, _, filenames in os.walk(folder):
+        for filename in filenames:
+            count += 1
+            total += os.path.getsize(os.path.join(root, filename))
+    return count, total
+
+def prepare_corpus(args):
+    """画像セットを別プロセスで作成（作成済みなら再利用）し、corpus.jsonを読み込む
+
+    Linuxではexec前の親プロセスの最大RSSが子に引き継がれるため、
+    このスクリプト自体はnumpyやPillowを読み込まず、計測値に混ざらないようにする。
+    """
+    command = [sys.executable, CORPUS_GENERATOR, args.corpus, "--seed", str(args.seed), "--scale", str(args.scale)]
+    for kind in CORPUS_KINDS:
+        if getattr(args, kind) is not None:
+            command += [f"--{kind}", str(getattr(args, kind))]
+    subprocess.run(command, check=True)
+    with open(os.path.join(args.corpus, "corpus.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def pillow_version(python):
+    """ツールを実行するPythonのPillowのバージョン"""
+    result = subprocess.run([python, "-c", "import PIL; print(PIL.__version__)"], capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+def run_process(command, cwd, log_path):
+    """コマンドを実行し、(終了コード, 経過時間, 最大RSS[MB]) を返す"""
+    with open(log_path, "w", encoding="utf-8") as log:
+        start_time = time.perf_counter()
+        process = subprocess.Popen(command, cwd=cwd, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            # 子プロセス単位のリソース使用量（子が待機した孫プロセスも含む）
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # macOSはバイト、Linuxはキロバイト単位
+            peak_rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        else:
+            process.wait()
+            peak_rss_mb = None
+        elapsed = time.perf_counter() - start_time
+    return process.returncode, elapsed, peak_rss_mb
+
+def benchmark_tool(name, corpus_dir, corpus_info, python, extra_args, repeat, keep_work_dir):
+    """1つのツールを作業フォルダで実行し、指標を返す（繰り返した場合は最速の回を採用）"""
+    script, tool_args, kind = TOOLS[name]
+    inputs = corpus_info["kinds"][kind]
+    megapixels = sum(item["width"] * item["height"] for item in inputs) / 1_000_000
+    input_bytes = sum(item["bytes"] for item in inputs)
+
+    work_dir = tempfile.mkdtemp(prefix="resize_bench_")
+    os.symlink(os.path.abspath(os.path.join(corpus_dir, kind)), os.path.join(work_dir, "0_input_images"))
+    command = [python, os.path.join(PROJECT_ROOT, script)] + tool_args + extra_args
+
+    runs = []
+    for i in range(repeat):
+        log_path = os.path.join(work_dir, f"run_{i + 1}.log")
+        returncode, elapsed, peak_rss_mb = run_process(command, work_dir, log_path)
+        output_count, output_bytes = folder_size(os.path.join(work_dir, "2_output_images"))
+        runs.append({"returncode": returncode, "elapsed": elapsed, "peak_rss_mb": peak_rss_mb,
+                     "outputs": output_count, "output_bytes": output_bytes, "log": log_path})
+
+    best = min(runs, key=lambda run: run["elapsed"])
+    rss_values = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+    result = {
+        "script": script,
+        "args": tool_args + extra_args,
+        "corpus": kind,
+        "images": len(inputs),
+        "input_megapixels": round(megapixels, 3),
+        "input_bytes": input_bytes,
+        "outputs": best["outputs"],
+        "output_bytes": best["output_bytes"],
+        "elapsed": round(best["elapsed"], 4),
+        "elapsed_runs": [round(run["elapsed"], 4) for run in runs],
+        "images_per_sec": round(len(inputs) / best["elapsed"], 4) if best["elapsed"] > 0 else None,
+        "megapixels_per_sec": round(megapixels / best["elapsed"], 4) if best["elapsed"] > 0 else None,
+        "peak_rss_mb": round(max(rss_values), 1) if rss_values else None,
+        "returncode": max((run["returncode"] for run in runs), key=abs),
+    }
+    if result["returncode"] != 0:
+        result["log"] = best["log"]
+        print(f"エラー: {name} が終了コード {result['returncode']} で終了しました。ログ: {best['log']}")
+    elif not keep_work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+def command_run(args):
+    """ベンチマークを実行してJSONに保存する"""
+    tools = list(TOOLS) if args.tools is None else [t.strip() for t in args.tools.split(",") if t.strip()]
+    unknown = [t for t in tools if t not in TOOLS]
+    if unknown:
+        print(f"エラー: 不明なツール: {', '.join(unknown)}（指定可能: {', '.join(TOOLS)}）")
+        return 2
+
+    corpus_info = prepare_corpus(args)
+    extra_args = shlex.split(args.tool_args) if args.tool_args else []
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pillow": pillow_version(args.python),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": corpus_info["settings"],
+        "repeat": args.repeat,
+        "tools": {},
+    }
+    failed = False
+    for name in tools:
+        print(f"計測中: {name} ...", flush=True)
+        result = benchmark_tool(name, args.corpus, corpus_info, args.python, extra_args, args.repeat, args.keep_work_dir)
+        report["tools"][name] = result
+        failed = failed or result["returncode"] != 0
+        print(f"  {result['images_per_sec']} 枚/秒, {result['megapixels_per_sec']} MP/秒, "
+              f"最大RSS {result['peak_rss_mb']} MB, 出力 {result['output_bytes'] / (1024 * 1024):.2f} MB")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"⭕️結果を {args.output} に保存しました。")
+    return 1 if failed else 0
+
+def compare_reports(baseline, current, threshold):
+    """指標ごとの変化率を比べ、閾値（%）を超えて悪化したものを返す"""
+    rows, regressions = [], []
+    for name, current_result in current["tools"].items():
+        baseline_result = baseline["tools"].get(name)
+        if baseline_result is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            before, after = baseline_result.get(metric), current_result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            regressed = (-change if higher_is_better else change) > threshold
+            rows.append((name, metric, before, after, change, regressed))
+            if regressed:
+                regressions.append((name, metric, before, after, change))
+    return rows, regressions
+
+def command_compare(args):
+    """2つの結果を比較し、悪化があれば終了コード1を返す"""
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    if baseline.get("corpus") != current.get("corpus"):
+        print("警告: 2つの結果で画像セットの設定が異なります。比較結果は参考値です。")
+
+    rows, regressions = compare_reports(baseline, current, args.threshold)
+    print(f"{'ツール':<20}{'指標':<20}{'基準':>14}{'今回':>14}{'変化':>10}")
+    for name, metric, before, after, change, regressed in rows:
+        mark = "  ❌悪化" if regressed else ""
+        print(f"{name:<20}{metric:<20}{before:>14.4g}{after:>14.4g}{change:>+9.1f}%{mark}")
+
+    for name, result in current["tools"].items():
+        if result.get("returncode"):
+            regressions.append((name, "returncode", 0, result["returncode"], 0))
+            print(f"エラー: {name} が失敗しています（終了コード {result['returncode']}）")
+
+    if regressions:
+        print(f"😢{len(regressions)} 件の指標が閾値 {args.threshold}% を超えて悪化しました。")
+        return 1
+    print(f"🥳閾値 {args.threshold}% を超える悪化はありません。")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="リサイズツールのエンドツーエンド・ベンチマーク")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="ベンチマークを実行してJSONに保存する")
+    run_parser.add_argument("-o", "--output", default="benchmark_results.json", help="結果のJSONファイル")
+    run_parser.add_argument("--tools", default=None, help=f"計測するツール（カンマ区切り、省略時は全て: {', '.join(TOOLS)}）")
+    run_parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR, help="画像セットのフォルダ（なければ作成する）")
+    run_parser.add_argument("--seed", type=int, default=0, help="画像セットの乱数シード")
+    run_parser.add_argument("--scale", type=float, default=1.0, help="画像サイズの倍率（短時間で試す場合は0.25など）")
+    for kind in CORPUS_KINDS:
+        run_parser.add_argument(f"--{kind}", type=int, default=None, help=f"{kind} の枚数（省略時はgenerate_corpus.pyのデフォルト）")
+    run_parser.add_argument("--repeat", type=int, default=1, help="各ツールの実行回数（最速の回を採用）")
+    run_parser.add_argument("--python", default=sys.executable, help="ツールを実行するPython")
+    run_parser.add_argument("--tool-args", default="", help="全ツールに追加で渡す引数（例: \"--webp-profile lossy\"）")
+    run_parser.add_argument("--keep-work-dir", action="store_true", help="作業フォルダ（出力とログ）を削除せずに残す")
+    run_parser.set_defaults(func=command_run)
+
+    compare_parser = subparsers.add_parser("compare", help="2つの結果を比較し、悪化があれば失敗する")
+    compare_parser.add_argument("baseline", help="基準の結果JSON")
+    compare_parser.add_argument("current", help="今回の結果JSON")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="許容する悪化の割合（%%、デフォルト: 10）")
+    compare_parser.set_defaults(func=command_compare)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "repeat", 1) < 1:
+        parser.error("--repeat は1以上を指定してください")
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""余白トリミングのベンチマーク（従来の実装と resize_common.trim の比較）
+
+大きなルート図・フロアマップ風の画像を作り、従来の実装と同じ範囲が得られることを確認したうえで、
+それぞれの処理時間を比べる。
+- route: Route の trim_white_borders（グレースケールのしきい値）
+- floormap: FloorMap / Layout / Access の trim（背景色との差分）
+
+使い方:
+  python benchmarks/trim_benchmark.py
+  python benchmarks/trim_benchmark.py --sizes 8000x6000 15000x10000 --repeat 5
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from PIL import Image, ImageChops
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generate_corpus import make_diagram
+from resize_common.trim import content_bbox, dark_content_bbox
+
+DEFAULT_SIZES = ["4000x3000", "8000x6000", "15000x10000"]
+ROUTE_THRESHOLD = 235
+
+def reference_route_bbox(img, threshold=ROUTE_THRESHOLD):
+    """従来の Route の trim_white_borders の範囲（1画素ずつPythonのlambdaでマスクを作る）"""
+    img_gray = img.convert('L')
+    mask = Image.eval(img_gray, lambda x: 0 if x >= threshold else 255)
+    return mask.getbbox()
+
+def reference_floormap_bbox(image, bg_color=(255, 255, 255)):
+    """従来の FloorMap / Layout / Access の trim の範囲（フルサイズの背景画像との差分）"""
+    bg = Image.new(image.mode, image.size, bg_color)
+    diff = ImageChops.difference(image, bg)
+    return diff.getbbox()
+
+CASES = {
+    "route": (reference_route_bbox, lambda img: dark_content_bbox(img, ROUTE_THRESHOLD), 0.2),
+    "floormap": (reference_floormap_bbox, content_bbox, 0.12),
+}
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def best_time(function, img, repeat):
+    """repeat回実行した中で最短の時間と結果を返す"""
+    best, result = None, None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function(img)
+        seconds = time.perf_counter() - start_time
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="余白トリミングの従来実装と新実装を比較する")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="画像サイズ（幅x高さ）")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES), help="比較する処理")
+    parser.add_argument("--repeat", type=int, default=3, help="各計測の回数（最短時間を使う）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    args = parser.parse_args(argv)
+
+    mismatches = 0
+    print(f"{'処理':<10}{'サイズ':>14}{'従来(秒)':>12}{'新(秒)':>12}{'速度比':>10}  範囲")
+    for size_text in args.sizes:
+        size = parse_size(size_text)
+        for case in args.cases:
+            reference, vectorized, margin_ratio = CASES[case]
+            rng = random.Random(f"{args.seed}:{case}:{size_text}")
+            img = make_diagram(rng, size, margin_ratio=margin_ratio, line_width=max(1, size[0] // 1000))
+            old_seconds, old_bbox = best_time(reference, img, args.repeat)
+            new_seconds, new_bbox = best_time(vectorized, img, args.repeat)
+            same = old_bbox == new_bbox
+            mismatches += not same
+            print(f"{case:<10}{size_text:>14}{old_seconds:>12.3f}{new_seconds:>12.3f}{old_seconds / new_seconds:>9.1f}x  "
+                  f"{new_bbox}{'' if same else f' ≠ 従来 {old_bbox}'}")
+            del img
+
+    if mismatches:
+        print(f"❌従来の実装と範囲が異なる結果が {mismatches} 件ありました。")
+        return 1
+    print("⭕️すべて従来の実装と同じ範囲でした。")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
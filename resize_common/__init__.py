@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""各リサイズツールで共通して使う処理"""
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""比率を揃える変換（中央の切り取り、白背景の正方形化）
+
+9_ / 10_ / 11_ / 12_ のツールと 13_multi_ratio_resize で同じ関数を使い、出力を一致させる。
+"""
+from PIL import Image
+
+def crop_to_ratio(img, target_width, target_height):
+    """画像を処理する（リサイズ、中央から切り取り）"""
+    target_ratio = target_width / target_height
+    original_width, original_height = img.size
+    original_ratio = original_width / original_height
+
+    if original_ratio > target_ratio:
+        # 画像が目標比率より横長の場合、高さを合わせる
+        new_height = target_height
+        new_width = int(new_height * original_ratio)
+        img = img.resize((new_width, new_height), Image.LANCZOS)
+        # 中央から切り取り
+        left = (new_width - target_width) // 2
+        img = img.crop((left, 0, left + target_width, target_height))
+    else:
+        # 画像が目標比率より縦長の場合、幅を合わせる
+        new_width = target_width
+        new_height = int(new_width / original_ratio)
+        img = img.resize((new_width, new_height), Image.LANCZOS)
+        # 中央から切り取り
+        top = (new_height - target_height) // 2
+        img = img.crop((0, top, target_width, top + target_height))
+
+    return img
+
+def pad_to_square(img, target_size):
+    """画像を処理する（長辺を維持し、短辺を拡張して正方形にする）"""
+    original_width, original_height = img.size
+
+    # 長辺のサイズを決定
+    if original_width >= original_height:
+        # 横長の画像
+        aspect_ratio = target_size / original_width
+        new_width = target_size
+        new_height = int(original_height * aspect_ratio)
+    else:
+        # 縦長の画像
+        aspect_ratio = target_size / original_height
+        new_height = target_size
+        new_width = int(original_width * aspect_ratio)
+
+    # リサイズ
+    resized_img = img.resize((new_width, new_height), Image.LANCZOS)
+
+    # 正方形のキャンバスを作成（白背景）
+    square_img = Image.new("RGB", (target_size, target_size), (255, 255, 255))
+
+    # リサイズした画像を中央に配置
+    paste_x = (target_size - new_width) // 2
+    paste_y = (target_size - new_height) // 2
+    square_img.paste(resized_img, (paste_x, paste_y))
+
+    return square_img
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""一括実行（バッチマニフェスト）
+
+CSVまたはJSONのマニフェストに並べた複数のジョブ（ツール・入力フォルダ・ID・ルート番号/サイズ）を
+1回の起動で順に実行し、最後に全ジョブの集計を batch_report.json に書き出す。
+Pythonの起動とPillowの読み込みは1回だけで済み、--jobs N を指定すると N 個のワーカープロセスで
+ジョブを並列に実行する（ワーカーはジョブ間で使い回す）。
+
+マニフェストの列（CSVは1行目に列名、JSONはオブジェクトのリスト）:
+  tool   ツール名（Facility, ServiceResource, FloorMap, Layout, Access, Product_banner,
+         Product_singlefood, Route, 3:2, 16:9, 4:3, 1:1, multi_ratio）
+  input  0_input_imagesがあるフォルダ（0_input_images自体を指定してもよい。相対パスはマニフェストの場所から）
+  id     施設ID・会場ID（Facility, ServiceResource, FloorMap, Layout, Route）
+  route  ルート番号（Route）
+  size   画像サイズ（1:1、multi_ratioでは省略可）
+  args   ツールに渡す追加の引数（例: "--incremental --webp-profile lossy"）
+
+例（CSV）:
+  tool,input,id,route,size,args
+  Facility,clients/A,123,,,
+  Route,clients/A_route,123,2,,--incremental
+  1:1,clients/A_square,,,960,
+
+使い方:
+  python resize_common/batch.py マニフェスト.csv [--jobs N] [--report batch_report.json]
+"""
+import os
+import sys
+import csv
+import json
+import time
+import shlex
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# プロジェクトルートの共通モジュール（resize_common）を読み込めるようにする
+sys.path.insert(0, PROJECT_ROOT)
+from resize_common.run_report import REPORT_FILENAME
+from resize_common.runner import run_script
+
+INPUT_FOLDER = "0_input_images"
+BATCH_REPORT_FILENAME = "batch_report.json"
+JOB_LOG_FILENAME = "batch_job.log"
+
+# ツール名: (スクリプト, 必須の列, 省略可能な列)（列の順にコマンド引数として渡す）
+TOOLS = {
+    "Facility": ("1_Facility_resize_rename_images/Facility_resize_rename_images.py", ["id"], []),
+    "ServiceResource": ("2_ServiceResource_resize_rename_images/ServiceResource_resize_rename_images.py", ["id"], []),
+    "FloorMap": ("3_FloorMap_resize_rename_images/FloorMap_resize_rename_images.py", ["id"], []),
+    "Layout": ("4_Layout_resize_rename_images/Layout_resize_rename_images.py", ["id"], []),
+    "Access": ("5_Access_resize_rename_images/Access_resize_rename_images.py", [], []),
+    "Product_banner": ("6_Product_resize_rename_images/■Product_banner_resize_rename_images.py", [], []),
+    "Product_singlefood": ("6_Product_resize_rename_images/⚫︎Product_singlefood_resize_rename_images.py", [], []),
+    "Route": ("7_Route_resize_rename_images/Route_resize_rename_images.py", ["id", "route"], []),
+    "3:2": ("9_900x600(3:2)_resize/3:2_resize_images.py", [], []),
+    "16:9": ("10_960x540(16:9)_resize/16:9_resize_images.py", [], []),
+    "4:3": ("11_960x720(4:3)_resize/4:3_resize_images.py", [], []),
+    "1:1": ("12_(1:1)_resize/1:1_resize_images.py", ["size"], []),
+    "multi_ratio": ("13_multi_ratio_resize/multi_ratio_resize_images.py", [], ["size"]),
+}
+
+def read_manifest(path):
+    """マニフェスト（.json または .csv）を読み込み、行（辞書）のリストを返す"""
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        rows = data.get("jobs", []) if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("JSONのマニフェストはジョブ（オブジェクト）のリストにしてください")
+        return rows
+    # Excelで保存したCSV（BOM付きUTF-8）も読めるようにする
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+def field(row, name):
+    """列の値（空欄はNone）"""
+    value = row.get(name)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def job_dir(input_path, base_dir):
+    """input列から、0_input_imagesがあるフォルダ（ツールを実行するフォルダ）を求める"""
+    path = os.path.abspath(os.path.join(base_dir, input_path))
+    if os.path.basename(os.path.normpath(path)) == INPUT_FOLDER:
+        path = os.path.dirname(os.path.normpath(path))
+    return path
+
+def build_jobs(rows, base_dir):
+    """マニフェストの行をジョブに変換する（エラーがあれば (None, エラーのリスト)）"""
+    jobs, errors, seen_dirs = [], [], {}
+    for number, row in enumerate(rows, 1):
+        tool = field(row, "tool")
+        if tool not in TOOLS:
+            errors.append(f"{number}件目: 不明なツールです: {tool}（{', '.join(TOOLS)}）")
+            continue
+        script, required, optional = TOOLS[tool]
+        input_path = field(row, "input")
+        if input_path is None:
+            errors.append(f"{number}件目: input（入力フォルダ）を指定してください")
+            continue
+        directory = job_dir(input_path, base_dir)
+        if not os.path.isdir(os.path.join(directory, INPUT_FOLDER)):
+            errors.append(f"{number}件目: {os.path.join(directory, INPUT_FOLDER)} がありません")
+            continue
+        # 同じフォルダの出力（2_output_images）を別のジョブが上書きしないようにする
+        if directory in seen_dirs:
+            errors.append(f"{number}件目: {directory} は {seen_dirs[directory]}件目と同じフォルダです")
+            continue
+        seen_dirs[directory] = number
+
+        missing = [name for name in required if field(row, name) is None]
+        if missing:
+            errors.append(f"{number}件目: {tool} には {', '.join(missing)} が必要です")
+            continue
+        args = [field(row, name) for name in required]
+        args += [field(row, name) for name in optional if field(row, name) is not None]
+        args += shlex.split(field(row, "args") or "")
+        jobs.append({"number": number, "tool": tool, "script": os.path.join(PROJECT_ROOT, script),
+                     "dir": directory, "args": args})
+    return (None, errors) if errors else (jobs, [])
+
+def job_title(job, total):
+    return f"[{job['number']}/{total}] {job['tool']} {' '.join(job['args'])}（{job['dir']}）"
+
+def run_job(job):
+    """1つのジョブを実行し、結果（終了コード、経過時間）を返す"""
+    start_time = time.perf_counter()
+    started = time.time()
+    code = run_script(job["script"], job["args"], job["dir"])
+    return {"exit_code": code, "elapsed": time.perf_counter() - start_time, "started": started}
+
+def run_job_logged(job):
+    """ワーカープロセスで1つのジョブを実行する（出力はジョブのフォルダのログファイルに書く）"""
+    log_path = os.path.join(job["dir"], JOB_LOG_FILENAME)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    saved_streams = sys.stdout, sys.stderr
+    with open(log_path, "w", encoding="utf-8") as log:
+        # ツールのプロセスプール（Facilityの--jobs）の子プロセスの出力もログに入るよう、fdごと差し替える
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        sys.stdout = open(1, "w", encoding="utf-8", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", encoding="utf-8", buffering=1, closefd=False)
+        try:
+            result = run_job(job)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            sys.stdout, sys.stderr = saved_streams
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+    result["log"] = log_path
+    return result
+
+def read_job_report(job, result):
+    """ジョブが書き出したrun_report.jsonを読む（今回の実行より古いもの・ないものはNone）"""
+    path = os.path.join(job["dir"], REPORT_FILENAME)
+    try:
+        if os.path.getmtime(path) < result["started"]:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def summarize_jobs(jobs, results, elapsed):
+    """全ジョブの集計（ジョブごとの結果、画像数・バイト数・工程別の合計時間）"""
+    entries = []
+    stages = {}
+    for job, result in zip(jobs, results):
+        report = read_job_report(job, result)
+        entry = {
+            "index": job["number"],
+            "tool": job["tool"],
+            "dir": job["dir"],
+            "args": job["args"],
+            "exit_code": result["exit_code"],
+            "elapsed": round(result["elapsed"], 6),
+            "report": os.path.join(job["dir"], REPORT_FILENAME) if report else None,
+        }
+        if "log" in result:
+            entry["log"] = result["log"]
+        if report:
+            for key in ("images", "errors", "input_bytes", "output_bytes"):
+                entry[key] = report.get(key, 0)
+            for stage, summary in report.get("stages", {}).items():
+                total = stages.setdefault(stage, {"count": 0, "total": 0.0})
+                total["count"] += summary["count"]
+                total["total"] = round(total["total"] + summary["total"], 6)
+        entries.append(entry)
+
+    return {
+        "jobs": len(entries),
+        "failed": sum(1 for entry in entries if entry["exit_code"] != 0),
+        "elapsed": round(elapsed, 6),
+        "images": sum(entry.get("images", 0) for entry in entries),
+        "errors": sum(entry.get("errors", 0) for entry in entries),
+        "input_bytes": sum(entry.get("input_bytes", 0) for entry in entries),
+        "output_bytes": sum(entry.get("output_bytes", 0) for entry in entries),
+        "stages": stages,
+        "per_job": entries,
+    }
+
+def print_job_result(job, result, total):
+    status = "⭕️完了" if result["exit_code"] == 0 else f"❌失敗（終了コード {result['exit_code']}）"
+    print(f"{status}: {job_title(job, total)} {result['elapsed']:.1f} 秒")
+
+def run_batch(jobs, workers=1):
+    """ジョブを実行し、マニフェストの順の結果のリストを返す"""
+    total = len(jobs)
+    results = []
+    if workers <= 1:
+        for job in jobs:
+            print(f"=== {job_title(job, total)} ===", flush=True)
+            result = run_job(job)
+            print_job_result(job, result, total)
+            results.append(result)
+        return results
+
+    # 各ジョブの出力はログファイルに書き、終わったものからマニフェストの順に表示する
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for job, result in zip(jobs, executor.map(run_job_logged, jobs)):
+            print(f"=== {job_title(job, total)} ===")
+            with open(result["log"], encoding="utf-8", errors="replace") as f:
+                sys.stdout.write(f.read())
+            print_job_result(job, result, total)
+            sys.stdout.flush()
+            results.append(result)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="マニフェストに並べた複数のジョブを1回の起動で実行する")
+    parser.add_argument("manifest", help="ジョブを並べたCSVまたはJSONのファイル")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="並列に実行するジョブ数（デフォルト: 1。2以上では各ジョブの出力をフォルダ内のbatch_job.logに書く）")
+    parser.add_argument("--report", default=BATCH_REPORT_FILENAME, help=f"集計の出力先（デフォルト: {BATCH_REPORT_FILENAME}）")
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs は1以上を指定してください")
+
+    try:
+        rows = read_manifest(args.manifest)
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"エラー: マニフェストを読み込めません: {e}")
+        return 2
+    jobs, errors = build_jobs(rows, os.path.dirname(os.path.abspath(args.manifest)))
+    if errors:
+        for error in errors:
+            print(f"エラー: {error}")
+        print("マニフェストを修正してから、もう一度実行してください。（ジョブは実行していません）")
+        return 2
+    if not jobs:
+        print("マニフェストにジョブがありません。")
+        return 1
+
+    print(f"{len(jobs)} 件のジョブを実行します。")
+    start_time = time.perf_counter()
+    results = run_batch(jobs, args.jobs)
+    summary = summarize_jobs(jobs, results, time.perf_counter() - start_time)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
+
+    print("--- 一括実行の集計 ---")
+    print(f"ジョブ: {summary['jobs']} 件（失敗 {summary['failed']} 件） / 画像: {summary['images']} 枚"
+          f"（エラー {summary['errors']} 件） / 経過時間: {summary['elapsed']:.1f} 秒")
+    for entry in summary["per_job"]:
+        if entry["exit_code"] != 0:
+            print(f"❌失敗: {entry['index']}件目 {entry['tool']} {' '.join(entry['args'])}（{entry['dir']}）")
+    print(f"集計レポート: {os.path.abspath(args.report)}")
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
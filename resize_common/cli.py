@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""コマンド引数の共通オプション"""
+import argparse
+
+from resize_common.dedup import DEDUP_MODES, DEFAULT_DEDUP_MODE
+from resize_common.encode_cache import CACHE_DIR_ENV, DEFAULT_CACHE_SIZE_MB
+from resize_common.encoding import DEFAULT_WEBP_PROFILE, WEBP_PROFILES
+from resize_common.memory_budget import DEFAULT_MAX_MEGAPIXELS, DEFAULT_MEMORY_BUDGET_MB
+from resize_common.pipeline import default_threads
+from resize_common.strips import DEFAULT_STRIP_MEGAPIXELS
+
+def add_shrink_on_load_argument(parser):
+    """縮小読み込みを無効にするオプションを追加する"""
+    parser.add_argument("--no-shrink-on-load", dest="shrink_on_load", action="store_false",
+                        help="縮小読み込みを無効にし、フル解像度からリサイズする（従来と同じピクセル出力）")
+
+def add_keep_temp_argument(parser):
+    """1_temp_imagesにデバッグ用の中間ファイルを残すオプションを追加する"""
+    parser.add_argument("--keep-temp", action="store_true",
+                        help="デバッグ用に、元のファイル名のWebPを1_temp_imagesにも出力する")
+
+def add_plan_only_argument(parser):
+    """リネーム計画の表示だけを行うオプションを追加する"""
+    parser.add_argument("--plan-only", action="store_true",
+                        help="画像を処理せず、入力ファイルと出力ファイル名の対応だけを表示する")
+
+def add_incremental_argument(parser):
+    """前回から変わった画像だけを処理するオプションを追加する"""
+    parser.add_argument("--incremental", action="store_true",
+                        help="出力フォルダをクリアせず、前回から追加・変更された画像だけを処理する（削除された画像の出力は削除）")
+
+def add_webp_profile_arguments(parser, default=DEFAULT_WEBP_PROFILE):
+    """WebPのエンコードプロファイルと個別設定のオプションを追加する"""
+    parser.add_argument("--webp-profile", choices=list(WEBP_PROFILES), default=default,
+                        help=f"WebPのエンコードプロファイル（lossless=無圧縮、high・lossy=非可逆圧縮。デフォルト: {default}）")
+    parser.add_argument("--webp-quality", type=int, default=None,
+                        help="プロファイルのqualityを上書きする（0-100、losslessでは圧縮の手間）")
+    parser.add_argument("--webp-method", type=int, choices=range(7), metavar="0-6", default=None,
+                        help="プロファイルのmethodを上書きする（0=速い〜6=小さい）")
+    parser.add_argument("--webp-alpha-quality", type=int, default=None,
+                        help="プロファイルのalpha_qualityを上書きする（0-100）")
+
+def add_trim_tolerance_argument(parser):
+    """余白の自動トリミングで背景とみなす色の差のオプションを追加する"""
+    parser.add_argument("--trim-tolerance", type=int, default=0, metavar="0-255",
+                        help="背景色との差がこの値以下の画素を余白とみなす（スキャンのノイズ対策。デフォルト: 0）")
+
+def positive_int(text):
+    """1以上の整数（argparseのtype用）"""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"整数を指定してください: {text}")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"1以上を指定してください: {text}")
+    return value
+
+def add_memory_budget_argument(parser):
+    """同時に処理する画像の作業メモリの上限のオプションを追加する"""
+    parser.add_argument("--memory-budget", type=positive_int, default=DEFAULT_MEMORY_BUDGET_MB, metavar="MB",
+                        help=f"同時に処理する画像の作業メモリの見積もりの上限（デフォルト: {DEFAULT_MEMORY_BUDGET_MB} MB）")
+
+def add_max_megapixels_argument(parser):
+    """縮小読み込みに切り替える画素数の上限のオプションを追加する"""
+    parser.add_argument("--max-megapixels", type=positive_int, default=DEFAULT_MAX_MEGAPIXELS, metavar="MP",
+                        help=f"これを超える画素数の画像は縮小読み込みで処理する（デフォルト: {DEFAULT_MAX_MEGAPIXELS} MP）")
+
+def add_strip_megapixels_argument(parser):
+    """帯（ストリップ）単位の処理に切り替える画素数のオプションを追加する"""
+    parser.add_argument("--strip-megapixels", type=positive_int, default=DEFAULT_STRIP_MEGAPIXELS, metavar="MP",
+                        help="これを超える画素数のPNGは、画像全体をデコードせずに帯単位でトリミング・縮小する"
+                             f"（デフォルト: {DEFAULT_STRIP_MEGAPIXELS} MP）")
+
+def add_threads_argument(parser):
+    """読み込み・変換・書き出しのパイプラインのスレッド数のオプションを追加する"""
+    parser.add_argument("--threads", type=positive_int, default=default_threads(), metavar="N",
+                        help="変換（トリミング・リサイズ）のスレッド数（デフォルト: CPU数、1で従来どおり1枚ずつ逐次処理）")
+
+def add_dedup_argument(parser):
+    """重複した入力画像を1回だけ処理するオプションを追加する"""
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default=DEFAULT_DEDUP_MODE,
+                        help="内容が同じ入力画像は1回だけ処理し、出力をハードリンク（またはコピー）する"
+                             f"（exact: 完全一致、near: 再保存などでほぼ同じ画像も含む、off: 無効。デフォルト: {DEFAULT_DEDUP_MODE}）")
+
+def add_encode_cache_arguments(parser):
+    """実行・ツールをまたいで共有するエンコードキャッシュのオプションを追加する"""
+    parser.add_argument("--cache", dest="cache", action="store_true", default=False,
+                        help="エンコードキャッシュを使う（入力ごとにハッシュを計算し、同じ入力・パラメータの出力を再利用する。"
+                             f"保存先はユーザーのキャッシュフォルダで、環境変数 {CACHE_DIR_ENV} で変更可）")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", default=False,
+                        help="エンコードキャッシュを使わない（デフォルト）")
+    parser.add_argument("--cache-size", type=positive_int, default=DEFAULT_CACHE_SIZE_MB, metavar="MB",
+                        help=f"--cache 指定時のキャッシュの上限（超えた分は古いものから削除。デフォルト: {DEFAULT_CACHE_SIZE_MB} MB）")
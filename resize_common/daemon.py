@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""常駐ワーカー（デーモン）
+
+スターターの「もう一度実行しますか？」のたびにPythonの起動とPillowの読み込みを
+やり直さないよう、Pillowとコーデックを読み込んだ状態のプロセスを常駐させ、
+ローカルのUNIXソケット経由でツールの実行を受け付ける。
+
+ジョブごとに常駐プロセスをforkし、子プロセスでツールのスクリプトを __main__ として
+実行するため、スクリプトの状態（グローバル変数、カレントディレクトリ）は毎回新しくなる。
+常駐プロセスは接続ごとに見張り役のプロセスをforkしてすぐ次の接続を受け付けるため、
+複数のスターターから同時に実行できる。見張り役はジョブの終了を待って終了コードを返し、
+途中でクライアントが切断した場合（Ctrl+Cなど）はジョブのプロセスグループごと停止する。
+
+使い方:
+  daemon.py run スクリプト.py [引数...]   常駐ワーカーで実行（未起動なら起動する）
+  daemon.py serve                         常駐ワーカーを前面で起動する
+  daemon.py status / stop                 状態の確認 / 停止
+
+ジョブは呼び出し元の環境変数・カレントディレクトリで実行する。ソケットの名前には resize_common の
+ソースのハッシュを含め、更新後は新しい常駐ワーカーを起動する（古いワーカーは停止する）。
+
+環境変数 RESIZE_TOOLS_NO_DAEMON=1 を指定するか、fork/UNIXソケットが使えない環境、
+ソケット用のディレクトリが本人のものでない環境では、常駐ワーカーを使わず、従来どおりスクリプトを直接実行する。
+"""
+import os
+import sys
+import json
+import glob
+import stat
+import time
+import select
+import signal
+import socket
+import hashlib
+import tempfile
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# プロジェクトルートの共通モジュール（resize_common）を読み込めるようにする
+sys.path.insert(0, PROJECT_ROOT)
+from resize_common.runner import resolve_script, run_script
+
+IDLE_TIMEOUT = 30 * 60  # この秒数ジョブがなければ終了する
+START_TIMEOUT = 10  # 起動を待つ最大秒数
+EXIT_MARKER = b"\0"  # 出力の後に終了コードを送る区切り
+POLL_INTERVAL = 0.2  # 見張り役がジョブの終了・クライアントの切断を確認する間隔（秒）
+KILL_TIMEOUT = 5  # 切断後にSIGTERMを送ってから、SIGKILLで強制終了するまでの秒数
+
+def daemon_supported():
+    """常駐ワーカーを使える環境か（fork と UNIXソケットが必要）"""
+    return hasattr(os, "fork") and hasattr(socket, "AF_UNIX") and not os.environ.get("RESIZE_TOOLS_NO_DAEMON")
+
+def socket_directory():
+    """ソケットを置くディレクトリ（本人のみアクセス可）。用意できない場合はNone
+
+    同じ名前のディレクトリがほかのユーザーのもの・シンボリックリンクの場合は使わない。
+    """
+    directory = os.path.join(tempfile.gettempdir(), f"resize_tools_{os.getuid()}")
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.lstat(directory)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+            return None
+        if stat.S_IMODE(info.st_mode) != 0o700:
+            os.chmod(directory, 0o700)
+    except OSError:
+        return None
+    return directory
+
+def project_hash():
+    return hashlib.sha1(PROJECT_ROOT.encode("utf-8")).hexdigest()[:8]
+
+def source_hash():
+    """resize_commonのソースのハッシュ（常駐ワーカーが読み込んだモジュールが古くないかの判定に使う）"""
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(PROJECT_ROOT, "resize_common", "*.py"))):
+        with open(path, "rb") as f:
+            digest.update(os.path.basename(path).encode("utf-8") + b"\0" + f.read())
+    return digest.hexdigest()[:8]
+
+def socket_path():
+    """ユーザー・プロジェクト・resize_commonのソースごとのソケットのパス（使えない場合はNone）"""
+    directory = socket_directory()
+    if directory is None:
+        return None
+    return os.path.join(directory, f"worker_{project_hash()}_{source_hash()}.sock")
+
+def connect(path=None):
+    """常駐ワーカーに接続する（起動していなければNone）"""
+    path = path or socket_path()
+    if path is None:
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        return None
+    return client
+
+def send_request(client, request):
+    """リクエストを1行のJSONで送る"""
+    client.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+
+def receive_line(conn):
+    """改行までを受け取る"""
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(1)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+# --- 常駐ワーカー側 ---
+
+def warm_up():
+    """Pillowと各コーデック、numpyを読み込んでおく（fork後の子プロセスに引き継がれる）"""
+    import numpy  # noqa: F401
+    from PIL import Image, ImageChops, ImageDraw  # noqa: F401
+    Image.init()
+    # デコーダー・エンコーダーを一度使い、初回呼び出しの初期化も済ませておく
+    import io
+    sample = Image.new("RGB", (8, 8), (255, 255, 255))
+    for format_name in ("WEBP", "JPEG", "PNG"):
+        buffer = io.BytesIO()
+        sample.save(buffer, format_name)
+        buffer.seek(0)
+        Image.open(buffer).load()
+
+def run_job_in_child(conn, request):
+    """fork した子プロセスでスクリプトを実行し、出力をソケットに流す（戻り値は終了コード）"""
+    # 標準出力・標準エラーをソケットに向ける（プロセスプールの子プロセスにも引き継がれる）
+    os.dup2(conn.fileno(), 1)
+    os.dup2(conn.fileno(), 2)
+    # ソケットはシーク不可のためreconfigureできず、改めて開き直す
+    sys.stdout = open(1, "w", encoding="utf-8", buffering=1, closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", buffering=1, closefd=False)
+
+    # 常駐ワーカーを起動したときではなく、呼び出し元の環境変数で実行する
+    if "env" in request:
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+    try:
+        script = resolve_script(request["script"])
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    return run_script(script, request.get("args", []), request["cwd"])
+
+def client_disconnected(conn):
+    """クライアントが接続を閉じたか（ジョブの実行中はクライアントから何も送られない）"""
+    readable, _, _ = select.select([conn], [], [], POLL_INTERVAL)
+    if not readable:
+        return False
+    try:
+        return conn.recv(1, socket.MSG_PEEK) == b""
+    except OSError:
+        return True
+
+def stop_job(pid):
+    """ジョブのプロセスグループ（プロセスプールのワーカーを含む）を停止し、終了を待つ"""
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except OSError:
+        pass
+    deadline = time.monotonic() + KILL_TIMEOUT
+    while time.monotonic() < deadline:
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            break
+        time.sleep(POLL_INTERVAL)
+    else:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+        os.waitpid(pid, 0)
+    # 先に終了した親の後に残ったワーカーも止める
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+def supervise_job(conn, request):
+    """見張り役のプロセスでジョブをforkし、終了を待って終了コードを送る（切断されたらジョブを停止する）"""
+    pid = os.fork()
+    if pid == 0:
+        # 停止するときにプロセスプールのワーカーもまとめて止められるよう、新しいプロセスグループにする
+        os.setpgid(0, 0)
+        code = 1
+        try:
+            code = run_job_in_child(conn, request)
+        finally:
+            os._exit(code if 0 <= code < 256 else 1)
+    try:
+        os.setpgid(pid, pid)  # 子プロセスが設定する前に停止する場合に備え、親でも設定する
+    except OSError:
+        pass
+
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done == pid:
+            break
+        if client_disconnected(conn):
+            stop_job(pid)
+            return
+    code = os.waitstatus_to_exitcode(status)
+    if code < 0:
+        code = 128 - code  # シグナルで終了した場合はシェルと同じ 128+シグナル番号
+    try:
+        conn.sendall(EXIT_MARKER + str(code).encode("ascii") + b"\n")
+    except OSError:
+        pass  # クライアントが先に終了した（Ctrl+Cなど）
+
+def handle_connection(conn, server):
+    """1つの接続（ジョブ、状態確認、停止）を処理する。停止要求ならFalseを返す
+
+    ジョブは見張り役のプロセスに任せ、終了を待たずに戻る（次の接続をすぐ受け付ける）。
+    """
+    request = json.loads(receive_line(conn).decode("utf-8") or "{}")
+    command = request.get("command")
+    if command == "status":
+        conn.sendall(f"常駐ワーカー稼働中（PID {os.getpid()}）\n".encode("utf-8") + EXIT_MARKER + b"0\n")
+        return True
+    if command == "stop":
+        conn.sendall("常駐ワーカーを停止します。\n".encode("utf-8") + EXIT_MARKER + b"0\n")
+        return False
+    if command != "run":
+        conn.sendall(f"不明なコマンド: {command}\n".encode("utf-8") + EXIT_MARKER + b"2\n")
+        return True
+
+    if os.fork() == 0:
+        server.close()
+        # 常駐プロセスでは終了した見張り役を自動で回収するが、見張り役はジョブの終了コードを受け取る
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        try:
+            supervise_job(conn, request)
+        finally:
+            os._exit(0)
+    return True
+
+def serve(path=None, idle_timeout=IDLE_TIMEOUT):
+    """常駐ワーカーを起動し、ジョブを1件ずつ処理する"""
+    path = path or socket_path()
+    if path is None:
+        print("ソケット用のディレクトリを用意できないため、常駐ワーカーを起動できません。")
+        return 1
+    if os.path.exists(path):
+        existing = connect(path)
+        if existing is not None:
+            existing.close()
+            print(f"常駐ワーカーは既に起動しています: {path}")
+            return 0
+        os.unlink(path)  # 前回異常終了したときのソケット
+
+    warm_up()
+    # 終了した見張り役のプロセスは待たずに自動で回収する（ゾンビにしない）
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen(8)
+    server.settimeout(idle_timeout)
+    print(f"常駐ワーカーを起動しました（PID {os.getpid()}）: {path}", flush=True)
+
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                print(f"{idle_timeout} 秒間ジョブがなかったため終了します。", flush=True)
+                break
+            with conn:
+                conn.settimeout(None)
+                try:
+                    if not handle_connection(conn, server):
+                        break
+                except (OSError, ValueError) as e:
+                    # 接続の確認だけで閉じたクライアント・壊れたリクエストでは常駐ワーカーを止めない
+                    print(f"接続の処理中にエラーが発生しました: {e}", flush=True)
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+    return 0
+
+# --- スターター（クライアント）側 ---
+
+def stop_stale_workers(path):
+    """resize_commonの更新前に起動した、同じプロジェクトの常駐ワーカーを停止する"""
+    pattern = os.path.join(os.path.dirname(path), f"worker_{project_hash()}_*.sock")
+    for stale_path in glob.glob(pattern):
+        if stale_path == path:
+            continue
+        client = connect(stale_path)
+        if client is None:
+            # 異常終了したワーカーのソケット
+            try:
+                os.unlink(stale_path)
+            except OSError:
+                pass
+            continue
+        with client:
+            try:
+                send_request(client, {"command": "stop"})
+                while client.recv(4096):
+                    pass
+            except OSError:
+                pass
+
+def start_daemon(path):
+    """常駐ワーカーをバックグラウンドで起動し、接続できるまで待つ"""
+    stop_stale_workers(path)
+    log_path = os.path.join(os.path.dirname(path), "worker.log")
+    with open(log_path, "ab") as log:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve"],
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                         start_new_session=True, close_fds=True)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        client = connect(path)
+        if client is not None:
+            return client
+        time.sleep(0.05)
+    return None
+
+def relay(client):
+    """ワーカーの出力をそのまま表示し、最後に受け取った終了コードを返す"""
+    out = sys.stdout.buffer
+    pending = b""
+    while True:
+        chunk = client.recv(65536)
+        if not chunk:
+            break
+        pending += chunk
+        marker = pending.rfind(EXIT_MARKER)
+        # 終了コードの区切りより前は表示してよい
+        if marker == -1:
+            out.write(pending)
+            pending = b""
+        else:
+            out.write(pending[:marker])
+            pending = pending[marker:]
+        out.flush()
+    if pending.startswith(EXIT_MARKER):
+        try:
+            return int(pending[1:].strip() or 1)
+        except ValueError:
+            return 1
+    out.write(pending)
+    out.flush()
+    return 1  # 終了コードを受け取れなかった（ワーカーの異常終了）
+
+def run_direct(script, args):
+    """常駐ワーカーを使わず、従来どおりスクリプトを直接実行する"""
+    os.execv(sys.executable, [sys.executable, script] + args)
+
+def run(script, args):
+    """常駐ワーカーでスクリプトを実行する（使えない場合は直接実行）"""
+    if not daemon_supported():
+        run_direct(script, args)
+    path = socket_path()
+    if path is None:
+        print("警告: 常駐ワーカーのソケット用ディレクトリを使えないため、直接実行します。", file=sys.stderr)
+        run_direct(script, args)
+    client = connect(path) or start_daemon(path)
+    if client is None:
+        print("警告: 常駐ワーカーを起動できなかったため、直接実行します。", file=sys.stderr)
+        run_direct(script, args)
+    with client:
+        send_request(client, {"command": "run", "script": os.path.abspath(script), "args": args, "cwd": os.getcwd(),
+                              "env": dict(os.environ)})
+        try:
+            return relay(client)
+        except KeyboardInterrupt:
+            return 130
+
+def simple_command(command):
+    """status / stop を送る"""
+    if not daemon_supported():
+        print("この環境では常駐ワーカーを使用しません。")
+        return 0
+    path = socket_path()
+    if path is not None and command == "stop":
+        stop_stale_workers(path)
+    client = connect(path)
+    if client is None:
+        print("常駐ワーカーは起動していません。")
+        return 0 if command == "stop" else 1
+    with client:
+        send_request(client, {"command": command})
+        return relay(client)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ("run", "serve", "status", "stop") or (argv[0] == "run" and len(argv) < 2):
+        print("使い方: daemon.py run スクリプト.py [引数...] | serve | status | stop")
+        return 1
+    if argv[0] == "run":
+        return run(argv[1], argv[2:])
+    if argv[0] == "serve":
+        if not daemon_supported():
+            print("この環境では常駐ワーカーを使用できません。")
+            return 1
+        return serve()
+    return simple_command(argv[0])
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""重複した入力画像の検出
+
+Finderの「のコピー」や再保存した画像など、同じ内容の画像を何度もデコード・エンコードしないよう、
+処理を始める前に既に見つかった画像との重複を調べる。重複した画像は処理せず、元の画像の出力を
+ハードリンク（できなければコピー）する。
+
+- exact: ファイルの内容が完全に同じ画像（ファイルサイズが同じ画像が見つかったときだけハッシュを計算する）
+- near: exactに加え、縮小した画像の差分ハッシュ（dHash）がほぼ同じ画像（再保存・形式変換したものなど）
+"""
+import os
+
+from PIL import Image
+
+from resize_common.image_loading import check_decode_size, open_header
+from resize_common.manifest import file_digest
+
+DEDUP_MODES = ("off", "exact", "near")
+DEFAULT_DEDUP_MODE = "exact"
+# nearで同じ画像とみなす差分ハッシュ（64ビット）の違いのビット数
+NEAR_DUPLICATE_DISTANCE = 3
+HASH_SIZE = 8
+
+def perceptual_hash(path, hash_size=HASH_SIZE):
+    """差分ハッシュ（横に隣り合う画素の明るさの大小）を整数で返す（読めない画像はNone）
+
+    JPEGは縮小読み込み（draftモード）で小さくデコードするため、画像全体をデコードしない。
+    """
+    try:
+        with open_header(path) as img:
+            img.draft("L", (hash_size * 8, hash_size * 8))
+            check_decode_size(img)
+            small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    except Exception:
+        return None
+    pixels = small.tobytes()
+    value = 0
+    for y in range(hash_size):
+        row = pixels[y * (hash_size + 1):(y + 1) * (hash_size + 1)]
+        for x in range(hash_size):
+            value = (value << 1) | (row[x] > row[x + 1])
+    return value
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+def new_dedup(mode=DEFAULT_DEDUP_MODE):
+    """重複検出の状態を作成する（modeが"off"の場合はNone）"""
+    if mode == "off":
+        return None
+    return {"mode": mode, "by_size": {}, "hashes": {}, "perceptual": [], "duplicates": []}
+
+def cached_hash(dedup, path, known=None):
+    """ファイルの内容のハッシュ（マニフェスト・エンコードキャッシュと同じSHA-256。1つのファイルにつき1回だけ計算する）
+
+    knownは呼び出し側で計算済みのハッシュ（なければNone）。
+    """
+    if path not in dedup["hashes"]:
+        dedup["hashes"][path] = known or file_digest(path)
+    return dedup["hashes"][path]
+
+def known_digest(dedup, path):
+    """重複の判定で計算したpathのハッシュ（計算していなければNone）"""
+    return None if dedup is None else dedup["hashes"].get(path)
+
+def find_duplicate(dedup, path, key, digest=None, digest_of=None):
+    """pathが既に登録した画像の重複なら、その画像のkeyを返す（そうでなければ登録してNone）
+
+    keyには入力の相対パスなど、画像を識別する値を渡す。digestは計算済みのpathのハッシュ、
+    digest_of(key)は既に登録した画像の計算済みのハッシュ（なければNone）を返す関数で、
+    エンコードキャッシュなどで計算したハッシュを使い、同じファイルを読み直さないようにする。
+    計算したハッシュは known_digest で取り出せる。
+    """
+    if dedup is None:
+        return None
+    try:
+        size = os.path.getsize(path)
+        same_size = dedup["by_size"].setdefault(size, [])
+        for other_path, other_key in same_size:
+            other_digest = cached_hash(dedup, other_path, digest_of(other_key) if digest_of else None)
+            if cached_hash(dedup, path, digest) == other_digest:
+                dedup["duplicates"].append({"input": key, "original": other_key, "kind": "exact"})
+                return other_key
+        same_size.append((path, key))
+    except OSError:
+        return None  # 読めないファイルは重複とみなさず、処理の工程でエラーを記録する
+
+    if dedup["mode"] == "near":
+        value = perceptual_hash(path)
+        if value is None:
+            return None
+        for other_value, other_key in dedup["perceptual"]:
+            if hamming_distance(value, other_value) <= NEAR_DUPLICATE_DISTANCE:
+                dedup["duplicates"].append({"input": key, "original": other_key, "kind": "near"})
+                return other_key
+        dedup["perceptual"].append((value, key))
+    return None
+
+def dedup_summary(dedup):
+    """実行レポート用（重複として処理しなかった画像と元の画像の組）"""
+    return [] if dedup is None else dedup["duplicates"]
+
+def print_dedup_report(dedup):
+    """重複として処理しなかった画像の数を表示する"""
+    if dedup is not None and dedup["duplicates"]:
+        print(f"内容が重複する {len(dedup['duplicates'])} 枚は処理せず、出力を共有しました。")
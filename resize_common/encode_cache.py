@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""実行・ツールをまたいで共有するエンコード結果のキャッシュ
+
+入力ファイルの内容のハッシュと、出力に影響する処理パラメータ（ツール・サイズ・フィルター・
+WebPの設定など）からキーを作り、エンコードしたWebPをキーの名前で保存する。
+同じ入力を同じパラメータで処理する場合（施設IDだけ変えて再実行した場合など）は、
+デコード・リサイズ・エンコードを行わず、キャッシュのファイルを出力先にコピーする。
+出力を後から書き換えてもキャッシュが変わらないよう、保存・出力ともハードリンクにはしない。
+
+- 保存先: ユーザーごとのキャッシュフォルダ（Linuxは ~/.cache/resize_tools/encode_cache、
+  macOSは ~/Library/Caches、Windowsは %LOCALAPPDATA% の下。環境変数 RESIZE_TOOLS_CACHE_DIR で変更可）。
+  PyInstallerの単一ファイル版では実行ファイルの場所が毎回の一時フォルダになるため、プロジェクトの中には置かない
+- 上限: 実行の最後に合計サイズが上限を超えていれば、最後に使った日時が古いものから削除する
+- キャッシュは高速化のためだけに使い、読み書きに失敗しても処理は続ける
+"""
+import os
+import sys
+import json
+import hashlib
+import threading
+
+import PIL
+
+from resize_common.manifest import file_digest, job_digest
+from resize_common.output import copy_file_atomic
+
+CACHE_DIR_ENV = "RESIZE_TOOLS_CACHE_DIR"
+DEFAULT_CACHE_SIZE_MB = 1024
+# 処理内容を変えて出力の画素が変わる場合は上げる（古いキャッシュを使わないようにする）
+CACHE_VERSION = 1
+
+def user_cache_dir():
+    """ユーザーごとのキャッシュフォルダ（OSの慣例の場所の下の resize_tools）"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(os.path.join("~", "AppData", "Local"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser(os.path.join("~", "Library", "Caches"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache"))
+    return os.path.join(base, "resize_tools")
+
+def default_cache_dir():
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(user_cache_dir(), "encode_cache")
+
+def new_encode_cache(enabled=True, limit_mb=DEFAULT_CACHE_SIZE_MB, directory=None):
+    """キャッシュの設定と集計を作成する（無効の場合はNone）
+
+    ワーカープロセスにもそのまま渡せるよう、設定と集計だけの辞書にする。
+    """
+    if not enabled:
+        return None
+    return {"dir": directory or default_cache_dir(), "limit": limit_mb * 1024 * 1024,
+            "hits": 0, "misses": 0, "evicted": 0}
+
+def cache_key(source_path, params, digest=None):
+    """入力の内容と処理パラメータから、キャッシュのキーを作る（digestは計算済みの入力のハッシュ）"""
+    identity = {"input": digest or file_digest(source_path), "params": params, "version": CACHE_VERSION,
+                "pillow": PIL.__version__}
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()
+
+def entry_paths(cache, key):
+    """キャッシュのWebPと、付随する情報（出力サイズなど）のJSONのパス"""
+    base = os.path.join(cache["dir"], key[:2], key)
+    return base + ".webp", base + ".json"
+
+def lookup_output(cache, source_path, params, output_path, digest=None):
+    """キャッシュにあれば出力先にコピーし、(キー, 保存時の情報) を返す（なければ (キー, None)）
+
+    キャッシュが無効の場合は (None, None) を返す。1つの入力から複数の出力を作る場合は、
+    入力のハッシュ（manifest.file_digest）を digest に渡すと、出力ごとに計算し直さない。
+    """
+    if cache is None:
+        return None, None
+    try:
+        key = cache_key(source_path, params, digest)
+    except OSError:
+        return None, None  # 読めない入力は処理の工程でエラーを記録する
+    webp_path, info_path = entry_paths(cache, key)
+    try:
+        with open(info_path, encoding="utf-8") as f:
+            info = json.load(f)
+        copy_file_atomic(webp_path, output_path)
+        # 最後に使った日時を更新する（上限を超えた場合は古いものから削除する。出力はコピーのため影響しない）
+        os.utime(webp_path)
+    except (OSError, ValueError):
+        return key, None
+    return key, info
+
+def restore_job(cache, job, params, output_path):
+    """job["source"]のエンコード結果がキャッシュにあれば出力し、保存時の情報をjobに加えてTrueを返す
+
+    キーはjob["cache_key"]に記録する（ミスの場合はエンコード後にstore_outputで保存する）。
+    入力のハッシュはjob["digest"]に記録し、マニフェストの記録にも使う（manifest.job_digest）。
+    """
+    job["cache_key"], info = None, None
+    if cache is not None:
+        try:
+            digest = job_digest(job)
+        except OSError:
+            return False  # 読めない入力は処理の工程でエラーを記録する
+        job["cache_key"], info = lookup_output(cache, job["source"], params, output_path, digest)
+    if info is None:
+        return False
+    job.update(info)
+    job["cache_hit"] = True
+    return True
+
+def store_output(cache, key, output_path, info):
+    """エンコードした出力をキャッシュに保存する（infoはヒット時に返す情報）"""
+    if cache is None or key is None:
+        return
+    webp_path, info_path = entry_paths(cache, key)
+    tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(webp_path), exist_ok=True)
+        # 途中で中断しても不完全なファイルが残らないよう、一時ファイルから置き換える（WebPを先に置く）
+        copy_file_atomic(output_path, webp_path)
+        with open(info_path + tmp_suffix, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(info_path + tmp_suffix, info_path)
+    except OSError as e:
+        print(f"警告: エンコードキャッシュに保存できませんでした: {e}")
+        if os.path.exists(info_path + tmp_suffix):
+            os.unlink(info_path + tmp_suffix)
+
+def count_lookup(cache, job):
+    """1枚分のキャッシュのヒット・ミスを集計する（結果はメインプロセスで入力順に集計する）"""
+    if cache is None or job.get("cache_key") is None:
+        return
+    if job.get("cache_hit"):
+        cache["hits"] += 1
+    else:
+        cache["misses"] += 1
+
+def evict_cache(cache):
+    """合計サイズが上限を超えていれば、最後に使った日時が古いものから削除する"""
+    if cache is None or not os.path.isdir(cache["dir"]):
+        return 0
+    entries = []
+    for directory, _, filenames in os.walk(cache["dir"]):
+        for filename in filenames:
+            if filename.endswith(".webp"):
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= cache["limit"]:
+            break
+        for entry_path in (path, path[:-len(".webp")] + ".json"):
+            try:
+                os.unlink(entry_path)
+            except OSError:
+                pass
+        total -= size
+        cache["evicted"] += 1
+    cache["bytes"] = total
+    return total
+
+def cache_summary(cache):
+    """実行レポート用の集計"""
+    if cache is None:
+        return None
+    return {
+        "dir": cache["dir"],
+        "hits": cache["hits"],
+        "misses": cache["misses"],
+        "evicted": cache["evicted"],
+        "size_mb": round(cache.get("bytes", 0) / (1024 * 1024), 1),
+        "limit_mb": round(cache["limit"] / (1024 * 1024), 1),
+    }
+
+def print_cache_report(cache):
+    """キャッシュのヒット・ミスと使用量を表示する"""
+    if cache is None:
+        return
+    summary = cache_summary(cache)
+    print("--- エンコードキャッシュ ---")
+    print(f"ヒット: {summary['hits']} 枚 / ミス: {summary['misses']} 枚 / 削除: {summary['evicted']} 件")
+    print(f"使用量: {summary['size_mb']} MB / 上限 {summary['limit_mb']} MB（{summary['dir']}）")
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""WebPのエンコード設定（プロファイル）と、エンコード時間・サイズの集計"""
+import os
+import time
+
+from resize_common.output import save_webp_atomic
+
+# エンコードプロファイル（PillowのWebP保存オプション）
+# lossless: 従来どおりの無圧縮（quality=100は圧縮の手間を最大にする指定）
+# high: 見た目でほぼ区別できない高画質の非可逆圧縮（quality=95・method=6）
+#   （libwebpの準可逆圧縮（near_lossless）はPillowから指定できないため、可逆圧縮ではない点に注意）
+# lossy: CDN配信向けの非可逆圧縮
+WEBP_PROFILES = {
+    "lossless": {"lossless": True, "quality": 100, "method": 4},
+    "high": {"lossless": False, "quality": 95, "method": 6, "alpha_quality": 100},
+    "lossy": {"lossless": False, "quality": 85, "method": 4, "alpha_quality": 90},
+}
+DEFAULT_WEBP_PROFILE = "lossless"
+
+def webp_options_from_args(args):
+    """プロファイル名と個別指定（--webp-quality など）から保存オプションを作る"""
+    options = dict(WEBP_PROFILES[args.webp_profile])
+    if args.webp_quality is not None:
+        options["quality"] = args.webp_quality
+    if args.webp_method is not None:
+        options["method"] = args.webp_method
+    if args.webp_alpha_quality is not None:
+        options["alpha_quality"] = args.webp_alpha_quality
+    return options
+
+def new_encode_stats(profile):
+    """実行全体のエンコード集計を作成する"""
+    return {"profile": profile, "count": 0, "seconds": 0.0, "raw_bytes": 0, "output_bytes": 0}
+
+def add_encode_sample(stats, raw_bytes, output_bytes, seconds):
+    """1枚分のエンコード結果を集計に加える（ワーカープロセスの結果もここで集計する）"""
+    stats["count"] += 1
+    stats["seconds"] += seconds
+    stats["raw_bytes"] += raw_bytes
+    stats["output_bytes"] += output_bytes
+
+def save_webp_measured(img, path, options, stats=None):
+    """WebPを保存し、(エンコード時間, 出力バイト数, 非圧縮時のバイト数) を返す"""
+    start_time = time.perf_counter()
+    save_webp_atomic(img, path, **options)
+    seconds = time.perf_counter() - start_time
+    output_bytes = os.path.getsize(path)
+    raw_bytes = img.width * img.height * len(img.getbands())
+    if stats is not None:
+        add_encode_sample(stats, raw_bytes, output_bytes, seconds)
+    return seconds, output_bytes, raw_bytes
+
+def print_encode_report(stats, options):
+    """エンコードプロファイルごとの時間・サイズ・圧縮率を表示する"""
+    settings = ", ".join(f"{key}={value}" for key, value in options.items())
+    print(f"--- エンコード（{stats['profile']}: {settings}）---")
+    if stats["count"] == 0:
+        print("エンコードした画像はありません。")
+        return
+    output_mb = stats["output_bytes"] / (1024 * 1024)
+    ratio = stats["raw_bytes"] / stats["output_bytes"] if stats["output_bytes"] else 0.0
+    print(f"枚数: {stats['count']} 枚 / エンコード時間: {stats['seconds']:.2f} 秒（平均 {stats['seconds'] / stats['count']:.3f} 秒/枚）")
+    print(f"出力: {output_mb:.2f} MB（平均 {stats['output_bytes'] / stats['count'] / 1024:.1f} KB/枚） / 圧縮率: {ratio:.1f} 倍（非圧縮RGB比）")
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""作業フォルダ（1_temp_images・2_output_images）のクリア
+
+大量の画像を出力した後でも次の実行をすぐ始められるよう、フォルダの中身を1つずつ削除せずに、
+1. フォルダを同じ場所の削除用の名前（".2_output_images.trash-PID-番号"）に名前を変更し
+2. 空のフォルダを作り直して、
+3. 削除用のフォルダはバックグラウンドのスレッドで削除する。
+削除はプロセスの終了時（runner.run_scriptで実行した場合はスクリプトの終了時）まで待つ。
+中断などで残った削除用のフォルダは、次にクリアするときに合わせて削除する。
+
+名前を変更できない場合（Windowsでフォルダ内のファイルが開かれている場合など）や、
+フォルダがシンボリックリンクの場合は、従来どおり中身を1つずつ削除する。
+"""
+import os
+import shutil
+import threading
+import itertools
+
+TRASH_MARKER = ".trash-"
+
+_trash_counter = itertools.count()
+_delete_threads = []
+
+def trash_prefix(folder_path):
+    """folder_pathの削除用のフォルダの名前の先頭部分"""
+    return "." + os.path.basename(folder_path) + TRASH_MARKER
+
+def leftover_trash(folder_path):
+    """前回までの実行で残った、folder_pathの削除用のフォルダ"""
+    parent = os.path.dirname(folder_path)
+    prefix = trash_prefix(folder_path)
+    try:
+        names = os.listdir(parent)
+    except OSError:
+        return []
+    return [os.path.join(parent, name) for name in names
+            if name.startswith(prefix) and os.path.isdir(os.path.join(parent, name))]
+
+def delete_in_background(paths):
+    """pathsのフォルダをバックグラウンドのスレッドで削除する"""
+    if not paths:
+        return
+
+    def delete():
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+    thread = threading.Thread(target=delete, name="clear-folder")
+    thread.start()
+    _delete_threads.append(thread)
+
+def wait_for_deletes():
+    """バックグラウンドの削除がすべて終わるまで待つ"""
+    while _delete_threads:
+        _delete_threads.pop().join()
+
+def empty_folder(folder_path):
+    """フォルダの中身を1つずつ削除する（従来の方法）"""
+    for filename in os.listdir(folder_path):
+        file_path = os.path.join(folder_path, filename)
+        try:
+            if os.path.isfile(file_path) or os.path.islink(file_path):
+                os.unlink(file_path)
+            elif os.path.isdir(file_path):
+                shutil.rmtree(file_path)
+        except Exception as e:
+            print(f'{file_path} の削除に失敗しました。理由: {e}')
+
+def clear_folder(folder_path):
+    """フォルダを空にする（フォルダがなければ何もしない）
+
+    実行中にカレントディレクトリが変わってもよいよう、パスは絶対パスにしてから扱う。
+    """
+    folder_path = os.path.abspath(folder_path)
+    trash = leftover_trash(folder_path)
+    if os.path.isdir(folder_path):
+        if os.path.islink(folder_path):
+            empty_folder(folder_path)
+        else:
+            trash_path = os.path.join(os.path.dirname(folder_path),
+                                      f"{trash_prefix(folder_path)}{os.getpid()}-{next(_trash_counter)}")
+            try:
+                os.rename(folder_path, trash_path)
+            except OSError:
+                empty_folder(folder_path)
+            else:
+                os.makedirs(folder_path, exist_ok=True)
+                trash.append(trash_path)
+    delete_in_background(trash)
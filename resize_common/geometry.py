@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""幅を揃えて高さを許容範囲に収めるリサイズの計算
+
+出力サイズと元画像上の切り抜き範囲（box）を先に求め、Image.resize(size, box=box) の
+1回のリサンプリングで、リサイズと中央の切り抜きをまとめて行う。
+"""
+
+# 切り抜きの計算方法の版（出力が変わるため、差分処理のマニフェストに記録する）
+GEOMETRY_VERSION = 2
+
+def plan_band_resize(size, target_size, height_range):
+    """(出力サイズ, 元画像上の範囲box) を返す
+
+    - 幅をtarget_sizeの幅に合わせた高さがheight_rangeに収まる場合は、画像全体をその大きさにリサイズする
+    - 収まらない場合は、target_sizeの比率になるよう元画像の中央を切り抜いてtarget_sizeにリサイズする
+      （横長の画像は高さを、縦長の画像は幅を合わせ、はみ出した側を切り抜く）
+    """
+    width, height = size
+    target_width, target_height = target_size
+    min_height, max_height = height_range
+    original_ratio = width / height
+    full_box = (0, 0, width, height)
+
+    new_height = int(target_width / original_ratio)
+    if min_height <= new_height <= max_height:
+        return (target_width, new_height), full_box
+
+    if original_ratio > target_width / target_height:
+        # 横長: 高さを合わせ、左右を切り抜く
+        crop_width = target_width * height / target_height
+        left = (width - crop_width) / 2
+        return target_size, (left, 0, left + crop_width, height)
+
+    # 縦長: 幅を合わせ、上下を切り抜く
+    crop_height = target_height * width / target_width
+    top = (height - crop_height) / 2
+    return target_size, (0, top, width, top + crop_height)
+
+def resize_to_band(img, target_size, height_range, resample):
+    """plan_band_resizeの計算どおりに、1回のリサンプリングでリサイズ・切り抜きする"""
+    output_size, box = plan_band_resize(img.size, target_size, height_range)
+    return img.resize(output_size, resample, box=box)
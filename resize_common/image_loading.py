@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""画像の読み込み（縮小読み込み）"""
+from PIL import Image, JpegImagePlugin
+
+# 最終リサイズの前に、目標サイズの何倍以上の解像度を残すか
+SHRINK_MARGIN = 2
+# 画素数がこれを超える画像は、shrink_on_load=False でも縮小読み込みにする（フル解像度ではメモリが足りなくなるため）
+MAX_PIXELS = 100_000_000
+
+# JPEGのファイルの先頭（SOIマーカーと次のマーカーの先頭）
+JPEG_PREFIX = b"\xff\xd8\xff"
+
+def shrink_factor(size, min_size, margin=SHRINK_MARGIN):
+    """縮小後も min_size の margin 倍以上を保てる最大の整数縮小率を返す"""
+    width, height = size
+    min_width, min_height = min_size
+    if min_width <= 0 or min_height <= 0:
+        return 1
+    return max(1, min(width // (min_width * margin), height // (min_height * margin)))
+
+def reduce_for_target(img, min_size, margin=SHRINK_MARGIN):
+    """Image.reduce で整数倍に縮小する（min_size の margin 倍以上は残す）"""
+    factor = shrink_factor(img.size, min_size, margin)
+    if factor > 1:
+        img = img.reduce(factor)
+    return img
+
+def open_header(path):
+    """画像をヘッダーだけ読んで開く
+
+    Pillowの展開爆弾チェックは元の画像の大きさで判定するため、縮小読み込み（draftモード）で小さくデコードできる
+    巨大なJPEG（3万x8千のパノラマなど）も開けない。このようなJPEGだけはチェックなしで開き直し、
+    draftの後でcheck_decode_sizeを呼んで、実際にデコードする大きさで判定する。
+    Image.MAX_IMAGE_PIXELS は書き換えない（ほかのスレッドの Image.open のチェックに影響するため）。
+    """
+    try:
+        return Image.open(path)
+    except Image.DecompressionBombError:
+        with open(path, "rb") as f:
+            if f.read(len(JPEG_PREFIX)) != JPEG_PREFIX:
+                raise  # draftのない形式は、元の大きさでデコードするため上限を超える
+        return JpegImagePlugin.JpegImageFile(path)
+
+def check_decode_size(img):
+    """デコードする大きさ（draftの後のimg.size）がPillowの展開爆弾の上限を超えていればエラーにする
+
+    上限はPillowと同じく Image.MAX_IMAGE_PIXELS の2倍（Noneの場合は判定しない）。
+    """
+    if Image.MAX_IMAGE_PIXELS is None:
+        return
+    pixels = img.width * img.height
+    if pixels > 2 * Image.MAX_IMAGE_PIXELS:
+        raise Image.DecompressionBombError(
+            f"デコード後の画像の大きさ（{pixels} 画素）が上限の {2 * Image.MAX_IMAGE_PIXELS} 画素を超えています")
+
+def _shrinks(img, min_size, shrink_on_load, max_pixels):
+    """縮小読み込みにするか（画素数が max_pixels を超える画像は shrink_on_load=False でも縮小する）"""
+    oversized = max_pixels is not None and img.width * img.height > max_pixels
+    return (shrink_on_load or oversized) and min_size is not None
+
+def decode_key(path, min_size=None, shrink_on_load=True, margin=SHRINK_MARGIN, max_pixels=MAX_PIXELS):
+    """open_decoded が返す画像を決める (縮小読み込みか, draft後の大きさ) をヘッダーだけ読んで返す
+
+    キーが同じになる min_size では open_decoded の結果も同じになるため、複数の出力サイズを作る場合に
+    デコードを1回にまとめ、サイズごとの reduce_for_target だけを分けられる
+    （各サイズを open_image で個別に読み込んだ場合と画素単位で一致する）。
+    """
+    with open_header(path) as img:
+        shrink = _shrinks(img, min_size, shrink_on_load, max_pixels)
+        if shrink:
+            img.draft("RGB", (min_size[0] * margin, min_size[1] * margin))
+        return shrink, img.size
+
+def open_decoded(path, min_size=None, shrink_on_load=True, mode="RGB", margin=SHRINK_MARGIN, max_pixels=MAX_PIXELS):
+    """open_image のうち Image.reduce の前まで（draftモードでのデコードと変換）を行い、(画像, 縮小読み込みか) を返す"""
+    with open_header(path) as img:
+        shrink = _shrinks(img, min_size, shrink_on_load, max_pixels)
+        if shrink:
+            img.draft("RGB", (min_size[0] * margin, min_size[1] * margin))
+        check_decode_size(img)
+        return img.convert(mode), shrink
+
+def open_image(path, min_size=None, shrink_on_load=True, mode="RGB", margin=SHRINK_MARGIN, max_pixels=MAX_PIXELS):
+    """画像を読み込んでmodeに変換する
+
+    min_size（最終出力に必要な最小の幅・高さ）を指定した場合、JPEGはDCTスケーリング
+    （draftモード）で縮小しながらデコードし、さらに Image.reduce で min_size の
+    margin 倍を下回らない範囲まで縮小してから返す。最終的なLANCZOSリサイズは
+    呼び出し側で行う。shrink_on_load=False の場合は従来通りフル解像度で読み込む
+    （ただし画素数が max_pixels を超える画像は縮小読み込みにする）。
+    """
+    converted, shrink = open_decoded(path, min_size, shrink_on_load, mode, margin, max_pixels)
+    if shrink:
+        converted = reduce_for_target(converted, min_size, margin)
+    return converted
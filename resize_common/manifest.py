@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""差分処理用のマニフェスト（入力のハッシュ・サイズ・更新日時と処理パラメータ）
+
+各ツールの作業フォルダ（2_output_imagesと同じ場所）に保存し、
+--incremental 指定時は前回から変わっていない入力の処理を省略する。
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_FILENAME = ".resize_manifest.json"
+MANIFEST_VERSION = 1
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """ファイル内容のSHA-256を返す"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def job_digest(job):
+    """job["source"]の内容のSHA-256（1枚につき1回だけ計算し、job["digest"]に記録する）
+
+    重複検出・エンコードキャッシュのキー・マニフェストの記録で同じ値を使い、入力を何度も読まないようにする。
+    """
+    if job.get("digest") is None:
+        job["digest"] = file_digest(job["source"])
+    return job["digest"]
+
+def output_paths(output_folder, relative_path, filename, temp_folder=None):
+    """1つの入力から作られる出力ファイルのパス（--keep-temp時は1_temp_imagesのコピーも含む）"""
+    rel_dir = os.path.dirname(relative_path)
+    paths = [os.path.join(output_folder, rel_dir, filename)]
+    if temp_folder is not None:
+        temp_filename = os.path.splitext(os.path.basename(relative_path))[0] + ".webp"
+        paths.append(os.path.join(temp_folder, rel_dir, temp_filename))
+    return paths
+
+def new_manifest(params):
+    """今回の実行で記録するマニフェストを作成する"""
+    return {"version": MANIFEST_VERSION, "params": params, "entries": {}}
+
+def load_previous_entries(params, path=MANIFEST_FILENAME):
+    """前回のマニフェストの記録を読み込む
+
+    マニフェストがない・読めない・処理パラメータが変わった場合はNoneを返す
+    （出力フォルダをクリアして全て処理し直す）。
+    """
+    if not os.path.exists(path):
+        print("マニフェストがないため、全ての画像を処理します。")
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"警告: マニフェスト {path} を読み込めませんでした。全ての画像を処理します。理由: {e}")
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("params") != params:
+        print("処理パラメータが前回と異なるため、全ての画像を処理します。")
+        return None
+    return manifest.get("entries", {})
+
+def unchanged_entry(previous_entries, relative_path, file_path, outputs):
+    """前回から変わっていなければ、前回の記録を返す（変わっていればNone）
+
+    サイズと更新日時が同じならハッシュは計算しない。更新日時だけ変わった場合は
+    ハッシュを比較し、内容が同じなら処理済みとして扱う。
+    """
+    previous = previous_entries.get(relative_path)
+    if previous is None or previous.get("outputs") != outputs:
+        return None
+    if not all(os.path.exists(path) for path in outputs):
+        return None
+    stat = os.stat(file_path)
+    if stat.st_size != previous.get("size"):
+        return None
+    if stat.st_mtime_ns == previous.get("mtime_ns"):
+        return previous
+    if file_digest(file_path) != previous.get("sha256"):
+        return None
+    return dict(previous, mtime_ns=stat.st_mtime_ns)
+
+def record_entry(manifest, relative_path, file_path, outputs, previous=None, digest=None):
+    """処理済み（または変更なし）の入力をマニフェストに記録する（digestは計算済みの入力のハッシュ）"""
+    if previous is not None:
+        manifest["entries"][relative_path] = previous
+        return
+    stat = os.stat(file_path)
+    manifest["entries"][relative_path] = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest or file_digest(file_path),
+        "outputs": outputs,
+    }
+
+def remove_stale_outputs(previous_entries, current_outputs):
+    """入力が削除された・出力名が変わった前回の出力を削除する"""
+    current_outputs = set(current_outputs)
+    removed_count = 0
+    for relative_path, entry in previous_entries.items():
+        for path in entry.get("outputs", []):
+            if path in current_outputs or not os.path.exists(path):
+                continue
+            try:
+                os.unlink(path)
+                removed_count += 1
+                print(f"削除: {path}（入力 {relative_path} に対応する出力がなくなりました）")
+            except OSError as e:
+                print(f'{path} の削除に失敗しました。理由: {e}')
+    return removed_count
+
+def save_manifest(manifest, path=MANIFEST_FILENAME):
+    """マニフェストを一時ファイルに書き込んでから置き換える"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
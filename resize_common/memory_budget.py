@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""メモリ予算による処理の受け入れ制御
+
+デコード前にヘッダーから画像の大きさを読み、デコード・変換・リサイズ・エンコードで同時に
+メモリ上にある画像の大きさ（作業メモリ）を見積もる。処理中の見積もりの合計が予算を
+超えない範囲でだけ、新しい画像の処理を始める。
+
+1枚で予算を超える画像も、ほかに処理中の画像がなければ単独で処理する（止まらないようにするため）。
+画素数が上限を超える画像は、--no-shrink-on-load の指定に関係なく縮小読み込みで処理する。
+"""
+from PIL import Image
+
+from resize_common.image_loading import MAX_PIXELS, SHRINK_MARGIN, check_decode_size, open_header, shrink_factor
+
+DEFAULT_MEMORY_BUDGET_MB = 2048
+DEFAULT_MAX_MEGAPIXELS = MAX_PIXELS // 1_000_000
+
+def pixel_bytes(mode):
+    """Pillowが1画素に使うバイト数（RGB・RGBAなど複数チャンネルの画像は4バイト）"""
+    if mode in ("I", "F", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr", "LAB", "HSV"):
+        return 4
+    if mode.startswith("I;16"):
+        return 2
+    return 1 if Image.getmodebands(mode) == 1 else 4
+
+def probe_image(path, min_size=None, shrink_on_load=True, margin=SHRINK_MARGIN, max_pixels=MAX_PIXELS):
+    """画素をデコードせずに、元のサイズ・モードとデコード時のサイズを返す
+
+    JPEGの縮小読み込み（draftモード）はヘッダーだけでデコード時のサイズが決まるため、
+    open_imageと同じ指定でdraftを呼び、実際にデコードされる大きさを求める。
+    画素数が max_pixels を超える画像は、open_imageと同じく縮小読み込みにする（"shrink"に記録）。
+    縮小しても展開爆弾の上限を超える画像は、open_imageと同じくエラーにする。
+    """
+    with open_header(path) as img:
+        size, mode = img.size, img.mode
+        oversized = max_pixels is not None and img.width * img.height > max_pixels
+        shrink = (shrink_on_load or oversized) and min_size is not None
+        if shrink:
+            img.draft("RGB", (min_size[0] * margin, min_size[1] * margin))
+        check_decode_size(img)
+        return {"size": size, "mode": mode, "decode_size": img.size, "decode_mode": img.mode,
+                "shrink": shrink, "oversized": oversized}
+
+def estimate_working_set(probe, output_size, min_size=None, shrink_on_load=True, margin=SHRINK_MARGIN):
+    """1枚の処理で同時にメモリ上にある画像の合計バイト数を見積もる
+
+    デコードした画像、RGBに変換した画像、Image.reduceの結果、リサイズ後の画像とエンコード用のバッファ
+    """
+    decode_width, decode_height = probe["decode_size"]
+    decode_pixels = decode_width * decode_height
+    total = decode_pixels * pixel_bytes(probe["decode_mode"])  # デコードした画像
+    total += decode_pixels * pixel_bytes("RGB")  # RGBに変換した画像
+    if shrink_on_load and min_size is not None:
+        factor = shrink_factor(probe["decode_size"], min_size, margin)
+        if factor > 1:
+            total += decode_pixels // (factor * factor) * pixel_bytes("RGB")
+    total += output_size[0] * output_size[1] * pixel_bytes("RGB") * 2  # リサイズ後の画像とエンコード
+    return total
+
+def plan_memory(path, min_size, output_size, shrink_on_load=True, max_pixels=MAX_PIXELS):
+    """ヘッダーの情報（probe_image）に、作業メモリの見積もりバイト数を"bytes"として加えて返す"""
+    probe = probe_image(path, min_size, shrink_on_load, max_pixels=max_pixels)
+    probe["bytes"] = estimate_working_set(probe, output_size, min_size, probe["shrink"])
+    return probe
+
+def estimate_file_memory(path, min_size=None, output_size=(0, 0), shrink_on_load=True, max_pixels=MAX_PIXELS):
+    """作業メモリの見積もりバイト数（ヘッダーを読めない画像は0とし、エラーは処理の工程で記録する）
+
+    min_sizeを指定しない場合（トリミングのためにフル解像度で読み込む場合など）は、元のサイズで見積もる。
+    """
+    try:
+        return plan_memory(path, min_size, output_size, shrink_on_load, max_pixels)["bytes"]
+    except Exception:
+        return 0
+
+def new_memory_budget(limit_bytes):
+    """処理中の作業メモリの見積もりを管理する予算を作成する"""
+    return {"limit": limit_bytes, "in_flight": 0, "running": 0, "peak": 0, "waits": 0}
+
+def try_admit(budget, nbytes):
+    """予算内なら処理中に加えてTrueを返す（処理中の画像がなければ予算を超えても受け入れる）"""
+    if budget["running"] and budget["in_flight"] + nbytes > budget["limit"]:
+        budget["waits"] += 1
+        return False
+    budget["in_flight"] += nbytes
+    budget["running"] += 1
+    budget["peak"] = max(budget["peak"], budget["in_flight"])
+    return True
+
+def release(budget, nbytes):
+    """処理が終わった画像の作業メモリを予算に戻す"""
+    budget["in_flight"] -= nbytes
+    budget["running"] -= 1
+
+def budget_summary(budget):
+    """実行レポート用の集計"""
+    return {
+        "limit_mb": round(budget["limit"] / (1024 * 1024), 1),
+        "peak_mb": round(budget["peak"] / (1024 * 1024), 1),
+        "waits": budget["waits"],
+    }
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""出力ファイルの書き込み"""
+import os
+import shutil
+import threading
+
+def output_path_for(folder, relative_path, filename):
+    """入力の相対パスのディレクトリ構造を維持した出力パスを返す（ディレクトリも作成する）"""
+    rel_dir = os.path.dirname(relative_path)
+    directory = os.path.join(folder, rel_dir) if rel_dir else folder
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename)
+
+def save_webp_atomic(img, path, **save_params):
+    """WebPを一時ファイルに書き込み、完成してから最終名に置き換える
+
+    途中で中断しても、最終名のファイルが壊れた状態で残らない。
+    一時ファイル名はプロセスとスレッドごとに分ける（出力ファイル名が重複する画像を別スレッドで同時に書く場合がある）。
+    """
+    directory, filename = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        img.save(tmp_path, "WEBP", **save_params)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+def link_or_copy(src, dst):
+    """srcと同じ内容のファイルをdstに作成する（可能ならハードリンク、できなければコピー）"""
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return dst
+    if os.path.exists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+def copy_file_atomic(src, dst):
+    """srcをdstにコピーする（一時ファイルに書き込み、完成してから最終名に置き換える）
+
+    ハードリンクと違い、コピー後にどちらかを書き換えても、もう一方は変わらない。
+    """
+    directory, filename = os.path.split(dst)
+    tmp_path = os.path.join(directory, f".{filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return dst
+
+def keep_temp_copy(output_path, temp_folder, relative_path):
+    """デバッグ用に、元のファイル名のWebPを1_temp_imagesにも残す（可能ならハードリンク）"""
+    temp_filename = os.path.splitext(os.path.basename(relative_path))[0] + ".webp"
+    return link_or_copy(output_path, output_path_for(temp_folder, relative_path, temp_filename))
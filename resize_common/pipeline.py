@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""読み込み・変換・書き出しのスレッドパイプライン
+
+Pillowはデコード・リサイズ・WebPエンコードの間GILを解放するため、1つのプロセスでも
+工程ごとのスレッドプールに分けると、ディスクの読み書きと複数コアでの処理を重ねられる。
+
+- read（読み込み・デコード）、transform（トリミング・リサイズ）、write（エンコード・保存）の
+  3つのスレッドプールを順に通す
+- 処理中の画像の数（とメモリ予算）に上限を設け、超えた場合は古い画像の完了を待ってから
+  次の画像を取り出す（入力のスキャンもそこで止まる）
+- 結果（finish）は、メインスレッドで入力順に呼ぶ（ログと記録を逐次処理と同じ順序にする）
+- 重複した入力（dedup）は工程に渡さず、元の画像の完了後に出力を共有する（link）
+- processes=True の場合は、スレッドプールの代わりにワーカープロセスで1枚分の工程をまとめて実行する
+
+各工程の関数は、画像ごとの辞書（job）を受け取り、結果をjobに書き込む。
+工程の中でjob["cache_hit"]をTrueにした場合（エンコードキャッシュから出力した場合など）は、残りの工程を行わない。
+"""
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from resize_common.dedup import find_duplicate, known_digest
+from resize_common.memory_budget import release, try_admit
+from resize_common.run_report import timed
+
+# 読み込みのスレッド数（ディスクI/Oとデコードが中心のため少なめ）
+IO_THREADS = 2
+
+def default_threads():
+    """変換・書き出し工程のスレッド数のデフォルト（CPU数）"""
+    return os.cpu_count() or 1
+
+def run_stages(job, stages):
+    """1枚分の工程を順に実行する（逐次処理用）。例外はそのまま返す"""
+    try:
+        for stage in stages:
+            stage(job)
+            if job.get("cache_hit"):
+                break
+    except Exception as e:
+        return e
+    return None
+
+def submit_chain(job, steps):
+    """(スレッドプール, 工程) のリストを順に実行し、全工程の完了で結果が決まるFutureを返す"""
+    done = Future()
+
+    def advance(index):
+        if index == len(steps) or job.get("cache_hit"):
+            done.set_result(None)
+            return
+        executor, stage = steps[index]
+
+        def run():
+            try:
+                stage(job)
+            except Exception as e:
+                done.set_exception(e)
+                return
+            advance(index + 1)
+
+        executor.submit(run)
+
+    advance(0)
+    return done
+
+def run_in_process(stages, job):
+    """ワーカープロセスで1枚分の工程を実行し、(更新したjob, 例外) を返す"""
+    return job, run_stages(job, stages)
+
+def submit_to_process(executor, job, stages):
+    """1枚分の工程をまとめてプロセスプールで実行し、ワーカーで更新したjobを反映してから結果が決まるFutureを返す"""
+    done = Future()
+
+    def merge(future):
+        try:
+            updated, error = future.result()
+        except Exception as e:
+            done.set_exception(e)
+            return
+        job.update(updated)
+        if error is None:
+            done.set_result(None)
+        else:
+            done.set_exception(error)
+
+    executor.submit(run_in_process, stages, job).add_done_callback(merge)
+    return done
+
+def input_key(job):
+    """画像を識別する入力の相対パス（job["input"]、ない場合はjob["relative_path"]）"""
+    return job.get("input", job["relative_path"])
+
+def check_duplicate(dedup, job, originals):
+    """jobが既に受け付けた画像の重複なら、元の画像のjobを返す（job["source"]のファイルの内容で判定する）
+
+    判定でハッシュを計算した場合はjob["digest"]に記録し、エンコードキャッシュ・マニフェストでも使う。
+    """
+    if dedup is None:
+        return None
+    with timed(job["timings"], "dedup"):
+        original_key = find_duplicate(dedup, job["source"], input_key(job), job.get("digest"),
+                                      lambda key: originals[key].get("digest"))
+    job["digest"] = known_digest(dedup, job["source"])
+    if original_key is None:
+        originals[input_key(job)] = job
+        return None
+    job["duplicate_of"] = original_key
+    return originals[original_key]
+
+def link_duplicate(job, original, link):
+    """元の画像の出力を共有する（元の画像がエラーの場合はエラーにする）"""
+    if original.get("error") is not None:
+        return RuntimeError(f"重複元の {input_key(original)} の処理に失敗しました")
+    try:
+        with timed(job["timings"], "link"):
+            link(job, original)
+    except Exception as e:
+        return e
+    return None
+
+def run_pipeline(jobs, read, transform, write, finish, threads=1, io_threads=IO_THREADS,
+                 max_in_flight=None, budget=None, dedup=None, link=None, processes=False):
+    """jobsの各画像を read → transform → write の順に処理し、入力順に finish(job, error) を呼ぶ
+
+    変換と書き出し（WebPのエンコードはCPUが中心）はそれぞれthreads個、読み込みはio_threads個のスレッドで行う。
+    threads=1 の場合はスレッドを使わず、1枚ずつ順に処理する（従来と同じ動作）。
+    budget（memory_budget.new_memory_budget）を指定した場合は、job["memory"]（作業メモリの
+    見積もりバイト数）の合計が予算を超えないように、新しい画像の処理の開始を待つ。
+    jobsはジェネレーターでもよく、処理中の画像が上限に達している間は次の画像を取り出さない。
+    dedup（dedup.new_dedup）を指定した場合は、既に受け付けた画像と内容が同じ画像を処理せず、
+    元の画像の完了後に link(job, original_job) で出力を共有してから finish を呼ぶ（job["duplicate_of"]に元の相対パス）。
+    processes=True の場合は、threads個のワーカープロセスで1枚分の工程をまとめて実行し、ワーカーで更新した
+    jobをメインプロセスのjobに反映する（工程の関数とjobはpickleできるものに限る。重複の判定・link・finishはメインプロセス）。
+    """
+    stages = [read, transform, write]
+    # 受け付けた画像（重複の元になりうるもの）を相対パスで引く
+    originals = {}
+
+    def finish_job(job, error):
+        job["error"] = error
+        finish(job, error)
+
+    if threads <= 1:
+        for job in jobs:
+            original = check_duplicate(dedup, job, originals)
+            if original is not None:
+                finish_job(job, link_duplicate(job, original, link))
+                continue
+            if budget is not None:
+                try_admit(budget, job.get("memory", 0))
+            error = run_stages(job, stages)
+            if budget is not None:
+                release(budget, job.get("memory", 0))
+            finish_job(job, error)
+        return
+
+    if processes:
+        if max_in_flight is None:
+            # スキャンが先に進みすぎないよう、ワーカー数の2倍まで投入する
+            max_in_flight = threads * 2 + 1
+        workers = ProcessPoolExecutor(threads)
+        executors = [workers]
+
+        def submit(job):
+            return submit_to_process(workers, job, stages)
+    else:
+        if max_in_flight is None:
+            max_in_flight = (threads * 2 + io_threads) * 2
+        readers = ThreadPoolExecutor(io_threads, thread_name_prefix="read")
+        transformers = ThreadPoolExecutor(threads, thread_name_prefix="transform")
+        writers = ThreadPoolExecutor(threads, thread_name_prefix="write")
+        executors = [readers, transformers, writers]
+        steps = [(readers, read), (transformers, transform), (writers, write)]
+
+        def submit(job):
+            return submit_chain(job, steps)
+    # 処理中の画像（入力順）
+    pending = deque()
+
+    def finish_oldest():
+        job, future = pending.popleft()
+        if "duplicate_of" in job:
+            # 重複の場合はfutureの代わりに元の画像のjob（入力順で先にあるため、ここでは完了している）
+            finish_job(job, link_duplicate(job, future, link))
+            return
+        error = future.exception()
+        if budget is not None:
+            release(budget, job.get("memory", 0))
+        finish_job(job, error)
+
+    try:
+        for job in jobs:
+            original = check_duplicate(dedup, job, originals)
+            if original is not None:
+                # 処理はせず、入力順に元の画像の完了を待つ
+                pending.append((job, original))
+                continue
+            if budget is not None:
+                # 予算を超える場合は、古いものから完了を待って空きを作る
+                while not try_admit(budget, job.get("memory", 0)):
+                    finish_oldest()
+            pending.append((job, submit(job)))
+            while len(pending) >= max_in_flight:
+                finish_oldest()
+        while pending:
+            finish_oldest()
+    finally:
+        # 途中で例外（Ctrl+Cなど）が起きた場合も、処理中の画像が終わってから終了する
+        for executor in executors:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""リネーム計画（入力の相対パス -> 出力ファイル名）
+
+スキャンしながら1件ずつ作成し、処理中は相対パスをキーにO(1)で参照する。
+別フォルダにある同名ファイル（例: 2134/ と 2135/）も相対パスで区別される。
+"""
+import os
+
+def add_to_plan(plan, file_path, relative_path, target_filename, keep_original=False):
+    """出力ファイル名を計画に登録する"""
+    plan[relative_path] = {
+        "source": file_path,
+        "filename": target_filename,
+        "target": os.path.join(os.path.dirname(relative_path), target_filename),
+        "keep_original": keep_original,
+        "skip_reason": None,
+    }
+
+def skip_in_plan(plan, file_path, relative_path, reason):
+    """処理しないファイルとして計画に登録する"""
+    plan[relative_path] = {
+        "source": file_path,
+        "filename": None,
+        "target": None,
+        "keep_original": False,
+        "skip_reason": reason,
+    }
+
+def stream_plan(plan, image_files, plan_file):
+    """スキャン結果を1件ずつ plan_file(plan, パス, ファイル名, 相対パス) で計画に登録し、
+    処理対象になったものをすぐに (相対パス, 計画) で返す（スキャン中から処理を始めるため）"""
+    for file_path, filename, relative_path in image_files:
+        plan_file(plan, file_path, filename, relative_path)
+        entry = plan.get(relative_path)
+        if entry is not None and entry["target"] is not None:
+            yield relative_path, entry
+
+def build_plan(image_files, plan_file):
+    """スキャン結果を全て計画に登録して返す（--plan-only用）"""
+    plan = {}
+    for _ in stream_plan(plan, image_files, plan_file):
+        pass
+    return plan
+
+def planned_items(plan):
+    """処理対象の (相対パス, 計画) をスキャン順に返す"""
+    return [(relative_path, entry) for relative_path, entry in plan.items() if entry["target"] is not None]
+
+def find_collisions(plan):
+    """複数の入力が同じ出力先になっているものを {出力先: [入力, ...]} で返す"""
+    sources_by_target = {}
+    for relative_path, entry in planned_items(plan):
+        sources_by_target.setdefault(entry["target"], []).append(relative_path)
+    return {target: sources for target, sources in sources_by_target.items() if len(sources) > 1}
+
+def warn_collisions(plan):
+    """出力先の重複を警告する（後から処理したファイルで上書きされる）"""
+    collisions = find_collisions(plan)
+    for target, sources in collisions.items():
+        print(f"警告: 出力ファイル名が重複しています: {target} <- {', '.join(sources)}（後のファイルで上書きされます）")
+    return collisions
+
+def print_rename_plan(plan):
+    """リネーム計画を表示する（--plan-only用）"""
+    print("--- リネーム計画 ---")
+    for relative_path, entry in plan.items():
+        if entry["target"] is None:
+            print(f"{relative_path} -> （スキップ: {entry['skip_reason']}）")
+        elif entry["keep_original"]:
+            print(f"{relative_path} -> {entry['target']}（名前変更しない）")
+        else:
+            print(f"{relative_path} -> {entry['target']}")
+    planned_count = len(planned_items(plan))
+    print(f"処理対象: {planned_count} 件 / スキップ: {len(plan) - planned_count} 件")
+    warn_collisions(plan)
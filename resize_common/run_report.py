@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""工程別（スキャン・重複検出・キャッシュ・デコード・トリミング・リサイズ・エンコード・コピー）の処理時間の計測と実行レポート
+
+画像ごとの時間とバイト数を記録し、実行の最後に工程ごとの合計・p50・p95・最大を
+2_output_imagesと同じ場所の run_report.json に書き出す。
+"""
+import os
+import json
+import math
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+REPORT_FILENAME = "run_report.json"
+STAGES = ("scan", "dedup", "cache", "decode", "trim", "resize", "encode", "copy", "link")
+
+def new_run_report(tool):
+    """実行レポートを作成する（作成した時点から全体の経過時間を計る）"""
+    return {
+        "tool": tool,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "start_time": time.perf_counter(),
+        "run_stages": {},
+        "images": [],
+    }
+
+@contextmanager
+def timed(timings, stage):
+    """with内の処理時間をtimings[stage]に加算する"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start_time
+
+def timed_iter(iterable, timings, stage):
+    """要素を1つずつ返し、次の要素を取り出すまでの時間をtimings[stage]に加算する（スキャンなどの計測用）"""
+    iterator = iter(iterable)
+    while True:
+        with timed(timings, stage):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def file_bytes(path):
+    """ファイルサイズ（パスのリストなら合計、存在しない場合はNone）"""
+    try:
+        if isinstance(path, (list, tuple)):
+            return sum(os.path.getsize(p) for p in path)
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+def record_image(report, relative_path, timings, input_path=None, output_path=None, error=None, duplicate_of=None):
+    """1枚分の工程別時間とバイト数を記録する（1枚から複数出力する場合はoutput_pathにリストを渡す）
+
+    重複した入力として処理せず出力を共有した場合は、duplicate_ofに元の画像の相対パスを渡す。
+    """
+    image = {
+        "input": relative_path,
+        "output": output_path,
+        "stages": {stage: round(seconds, 6) for stage, seconds in timings.items()},
+        "total": round(sum(timings.values()), 6),
+        "input_bytes": file_bytes(input_path),
+        "output_bytes": file_bytes(output_path) if error is None else None,
+        "error": error,
+    }
+    if duplicate_of is not None:
+        image["duplicate_of"] = duplicate_of
+    report["images"].append(image)
+
+def percentile(sorted_values, fraction):
+    """昇順に並んだ値のパーセンタイル（最近傍順位法）"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def stage_summary(values):
+    """工程ごとの集計（件数・合計・平均・p50・p95・最大）"""
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "total": round(sum(values), 6),
+        "mean": round(sum(values) / len(values), 6),
+        "p50": round(percentile(values, 0.50), 6),
+        "p95": round(percentile(values, 0.95), 6),
+        "max": round(values[-1], 6),
+    }
+
+def summarize(report):
+    """画像ごとの記録から工程別の集計を作る（スキャンなど実行全体の工程も含む）"""
+    values_by_stage = {}
+    for image in report["images"]:
+        for stage, seconds in image["stages"].items():
+            values_by_stage.setdefault(stage, []).append(seconds)
+    for stage, seconds in report["run_stages"].items():
+        values_by_stage.setdefault(stage, []).append(seconds)
+    order = list(STAGES) + sorted(set(values_by_stage) - set(STAGES))
+    return {stage: stage_summary(values_by_stage[stage]) for stage in order if stage in values_by_stage}
+
+def write_run_report(report, output_folder, extra=None):
+    """run_report.jsonを2_output_imagesと同じ場所に書き出し、工程別の集計を表示する"""
+    elapsed = time.perf_counter() - report["start_time"]
+    images = report["images"]
+    stages = summarize(report)
+    data = {
+        "tool": report["tool"],
+        "started": report["started"],
+        "elapsed": round(elapsed, 6),
+        "images": len(images),
+        "errors": sum(1 for image in images if image["error"] is not None),
+        "input_bytes": sum(image["input_bytes"] or 0 for image in images),
+        "output_bytes": sum(image["output_bytes"] or 0 for image in images),
+        "stages": stages,
+    }
+    if extra:
+        data.update(extra)
+    data["per_image"] = images
+
+    report_path = os.path.join(os.path.dirname(os.path.abspath(output_folder)), REPORT_FILENAME)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+
+    print("--- 工程別の処理時間 ---")
+    for stage, summary in stages.items():
+        print(f"{stage}: 合計 {summary['total']:.2f} 秒 / p50 {summary['p50'] * 1000:.1f} ms / "
+              f"p95 {summary['p95'] * 1000:.1f} ms / 最大 {summary['max'] * 1000:.1f} ms（{summary['count']} 回）")
+    print(f"実行レポート: {report_path}")
+    return report_path
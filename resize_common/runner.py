@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""ツールのスクリプトを同じプロセス内で __main__ として実行する（常駐ワーカー・一括実行で共用）"""
+import os
+import sys
+import runpy
+
+from resize_common.folders import wait_for_deletes
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def resolve_script(script):
+    """プロジェクト内のPythonスクリプトだけを実行対象にする"""
+    script = os.path.realpath(script)
+    if not script.endswith(".py") or os.path.commonpath([script, os.path.realpath(PROJECT_ROOT)]) != os.path.realpath(PROJECT_ROOT):
+        raise ValueError(f"プロジェクト外のスクリプトは実行できません: {script}")
+    return script
+
+def exit_code(e):
+    """SystemExitを終了コードに変換する（文字列の場合は表示して1）"""
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    print(e.code, file=sys.stderr)
+    return 1
+
+def run_script(script, args, cwd):
+    """cwdでスクリプトを実行し、終了コードを返す
+
+    sys.argv・sys.path・カレントディレクトリは実行後に元に戻す（スクリプトがsys.pathに追加したパスも残さない）。
+    clear_folderのバックグラウンドの削除は、スクリプトの終了時に待つ（常駐ワーカーの子プロセスはos._exitで終了するため）。
+    """
+    script = resolve_script(script)
+    saved_argv, saved_path, saved_cwd = sys.argv, list(sys.path), os.getcwd()
+    try:
+        os.chdir(cwd)
+        sys.argv = [script] + list(args)
+        sys.path[0] = os.path.dirname(script)
+        runpy.run_path(script, run_name="__main__")
+        return 0
+    except SystemExit as e:
+        return exit_code(e)
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        wait_for_deletes()
+        sys.argv = saved_argv
+        sys.path[:] = saved_path
+        os.chdir(saved_cwd)
+        sys.stdout.flush()
+        sys.stderr.flush()
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""入力フォルダのスキャン
+
+os.scandir のエントリが持つファイル種別（d_type）を使い、ファイルごとの stat を行わずに
+サブフォルダを判定する。見つかった画像はジェネレーターで1件ずつ返すため、
+スキャンの完了を待たずに処理を始められる（SMBなどのネットワークドライブ向け）。
+"""
+import os
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+def is_directory(entry):
+    """エントリがフォルダか（シンボリックリンク先も含む。判定できない場合はFalse）"""
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+def iter_image_files(dir_path, relative_path="", extensions=IMAGE_EXTENSIONS):
+    """ディレクトリを再帰的にスキャンし、画像ファイルを (パス, ファイル名, 相対パス) で見つけた順に返す
+
+    拡張子は大文字・小文字を区別しない。順序は従来の os.listdir による再帰と同じ。
+    """
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            # 相対パスを構築（出力時のディレクトリ構造を維持するため）
+            item_relative_path = os.path.join(relative_path, entry.name) if relative_path else entry.name
+
+            if is_directory(entry):
+                # サブディレクトリの場合は再帰的に処理
+                yield from iter_image_files(entry.path, item_relative_path, extensions)
+            elif entry.name.lower().endswith(extensions):
+                yield entry.path, entry.name, item_relative_path
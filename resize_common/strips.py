@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""巨大なPNG（CADの書き出しなど）の帯（ストリップ）単位の処理
+
+画素数がしきい値を超えるPNGは、画像全体をデコードせずに上から一定の行数ずつデコードし、
+1. 1回目の読み込みで、帯ごとの内容のマスクからトリミング範囲を少しずつ広げて求める
+2. 2回目の読み込みで、トリミング範囲の行・列だけを帯ごとに Image.reduce で縮小し、縮小後の画像に並べる
+メモリ上にあるのは1つの帯と縮小後の画像だけなので、使用メモリは画像の大きさではなく帯の大きさで決まる。
+
+PNGの行フィルター（Up・Average・Paeth）は直前の行を参照するため、帯の先頭には直前の行（フィルター解除済み）を
+フィルターなしの行として付け、無圧縮のzlibで小さなPNGに組み立ててPillowでデコードする。
+対応するのはビット深度8・インターレースなしのPNGで、それ以外の画像は従来どおり全体をデコードする。
+
+帯ごとの Image.reduce は、帯の境界を縮小のブロックにそろえるため、画像全体を縮小した場合と同じ結果になる。
+"""
+import io
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from resize_common.image_loading import shrink_factor
+from resize_common.trim import content_mask, dark_mask
+
+# この画素数を超えるPNGを帯単位で処理する
+DEFAULT_STRIP_MEGAPIXELS = 50
+# 1つの帯の画素数の目安
+STRIP_PIXELS = 4 * 1024 * 1024
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# カラータイプ: 1画素のバイト数（ビット深度8）
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# 帯のデコードに必要な、IDAT以外のチャンク
+PALETTE_CHUNKS = (b"PLTE", b"tRNS")
+
+def read_chunks(f):
+    """PNGのチャンクを (種類, データ) の順に返す（シグネチャの後から読む）"""
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        length, kind = struct.unpack(">I4s", header)
+        data = f.read(length)
+        f.read(4)  # CRC
+        yield kind, data
+        if kind == b"IEND":
+            return
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def probe_strips(path, max_pixels=DEFAULT_STRIP_MEGAPIXELS * 1_000_000):
+    """画素数がmax_pixelsを超え、帯単位で処理できるPNGならヘッダーの情報を返す（それ以外はNone）"""
+    try:
+        with open(path, "rb") as f:
+            if f.read(8) != PNG_SIGNATURE:
+                return None
+            kind, data = next(read_chunks(f), (None, b""))
+    except OSError:
+        return None  # 読めないファイルは処理の工程でエラーを記録する
+    if kind != b"IHDR" or len(data) != 13:
+        return None
+    width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", data)
+    if width * height <= max_pixels or depth != 8 or interlace or color_type not in PNG_CHANNELS:
+        return None
+    return {"size": (width, height), "color_type": color_type, "ihdr": data,
+            "rows_per_strip": max(1, STRIP_PIXELS // width)}
+
+def decode_rows(header, palette_chunks, previous, raw):
+    """フィルターがかかったままの行（raw）をデコードし、(RGB画像, 最後の行のフィルター解除済みのバイト列) を返す
+
+    previousは直前の行のフィルター解除済みのバイト列（先頭の帯ではNone）。
+    """
+    width = header["size"][0]
+    rows = len(raw) // (1 + width * PNG_CHANNELS[header["color_type"]])
+    if previous is not None:
+        raw = b"\x00" + previous + raw
+    ihdr = struct.pack(">II", width, rows + (previous is not None)) + header["ihdr"][8:]
+    png = (PNG_SIGNATURE + png_chunk(b"IHDR", ihdr) + b"".join(png_chunk(k, d) for k, d in palette_chunks)
+           + png_chunk(b"IDAT", zlib.compress(raw, 0)) + png_chunk(b"IEND", b""))
+    with Image.open(io.BytesIO(png)) as img:
+        img.load()
+        last_row = img.crop((0, img.height - 1, width, img.height)).tobytes()
+        if previous is not None:
+            img = img.crop((0, 1, width, img.height))
+        return img.convert("RGB"), last_row
+
+def iter_strips(path, header, end_row=None):
+    """PNGを上から帯単位でデコードし、(帯の先頭の行, RGB画像) を返す（end_rowまでの行だけ読む）"""
+    width, height = header["size"]
+    end_row = height if end_row is None else min(end_row, height)
+    row_bytes = 1 + width * PNG_CHANNELS[header["color_type"]]
+    strip_bytes = row_bytes * header["rows_per_strip"]
+    decompressor = zlib.decompressobj()
+    palette_chunks, buffer, previous, y = [], bytearray(), None, 0
+
+    with open(path, "rb") as f:
+        f.read(len(PNG_SIGNATURE))
+        for kind, data in read_chunks(f):
+            if kind in PALETTE_CHUNKS:
+                palette_chunks.append((kind, data))
+            if kind != b"IDAT":
+                continue
+            while data and y < end_row:
+                # 圧縮率が高い画像でも、展開するのは1つの帯の分までにする
+                buffer += decompressor.decompress(data, strip_bytes)
+                data = decompressor.unconsumed_tail
+                while y < end_row and (len(buffer) >= strip_bytes or len(buffer) >= (end_row - y) * row_bytes):
+                    rows = min(header["rows_per_strip"], end_row - y)
+                    strip, previous = decode_rows(header, palette_chunks, previous, bytes(buffer[:rows * row_bytes]))
+                    del buffer[:rows * row_bytes]
+                    yield y, strip
+                    y += rows
+            if y >= end_row:
+                return
+    if y < end_row:
+        raise ValueError(f"PNGの画像データが途中で終わっています（{y}/{end_row} 行）")
+
+def strip_bbox(path, header, mask_of):
+    """帯ごとのマスク（mask_of: 画像 -> 内容の2次元マスク）から、内容のある範囲を返す（内容がなければNone）"""
+    left = top = right = bottom = None
+    for y, strip in iter_strips(path, header):
+        mask = mask_of(strip)
+        rows = np.flatnonzero(mask.any(axis=1))
+        if not rows.size:
+            continue
+        columns = np.flatnonzero(mask.any(axis=0))
+        if top is None:
+            top = y + int(rows[0])
+            left, right = int(columns[0]), int(columns[-1])
+        else:
+            left, right = min(left, int(columns[0])), max(right, int(columns[-1]))
+        bottom = y + int(rows[-1])
+    if top is None:
+        return None
+    return (left, top, right + 1, bottom + 1)
+
+def strip_content_bbox(path, header, bg_color=(255, 255, 255), tolerance=0):
+    """trim.content_bboxと同じ判定を帯単位で行う"""
+    return strip_bbox(path, header, lambda strip: content_mask(np.asarray(strip), bg_color, tolerance))
+
+def strip_dark_content_bbox(path, header, threshold=235, per_channel=False):
+    """trim.dark_content_bboxと同じ判定を帯単位で行う"""
+    return strip_bbox(path, header, lambda strip: dark_mask(strip, threshold, per_channel))
+
+def reduce_strips(path, header, box, factor):
+    """boxの範囲を Image.reduce(factor) で縮小した画像を、帯単位のデコードで作る
+
+    ブロック（factor行）の途中で帯が終わった場合は、残りの行を次の帯とつなげてから縮小する。
+    """
+    left, top, right, bottom = box
+    width = right - left
+    reduced = Image.new("RGB", (-(-width // factor), -(-(bottom - top) // factor)))
+    carry, out_y = None, 0
+
+    def reduce_rows(rows):
+        nonlocal out_y
+        block = rows.reduce(factor) if factor > 1 else rows
+        reduced.paste(block, (0, out_y))
+        out_y += block.height
+
+    for y, strip in iter_strips(path, header, end_row=bottom):
+        if y + strip.height <= top:
+            continue
+        region = strip.crop((left, max(top - y, 0), right, strip.height))
+        if carry is not None:
+            joined = Image.new("RGB", (width, carry.height + region.height))
+            joined.paste(carry, (0, 0))
+            joined.paste(region, (0, carry.height))
+            region = joined
+        complete = region.height // factor * factor
+        if complete:
+            reduce_rows(region.crop((0, 0, width, complete)))
+        carry = region.crop((0, complete, width, region.height)) if complete < region.height else None
+    if carry is not None:
+        reduce_rows(carry)  # 最後の端数の行（画像全体の縮小と同じく、残りの行だけで平均する）
+    return reduced
+
+def estimate_strip_memory(header, min_size, output_size=(0, 0)):
+    """帯単位で処理する場合の作業メモリの見積もりバイト数
+
+    1つの帯（展開したデータ・組み立てたPNG・デコードした画像・RGBに変換した画像・マスク）と、
+    縮小後の画像、リサイズ後の画像とエンコード用のバッファ
+    """
+    width, height = header["size"]
+    strip_pixels = width * header["rows_per_strip"]
+    total = strip_pixels * (PNG_CHANNELS[header["color_type"]] * 2 + 4 + 4 + 1)
+    factor = shrink_factor((width, height), min_size)
+    total += -(-width // factor) * -(-height // factor) * 4
+    total += output_size[0] * output_size[1] * 4 * 2
+    return total
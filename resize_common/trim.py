@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""余白（背景色）の自動トリミング
+
+フル解像度の背景画像・差分画像・マスク画像を作らずに、内容の範囲（バウンディングボックス）を求める。
+1. 一定間隔で画素を間引いたプロキシ画像から、おおよその範囲を求める
+2. その外側の帯（上下左右の余白部分）だけをフル解像度で、NumPyの行・列ごとの集計で確定する
+
+プロキシの画素は元の画素そのもの（平均ではない）なので、プロキシで内容と判定された画素は
+元の画像でも内容であり、その内側を読み飛ばしても結果は全画素を調べた場合と同じになる。
+（間引きで見落とした細い線などは、外側の帯をフル解像度で調べるときに見つかる）
+"""
+import numpy as np
+from PIL import Image
+
+# プロキシ画像の長辺の目安（これより小さい画像はプロキシを作らずに調べる）
+PROXY_SIZE = 1024
+# フル解像度で一度に配列にする画素数（メモリ使用量の上限の目安）
+CHUNK_PIXELS = 4 * 1024 * 1024
+
+def content_mask(pixels, bg_color, tolerance=0):
+    """背景色との差がtoleranceを超える画素をTrueにした2次元のマスクを返す"""
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    mask = np.zeros(pixels.shape[:2], dtype=bool)
+    for channel, value in enumerate(bg_color[:pixels.shape[2]]):
+        # uint8のまま比較し、差分用の大きな配列を作らない
+        low, high = value - tolerance, value + tolerance
+        band = pixels[:, :, channel]
+        if low > 0:
+            mask |= band < low
+        if high < 255:
+            mask |= band > high
+    return mask
+
+def dark_mask(region, threshold, per_channel=False):
+    """明るさがthreshold未満の画素をTrueにした2次元のマスクを返す
+
+    per_channel=False ではグレースケール（convert("L")と同じ明るさ）、
+    per_channel=True ではいずれかのチャンネルがthreshold未満の画素を内容とみなす。
+    """
+    if per_channel:
+        pixels = np.asarray(region)
+        if pixels.ndim == 2:
+            return pixels < threshold
+        return (pixels < threshold).any(axis=2)
+    return np.asarray(region.convert("L")) < threshold
+
+def _content_lines(image, box, axis, mask_of):
+    """box内で内容のある列（axis=0）または行（axis=1）をTrueにした1次元配列を返す"""
+    left, top, right, bottom = box
+    width = right - left
+    rows_per_chunk = max(1, CHUNK_PIXELS // max(1, width))
+    found = np.zeros(width if axis == 0 else bottom - top, dtype=bool)
+    for y in range(top, bottom, rows_per_chunk):
+        y_end = min(bottom, y + rows_per_chunk)
+        mask = mask_of(image.crop((left, y, right, y_end)))
+        if axis == 0:
+            found |= mask.any(axis=0)
+        else:
+            found[y - top:y_end - top] = mask.any(axis=1)
+    return found
+
+def _first(lines):
+    indices = np.flatnonzero(lines)
+    return int(indices[0]) if indices.size else None
+
+def _last(lines):
+    indices = np.flatnonzero(lines)
+    return int(indices[-1]) if indices.size else None
+
+def find_bbox(image, mask_of):
+    """mask_of（画像の一部 -> 内容の2次元マスク）で内容と判定される範囲を返す（内容がなければNone）"""
+    width, height = image.size
+    factor = max(1, max(width, height) // PROXY_SIZE)
+
+    # 1. プロキシで内容のある範囲を求める（ブロック単位）
+    if factor > 1:
+        # NEARESTは各ブロックの画素を1つ取り出すだけで、全画素を読まない
+        proxy = image.resize((max(1, width // factor), max(1, height // factor)), Image.Resampling.NEAREST)
+        proxy_mask = mask_of(proxy)
+        columns, rows = proxy_mask.any(axis=0), proxy_mask.any(axis=1)
+        proxy_box = (_first(columns), _first(rows), _last(columns), _last(rows))
+    else:
+        proxy_box = (None, None, None, None)
+
+    if proxy_box[0] is None:
+        # プロキシで見つからない（小さい画像、または薄い内容だけの画像）場合は全体を調べる
+        left_band, right_band = width, 0
+        top_band, bottom_band = height, 0
+    else:
+        # プロキシの画素 i は元の画像の [i * scale, (i + 1) * scale) のどこかの画素なので、
+        # そのブロックを含む外側の帯だけをフル解像度で調べる
+        block_left, block_top, block_right, block_bottom = proxy_box
+        scale_x, scale_y = width / proxy.width, height / proxy.height
+        left_band = min(width, int((block_left + 1) * scale_x) + 1)
+        right_band = max(0, int(block_right * scale_x) - 1)
+        top_band = min(height, int((block_top + 1) * scale_y) + 1)
+        bottom_band = max(0, int(block_bottom * scale_y) - 1)
+
+    # 2. 左右の帯で左端・右端の列を確定する
+    left = _first(_content_lines(image, (0, 0, left_band, height), 0, mask_of))
+    if left is None:
+        return None  # 全体を調べても内容がない
+    right = right_band + _last(_content_lines(image, (right_band, 0, width, height), 0, mask_of))
+
+    # 3. 上下の帯で上端・下端の行を確定する（内容は左端〜右端の列の中にしかない）
+    top = _first(_content_lines(image, (left, 0, right + 1, top_band), 1, mask_of))
+    bottom = bottom_band + _last(_content_lines(image, (left, bottom_band, right + 1, height), 1, mask_of))
+    return (left, top, right + 1, bottom + 1)
+
+def content_bbox(image, bg_color=(255, 255, 255), tolerance=0):
+    """背景色以外の内容がある範囲 (left, top, right, bottom) を返す（内容がなければNone）
+
+    toleranceを指定すると、背景色との差が各チャンネルでtolerance以下の画素（スキャンのノイズなど）を背景とみなす。
+    """
+    return find_bbox(image, lambda region: content_mask(np.asarray(region), bg_color, tolerance))
+
+def dark_content_bbox(image, threshold=235, per_channel=False):
+    """明るさがthreshold未満の内容がある範囲を返す（内容がなければNone）"""
+    return find_bbox(image, lambda region: dark_mask(region, threshold, per_channel))
+
+def trim(image, bg_color=(255, 255, 255), tolerance=0):
+    """背景以外を自動トリミング"""
+    bbox = content_bbox(image, bg_color, tolerance)
+    if bbox:
+        return image.crop(bbox)
+    else:
+        return image  # 内容がなければトリミングしない
+
+def trim_white_borders(image, threshold=235, per_channel=False):
+    """空白の境界を自動的にトリミングする（しきい値以上の明るさを空白とみなす）"""
+    bbox = dark_content_bbox(image, threshold, per_channel)
+    if bbox:
+        # 余白を追加せずに直接トリミング
+        return image.crop(bbox)
+    else:
+        return image  # 内容がなければトリミングしない
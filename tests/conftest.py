@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""テスト共通の設定
+
+プロジェクトルートの共通モジュール（resize_common）を読み込めるようにし、
+ツールのスクリプトを一時ディレクトリで実行するフィクスチャを用意する。
+"""
+import os
+import sys
+import subprocess
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+@pytest.fixture
+def run_tool(tmp_path):
+    """ツールのスクリプト（プロジェクトルートからの相対パス）をtmp_pathで実行し、CompletedProcessを返す
+
+    エンコードキャッシュはtmp_pathの中に作り、ユーザーのキャッシュを使わない。
+    """
+    def run(script, *args):
+        env = dict(os.environ, RESIZE_TOOLS_CACHE_DIR=str(tmp_path / "cache"), RESIZE_TOOLS_NO_DAEMON="1")
+        return subprocess.run([sys.executable, os.path.join(PROJECT_ROOT, script), *args], cwd=tmp_path,
+                              env=env, capture_output=True, text=True, encoding="utf-8", timeout=600)
+    return run
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""常駐ワーカーのテスト用のジョブ（PIDをファイルに書き、指定した秒数待つ）
+
+使い方: daemon_job.py PIDファイル 秒数
+"""
+import os
+import sys
+import time
+
+with open(sys.argv[1], "w") as f:
+    f.write(str(os.getpid()))
+print("開始", flush=True)
+time.sleep(float(sys.argv[2]))
+print("終了", flush=True)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""一括実行（batch）のマニフェストの検証"""
+import json
+import os
+
+import pytest
+
+from resize_common.batch import INPUT_FOLDER, PROJECT_ROOT, TOOLS, build_jobs, read_manifest
+
+@pytest.fixture
+def clients(tmp_path):
+    """0_input_imagesがあるフォルダA・Bと、ないフォルダempty"""
+    for name in ("A", "B"):
+        (tmp_path / name / INPUT_FOLDER).mkdir(parents=True)
+    (tmp_path / "empty").mkdir()
+    return tmp_path
+
+def test_valid_rows_become_jobs(clients):
+    rows = [
+        {"tool": "Route", "input": "A", "id": "123", "route": "2", "size": "", "args": "--incremental --webp-profile lossy"},
+        {"tool": "multi_ratio", "input": f"B/{INPUT_FOLDER}", "size": " 960 "},
+    ]
+    jobs, errors = build_jobs(rows, str(clients))
+    assert errors == []
+    assert [job["number"] for job in jobs] == [1, 2]
+    assert jobs[0]["script"] == os.path.join(PROJECT_ROOT, TOOLS["Route"][0])
+    assert jobs[0]["dir"] == str(clients / "A")
+    assert jobs[0]["args"] == ["123", "2", "--incremental", "--webp-profile", "lossy"]
+    # 0_input_images自体を指定してもよく、省略可能な列は値があれば渡す
+    assert jobs[1]["dir"] == str(clients / "B")
+    assert jobs[1]["args"] == ["960"]
+
+@pytest.mark.parametrize("row, message", [
+    ({"tool": "Resize", "input": "A"}, "不明なツール"),
+    ({"tool": "", "input": "A"}, "不明なツール"),
+    ({"tool": "3:2"}, "input（入力フォルダ）を指定してください"),
+    ({"tool": "3:2", "input": "  "}, "input（入力フォルダ）を指定してください"),
+    ({"tool": "3:2", "input": "empty"}, "がありません"),
+    ({"tool": "3:2", "input": "missing"}, "がありません"),
+    ({"tool": "Route", "input": "A", "id": "123"}, "Route には route が必要です"),
+    ({"tool": "1:1", "input": "A", "size": ""}, "1:1 には size が必要です"),
+])
+def test_invalid_row_is_reported(clients, row, message):
+    jobs, errors = build_jobs([row], str(clients))
+    assert jobs is None
+    assert len(errors) == 1
+    assert errors[0].startswith("1件目: ") and message in errors[0]
+
+def test_all_errors_are_reported_together(clients):
+    rows = [
+        {"tool": "3:2", "input": "A"},
+        {"tool": "Facility", "input": "B"},
+        {"tool": "4:3", "input": f"A/{INPUT_FOLDER}"},
+        {"tool": "16:9", "input": "B"},
+    ]
+    jobs, errors = build_jobs(rows, str(clients))
+    # 有効な行があっても、エラーがあればジョブは実行しない
+    assert jobs is None
+    assert errors == [
+        "2件目: Facility には id が必要です",
+        f"3件目: {clients / 'A'} は 1件目と同じフォルダです",
+        f"4件目: {clients / 'B'} は 2件目と同じフォルダです",
+    ]
+
+def test_read_manifest_formats(tmp_path):
+    csv_path = tmp_path / "jobs.csv"
+    # Excelで保存したBOM付きのCSV
+    csv_path.write_text("tool,input,id\nFacility,A,123\n", encoding="utf-8-sig")
+    assert read_manifest(str(csv_path)) == [{"tool": "Facility", "input": "A", "id": "123"}]
+
+    json_path = tmp_path / "jobs.json"
+    json_path.write_text(json.dumps({"jobs": [{"tool": "1:1", "input": "A", "size": 960}]}), encoding="utf-8")
+    assert read_manifest(str(json_path)) == [{"tool": "1:1", "input": "A", "size": 960}]
+
+    json_path.write_text(json.dumps(["Facility"]), encoding="utf-8")
+    with pytest.raises(ValueError):
+        read_manifest(str(json_path))
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""常駐ワーカー（daemon）のソケットの置き場所、直接実行への切り替えと、ジョブの同時実行・停止"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from resize_common import daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "getuid"), reason="UNIXのみ")
+
+@pytest.fixture
+def other_user(tmp_path, monkeypatch):
+    """ソケット用のディレクトリがほかのユーザーのものである状態（getuidを別のユーザーにする）"""
+    uid = os.getuid() + 1000
+    monkeypatch.setattr(daemon.tempfile, "gettempdir", lambda: str(tmp_path))
+    monkeypatch.setattr(daemon.os, "getuid", lambda: uid)
+    (tmp_path / f"resize_tools_{uid}").mkdir(mode=0o777)
+    return uid
+
+def test_socket_directory_is_private(tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon.tempfile, "gettempdir", lambda: str(tmp_path))
+    directory = tmp_path / f"resize_tools_{os.getuid()}"
+    directory.mkdir(mode=0o755)
+    assert daemon.socket_directory() == str(directory)
+    assert directory.stat().st_mode & 0o777 == 0o700
+
+def test_socket_directory_of_other_user_is_not_used(other_user):
+    assert daemon.socket_directory() is None
+    assert daemon.socket_path() is None
+    assert daemon.connect() is None
+
+def test_symlinked_socket_directory_is_not_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon.tempfile, "gettempdir", lambda: str(tmp_path))
+    (tmp_path / "elsewhere").mkdir(mode=0o700)
+    (tmp_path / f"resize_tools_{os.getuid()}").symlink_to(tmp_path / "elsewhere")
+    assert daemon.socket_directory() is None
+
+def test_run_falls_back_to_direct_execution(other_user, monkeypatch):
+    monkeypatch.delenv("RESIZE_TOOLS_NO_DAEMON", raising=False)
+    calls = []
+
+    def run_direct(script, args):
+        calls.append((script, args))
+        raise SystemExit(0)
+
+    monkeypatch.setattr(daemon, "run_direct", run_direct)
+    with pytest.raises(SystemExit):
+        daemon.run("tool.py", ["123"])
+    assert calls == [("tool.py", ["123"])]
+
+def test_source_hash_follows_resize_common(tmp_path, monkeypatch):
+    (tmp_path / "resize_common").mkdir()
+    module = tmp_path / "resize_common" / "module.py"
+    module.write_text("A = 1\n")
+    monkeypatch.setattr(daemon, "PROJECT_ROOT", str(tmp_path))
+    before = daemon.source_hash()
+    assert daemon.source_hash() == before
+    module.write_text("A = 2\n")
+    assert daemon.source_hash() != before
+
+JOB_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daemon_job.py")
+
+@pytest.fixture
+def worker():
+    """一時的なソケットで常駐ワーカーを起動し、ソケットのパスを返す（UNIXソケットのパスは短くする）"""
+    directory = tempfile.mkdtemp(prefix="rt", dir="/tmp")
+    path = os.path.join(directory, "w.sock")
+    env = dict(os.environ)
+    env.pop("RESIZE_TOOLS_NO_DAEMON", None)
+    process = subprocess.Popen([sys.executable, "-c", f"from resize_common import daemon; daemon.serve({path!r})"],
+                               cwd=daemon.PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + daemon.START_TIMEOUT
+    while (client := daemon.connect(path)) is None:
+        assert process.poll() is None and time.monotonic() < deadline, "常駐ワーカーが起動しない"
+        time.sleep(0.05)
+    client.close()
+    yield path
+    process.terminate()
+    process.wait()
+    shutil.rmtree(directory, ignore_errors=True)
+
+def start_job(path, pid_file, seconds):
+    client = daemon.connect(path)
+    daemon.send_request(client, {"command": "run", "script": JOB_SCRIPT, "args": [str(pid_file), str(seconds)],
+                                 "cwd": os.getcwd(), "env": dict(os.environ)})
+    assert "開始".encode("utf-8") in client.recv(4096)
+    return client, int(pid_file.read_text())
+
+def receive_all(client):
+    data = b""
+    while chunk := client.recv(4096):
+        data += chunk
+    return data
+
+def test_probe_connection_does_not_stop_the_worker(worker):
+    """何も送らずに閉じた接続（起動済みかの確認など）の後も、常駐ワーカーは動き続ける"""
+    for _ in range(3):
+        daemon.connect(worker).close()
+    with daemon.connect(worker) as client:
+        daemon.send_request(client, {"command": "status"})
+        assert receive_all(client).endswith(daemon.EXIT_MARKER + b"0\n")
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+def test_jobs_run_concurrently(worker, tmp_path):
+    """実行中のジョブがあっても、次のジョブをすぐに受け付ける"""
+    slow, slow_pid = start_job(worker, tmp_path / "slow.pid", 30)
+    with slow:
+        started = time.monotonic()
+        quick, _ = start_job(worker, tmp_path / "quick.pid", 0)
+        with quick:
+            assert receive_all(quick).endswith(daemon.EXIT_MARKER + b"0\n")
+        assert time.monotonic() - started < 10
+        assert alive(slow_pid)
+
+def test_disconnect_stops_the_job(worker, tmp_path):
+    """クライアントが切断したら（Ctrl+Cなど）、ジョブを停止する"""
+    client, pid = start_job(worker, tmp_path / "job.pid", 30)
+    client.close()
+    deadline = time.monotonic() + daemon.KILL_TIMEOUT + 5
+    while alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not alive(pid)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""エンコードキャッシュ（encode_cache）と、入力のハッシュの共有"""
+import collections
+import os
+
+import pytest
+from PIL import Image
+
+from resize_common import dedup as dedup_module
+from resize_common import encode_cache, manifest
+from resize_common.dedup import new_dedup
+from resize_common.encode_cache import new_encode_cache, restore_job
+from resize_common.manifest import job_digest, new_manifest, record_entry
+from resize_common.pipeline import check_duplicate
+
+@pytest.fixture
+def digest_calls(monkeypatch):
+    """file_digest を呼んだ回数をパスごとに数える"""
+    calls = collections.Counter()
+    original = manifest.file_digest
+
+    def counting(path, *args, **kwargs):
+        calls[str(path)] += 1
+        return original(path, *args, **kwargs)
+
+    for module in (manifest, encode_cache, dedup_module):
+        monkeypatch.setattr(module, "file_digest", counting)
+    return calls
+
+def test_digest_shared_by_dedup_cache_and_manifest(tmp_path, digest_calls):
+    # 同じサイズで内容が違う2つの入力（重複の判定でハッシュを計算する）
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    first.write_bytes(b"a" * 100)
+    second.write_bytes(b"b" * 100)
+    dedup, cache, record = new_dedup("exact"), new_encode_cache(directory=str(tmp_path / "cache")), new_manifest({})
+    originals = {}
+
+    for path in (first, second):
+        job = {"relative_path": path.name, "source": str(path), "timings": {}}
+        assert check_duplicate(dedup, job, originals) is None
+        assert not restore_job(cache, job, {"tool": "test"}, str(tmp_path / (path.stem + ".webp")))
+        record_entry(record, path.name, str(path), [], digest=job_digest(job))
+
+    assert digest_calls == {str(first): 1, str(second): 1}
+    assert record["entries"]["b.png"]["sha256"] == manifest.file_digest(str(second))
+
+def test_cache_entries_are_copies(tmp_path):
+    source = tmp_path / "input.png"
+    source.write_bytes(b"input")
+    first, second = tmp_path / "first.webp", tmp_path / "second.webp"
+    first.write_bytes(b"encoded")
+    cache = new_encode_cache(directory=str(tmp_path / "cache"))
+    job = {"source": str(source)}
+    assert not restore_job(cache, job, {"tool": "test"}, str(first))
+    encode_cache.store_output(cache, job["cache_key"], str(first), {"size": [1, 1]})
+
+    hit = {"source": str(source)}
+    assert restore_job(cache, hit, {"tool": "test"}, str(second))
+    assert second.read_bytes() == b"encoded"
+    cached_path, _ = encode_cache.entry_paths(cache, job["cache_key"])
+    # ハードリンクではない
+    assert first.stat().st_nlink == second.stat().st_nlink == os.stat(cached_path).st_nlink == 1
+
+    # 出力を書き換えても、キャッシュの内容は変わらない
+    second.write_bytes(b"edited")
+    first.write_bytes(b"edited")
+    with open(cached_path, "rb") as f:
+        assert f.read() == b"encoded"
+
+def test_default_cache_dir_is_per_user(monkeypatch, tmp_path):
+    monkeypatch.delenv(encode_cache.CACHE_DIR_ENV, raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(encode_cache.sys, "platform", "linux")
+    assert encode_cache.default_cache_dir() == str(tmp_path / "resize_tools" / "encode_cache")
+    monkeypatch.setenv(encode_cache.CACHE_DIR_ENV, str(tmp_path / "custom"))
+    assert encode_cache.default_cache_dir() == str(tmp_path / "custom")
+
+def encode_once(cache, source, params, output):
+    """キャッシュを引き、ミスなら「エンコード」して保存する（ツールの読み込み・書き出しの工程と同じ順序）"""
+    job = {"source": str(source)}
+    if not restore_job(cache, job, params, str(output)):
+        output.write_bytes(b"encoded " + source.read_bytes())
+        encode_cache.store_output(cache, job["cache_key"], str(output), {"size": [9, 6]})
+    encode_cache.count_lookup(cache, job)
+    return job
+
+def test_hit_and_miss(tmp_path):
+    source = tmp_path / "input.png"
+    source.write_bytes(b"input")
+    cache = new_encode_cache(directory=str(tmp_path / "cache"))
+    params = {"tool": "3:2", "webp": {"quality": 100}}
+
+    assert not encode_once(cache, source, params, tmp_path / "1.webp").get("cache_hit")
+    hit = encode_once(cache, source, params, tmp_path / "2.webp")
+    assert hit["cache_hit"] and hit["size"] == [9, 6]
+    assert (tmp_path / "2.webp").read_bytes() == b"encoded input"
+
+    # 処理パラメータが違えばミス
+    assert not encode_once(cache, source, dict(params, webp={"quality": 80}), tmp_path / "3.webp").get("cache_hit")
+    # 同じ内容なら別の場所・名前の入力でもヒット
+    copy = tmp_path / "other" / "copy.png"
+    copy.parent.mkdir()
+    copy.write_bytes(b"input")
+    assert encode_once(cache, copy, params, tmp_path / "4.webp").get("cache_hit")
+    # 入力の内容が変わればミス
+    source.write_bytes(b"edited")
+    assert not encode_once(cache, source, params, tmp_path / "5.webp").get("cache_hit")
+    assert (tmp_path / "5.webp").read_bytes() == b"encoded edited"
+
+    assert (cache["hits"], cache["misses"]) == (2, 3)
+
+def test_incomplete_entry_is_a_miss(tmp_path):
+    source = tmp_path / "input.png"
+    source.write_bytes(b"input")
+    cache = new_encode_cache(directory=str(tmp_path / "cache"))
+    job = encode_once(cache, source, {"tool": "test"}, tmp_path / "1.webp")
+    webp_path, _ = encode_cache.entry_paths(cache, job["cache_key"])
+    os.unlink(webp_path)
+    assert not encode_once(cache, source, {"tool": "test"}, tmp_path / "2.webp").get("cache_hit")
+
+def test_disabled_cache_never_hits(tmp_path):
+    source = tmp_path / "input.png"
+    source.write_bytes(b"input")
+    assert new_encode_cache(False) is None
+    for name in ("1.webp", "2.webp"):
+        job = encode_once(None, source, {"tool": "test"}, tmp_path / name)
+        assert job["cache_key"] is None and not job.get("cache_hit")
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = new_encode_cache(directory=str(tmp_path / "cache"))
+    keys = []
+    for number in range(3):
+        source = tmp_path / f"{number}.png"
+        source.write_bytes(bytes([number]) * 10)
+        job = encode_once(cache, source, {"tool": "test"}, tmp_path / f"{number}.webp")
+        webp_path, _ = encode_cache.entry_paths(cache, job["cache_key"])
+        os.utime(webp_path, (1000 + number, 1000 + number))
+        keys.append(job["cache_key"])
+    # 最も古い0番を使い直すと、次に古い1番が削除される
+    assert encode_once(cache, tmp_path / "0.png", {"tool": "test"}, tmp_path / "again.webp")["cache_hit"]
+    cache["limit"] = 2 * os.path.getsize(encode_cache.entry_paths(cache, keys[2])[0])
+    encode_cache.evict_cache(cache)
+    remaining = [os.path.exists(encode_cache.entry_paths(cache, key)[0]) for key in keys]
+    assert remaining == [True, False, True]
+    assert cache["evicted"] == 1
+
+def test_cache_is_opt_in(run_tool, tmp_path):
+    """--cache を指定しない実行では、入力のハッシュもキャッシュへの保存も行わない"""
+    (tmp_path / "0_input_images").mkdir()
+    Image.new("RGB", (1200, 800), (30, 60, 90)).save(tmp_path / "0_input_images" / "photo.png")
+    script = "9_900x600(3:2)_resize/3:2_resize_images.py"
+
+    default = run_tool(script)
+    assert default.returncode == 0, default.stdout + default.stderr
+    assert "エンコードキャッシュ" not in default.stdout
+    assert not (tmp_path / "cache").exists()
+
+    for expected in ("ヒット: 0 枚 / ミス: 1 枚", "ヒット: 1 枚 / ミス: 0 枚"):
+        cached = run_tool(script, "--cache")
+        assert cached.returncode == 0, cached.stdout + cached.stderr
+        assert expected in cached.stdout
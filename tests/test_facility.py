@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""Facility（1_Facility_resize_rename_images）の実行記録"""
+import json
+
+import pytest
+from PIL import Image
+
+FACILITY_SCRIPT = "1_Facility_resize_rename_images/Facility_resize_rename_images.py"
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_dedup_is_timed_per_image(run_tool, tmp_path, jobs):
+    """重複の判定時間はパイプラインのツールと同じく、1枚ごとの工程として記録する"""
+    input_dir = tmp_path / "0_input_images"
+    input_dir.mkdir()
+    Image.new("RGB", (1200, 800), (200, 120, 40)).save(input_dir / "a.png")
+    Image.new("RGB", (1200, 800), (20, 120, 240)).save(input_dir / "b.png")
+    (input_dir / "c.png").write_bytes((input_dir / "a.png").read_bytes())
+
+    result = run_tool(FACILITY_SCRIPT, "123", "--jobs", jobs, "--no-cache")
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    report = json.loads((tmp_path / "run_report.json").read_text(encoding="utf-8"))
+    assert len(report["per_image"]) == 3
+    assert all("dedup" in image["stages"] for image in report["per_image"])
+    assert report["stages"]["dedup"]["count"] == 3
+    assert sorted(image["input"] for image in report["per_image"] if image.get("duplicate_of")) == ["c.png"]
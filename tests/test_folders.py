@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""作業フォルダのクリア（folders）"""
+import os
+
+import pytest
+
+from resize_common.folders import clear_folder, leftover_trash, trash_prefix, wait_for_deletes
+
+def fill(folder):
+    (folder / "sub").mkdir(parents=True)
+    (folder / "a.webp").write_bytes(b"a")
+    (folder / "sub" / "b.webp").write_bytes(b"b")
+
+def test_clear_folder_leaves_an_empty_folder(tmp_path):
+    folder = tmp_path / "2_output_images"
+    fill(folder)
+    clear_folder(str(folder))
+    # フォルダはすぐに空になり、削除用のフォルダもバックグラウンドで削除される
+    assert os.listdir(folder) == []
+    wait_for_deletes()
+    assert os.listdir(tmp_path) == ["2_output_images"]
+
+def test_clear_folder_removes_leftover_trash(tmp_path):
+    folder = tmp_path / "2_output_images"
+    folder.mkdir()
+    # 前回の実行が中断して残った削除用のフォルダ
+    leftover = tmp_path / (trash_prefix(str(folder)) + "1-0")
+    fill(leftover)
+    other = tmp_path / ".1_temp_images.trash-1-0"
+    other.mkdir()
+    assert leftover_trash(str(folder)) == [str(leftover)]
+
+    clear_folder(str(folder))
+    wait_for_deletes()
+    assert sorted(os.listdir(tmp_path)) == sorted([other.name, "2_output_images"])
+
+def test_missing_folder_is_not_created(tmp_path):
+    clear_folder(str(tmp_path / "2_output_images"))
+    wait_for_deletes()
+    assert os.listdir(tmp_path) == []
+
+def test_relative_path_after_chdir(tmp_path, monkeypatch):
+    folder = tmp_path / "2_output_images"
+    fill(folder)
+    (tmp_path / "other").mkdir()
+    monkeypatch.chdir(tmp_path)
+    clear_folder("2_output_images")
+    monkeypatch.chdir(tmp_path / "other")  # 削除中にカレントディレクトリが変わっても影響しない
+    wait_for_deletes()
+    assert os.listdir(folder) == []
+    assert sorted(os.listdir(tmp_path)) == ["2_output_images", "other"]
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="シンボリックリンクを作れない環境")
+def test_symlinked_folder_is_emptied_in_place(tmp_path):
+    target = tmp_path / "elsewhere"
+    fill(target)
+    link = tmp_path / "2_output_images"
+    os.symlink(target, link, target_is_directory=True)
+    clear_folder(str(link))
+    wait_for_deletes()
+    # リンク自体は残し、リンク先の中身だけを削除する
+    assert os.path.islink(link)
+    assert os.listdir(target) == []
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""幅を揃えて高さを許容範囲に収めるリサイズの計算（geometry）"""
+import pytest
+from PIL import Image
+
+from resize_common.geometry import plan_band_resize, resize_to_band
+
+TARGET = (900, 600)
+BAND = (550, 650)
+
+@pytest.mark.parametrize("size, output_size", [
+    ((1800, 1200), (900, 600)),
+    ((1800, 1300), (900, 650)),  # 上限ちょうど
+    ((1800, 1100), (900, 550)),  # 下限ちょうど
+    ((450, 290), (900, 580)),    # 拡大
+])
+def test_within_band_keeps_whole_image(size, output_size):
+    assert plan_band_resize(size, TARGET, BAND) == (output_size, (0, 0) + size)
+
+def test_wide_image_is_cropped_left_and_right():
+    output_size, box = plan_band_resize((4000, 1000), TARGET, BAND)
+    assert output_size == TARGET
+    # 高さ全体を使い、3:2の幅（1500）を中央から切り抜く
+    assert box == (1250, 0, 2750, 1000)
+
+def test_tall_image_is_cropped_top_and_bottom():
+    output_size, box = plan_band_resize((1000, 3000), TARGET, BAND)
+    assert output_size == TARGET
+    assert box[0] == 0 and box[2] == 1000
+    assert box[3] - box[1] == pytest.approx(1000 * 600 / 900)
+    assert box[1] == pytest.approx(3000 - box[3])
+
+def test_band_edges_switch_to_crop():
+    # 幅900で高さ651・549になる画像は許容範囲外なので、目標サイズに切り抜く
+    assert plan_band_resize((900, 651), TARGET, BAND)[0] == TARGET
+    assert plan_band_resize((900, 549), TARGET, BAND)[0] == TARGET
+
+def test_resize_to_band_keeps_only_the_center():
+    # 左右の1250pxは切り抜かれる範囲（フィルターが参照する境界の近くは除く）なので、出力に赤・青が混ざらない
+    img = Image.new("RGB", (4000, 1000), (0, 255, 0))
+    img.paste((255, 0, 0), (0, 0, 1240, 1000))
+    img.paste((0, 0, 255), (2760, 0, 4000, 1000))
+    resized = resize_to_band(img, TARGET, BAND, Image.Resampling.LANCZOS)
+    assert resized.size == TARGET
+    assert resized.getextrema()[0][1] == 0 and resized.getextrema()[2][1] == 0
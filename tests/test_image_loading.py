@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""縮小読み込みとメモリ予算の見積もり（image_loading・memory_budget）"""
+import pytest
+from PIL import Image, JpegImagePlugin
+
+from resize_common.image_loading import open_header, open_image
+from resize_common.memory_budget import pixel_bytes, plan_memory
+
+# Pillowの展開爆弾の上限（約1億7900万画素）を超えるパノラマ
+PANORAMA_SIZE = (30000, 8000)
+
+@pytest.fixture(scope="module")
+def panorama(tmp_path_factory):
+    """展開爆弾の上限を超える大きさのJPEG（メモリを抑えるためグレースケール）"""
+    path = tmp_path_factory.mktemp("panorama") / "panorama.jpg"
+    img = Image.new("L", PANORAMA_SIZE, 200)
+    img.paste(40, (5000, 2000, 25000, 6000))
+    img.save(path, quality=80)
+    return path
+
+def test_panorama_exceeds_pillow_limit(panorama):
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(panorama)
+
+def test_open_header_keeps_the_global_limit(panorama, monkeypatch):
+    """ほかのスレッドの Image.open のチェックが外れないよう、開いている間も上限を書き換えない"""
+    limit = Image.MAX_IMAGE_PIXELS
+    limits = []
+
+    class Recording(JpegImagePlugin.JpegImageFile):
+        def __init__(self, *args, **kwargs):
+            limits.append(Image.MAX_IMAGE_PIXELS)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(JpegImagePlugin, "JpegImageFile", Recording)
+    with open_header(panorama) as img:
+        assert img.size == PANORAMA_SIZE
+    assert limits and all(value == limit for value in limits)
+    assert Image.MAX_IMAGE_PIXELS == limit
+
+def test_open_header_rejects_oversized_png(tmp_path, monkeypatch):
+    """draftのない形式はそのまま上限を超えるため、開く時点でエラーにする"""
+    path = tmp_path / "large.png"
+    Image.new("L", (400, 300)).save(path)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(Image.DecompressionBombError):
+        open_header(path)
+
+def test_open_image_shrinks_oversized_jpeg(panorama):
+    img = open_image(panorama, (900, 650), shrink_on_load=False)
+    assert img.mode == "RGB"
+    assert img.width >= 900 * 2 and img.height >= 650 * 2
+    assert img.width * img.height < Image.MAX_IMAGE_PIXELS
+
+def test_plan_memory_probes_oversized_jpeg(panorama):
+    probe = plan_memory(panorama, (900, 650), (900, 650), shrink_on_load=False)
+    assert probe["size"] == PANORAMA_SIZE
+    assert probe["oversized"] and probe["shrink"]
+    assert probe["decode_size"][0] < PANORAMA_SIZE[0]
+    assert 0 < probe["bytes"] < PANORAMA_SIZE[0] * PANORAMA_SIZE[1]
+
+def test_check_still_applies_after_draft(tmp_path):
+    """縮小読み込みできないPNGは、デコードする大きさで展開爆弾の上限を判定する"""
+    path = tmp_path / "large.png"
+    Image.new("L", (400, 300)).save(path)
+    limit = Image.MAX_IMAGE_PIXELS
+    try:
+        Image.MAX_IMAGE_PIXELS = 1000
+        with pytest.raises(Image.DecompressionBombError):
+            open_image(path, (100, 100))
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+    assert Image.MAX_IMAGE_PIXELS == limit
+
+def test_facility_processes_oversized_jpeg(panorama, run_tool, tmp_path):
+    input_dir = tmp_path / "0_input_images"
+    input_dir.mkdir()
+    (input_dir / "panorama.jpg").write_bytes(panorama.read_bytes())
+    result = run_tool("1_Facility_resize_rename_images/Facility_resize_rename_images.py", "123", "--jobs", "1")
+    assert result.returncode == 0, result.stdout + result.stderr
+    outputs = list((tmp_path / "2_output_images").glob("*.webp"))
+    assert len(outputs) == 1
+    with Image.open(outputs[0]) as img:
+        assert img.width == 900
+
+@pytest.mark.parametrize("mode, expected", [("L", 1), ("P", 1), ("1", 1), ("LA", 4), ("RGB", 4), ("I;16", 2)])
+def test_pixel_bytes(mode, expected):
+    assert pixel_bytes(mode) == expected
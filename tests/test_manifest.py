@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""差分処理のマニフェスト（manifest）で、前回から変わっていない入力を判定すること"""
+import os
+
+import pytest
+
+from resize_common.manifest import new_manifest, record_entry, unchanged_entry
+
+@pytest.fixture
+def recorded(tmp_path):
+    """1つの入力を処理済みとして記録し、(入力, 出力, 前回の記録) を返す"""
+    source, output = tmp_path / "a.png", tmp_path / "a.webp"
+    source.write_bytes(b"original")
+    output.write_bytes(b"webp")
+    manifest = new_manifest({})
+    record_entry(manifest, "a.png", str(source), [str(output)])
+    return source, output, manifest["entries"]
+
+def test_unchanged_input_returns_previous_entry(recorded):
+    source, output, entries = recorded
+    assert unchanged_entry(entries, "a.png", str(source), [str(output)]) is entries["a.png"]
+
+def test_new_input_is_processed(recorded):
+    source, output, entries = recorded
+    assert unchanged_entry(entries, "b.png", str(source), [str(output)]) is None
+
+def test_changed_outputs_are_reprocessed(recorded, tmp_path):
+    source, output, entries = recorded
+    # 出力名が変わった場合（リネームの規則やIDの変更）
+    assert unchanged_entry(entries, "a.png", str(source), [str(tmp_path / "b.webp")]) is None
+    # 出力が削除された場合
+    output.unlink()
+    assert unchanged_entry(entries, "a.png", str(source), [str(output)]) is None
+
+def test_touched_input_with_same_content_is_skipped(recorded):
+    source, output, entries = recorded
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    previous = unchanged_entry(entries, "a.png", str(source), [str(output)])
+    assert previous is not None
+    # 次回はハッシュを計算しないよう、新しい更新日時を記録する
+    assert previous["mtime_ns"] == os.stat(source).st_mtime_ns
+    assert previous["sha256"] == entries["a.png"]["sha256"]
+
+def test_edited_input_is_reprocessed(recorded):
+    source, output, entries = recorded
+    stat = os.stat(source)
+    # 同じサイズで内容だけ変わった場合は、ハッシュの比較で見つける
+    source.write_bytes(b"modified")
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    assert unchanged_entry(entries, "a.png", str(source), [str(output)]) is None
+    # サイズが変わった場合
+    source.write_bytes(b"longer content")
+    assert unchanged_entry(entries, "a.png", str(source), [str(output)]) is None
+
+def test_record_entry_keeps_previous_entry(recorded):
+    source, output, entries = recorded
+    manifest = new_manifest({})
+    record_entry(manifest, "a.png", str(source), [str(output)], previous=entries["a.png"])
+    assert manifest["entries"]["a.png"] is entries["a.png"]
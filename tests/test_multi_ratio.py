@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""multi_ratio（13_multi_ratio_resize）の出力が単独の比率ツールと一致すること"""
+import importlib.util
+import os
+import shutil
+
+import pytest
+from PIL import Image, ImageDraw
+
+from conftest import PROJECT_ROOT
+from resize_common.aspect import crop_to_ratio
+from resize_common.image_loading import open_image
+
+MULTI_SCRIPT = "13_multi_ratio_resize/multi_ratio_resize_images.py"
+RATIO_SCRIPT = "9_900x600(3:2)_resize/3:2_resize_images.py"
+SQUARE_SCRIPT = "12_(1:1)_resize/1:1_resize_images.py"
+
+def write_photo(path):
+    """模様のある4000x2000のJPEG（3:2と300pxの1:1では縮小読み込みのDCTスケールが異なる）"""
+    img = Image.new("RGB", (4000, 2000), (40, 90, 160))
+    draw = ImageDraw.Draw(img)
+    for x in range(0, 4000, 23):
+        draw.line((x, 0, 4000 - x, 2000), fill=(x % 255, 200, 255 - x % 255), width=3)
+    img.save(path, quality=90)
+
+def read_pixels(path):
+    with Image.open(path) as img:
+        return img.size, img.convert("RGB").tobytes()
+
+def test_profiles_match_single_ratio_tools(run_tool, tmp_path):
+    """プロファイルごとの縮小読み込みが各ツールと同じになり、出力が画素単位で一致する"""
+    (tmp_path / "0_input_images").mkdir()
+    write_photo(tmp_path / "0_input_images" / "photo.jpg")
+    output = tmp_path / "2_output_images"
+
+    multi = run_tool(MULTI_SCRIPT, "300", "--profiles", "3:2,1:1", "--no-cache")
+    assert multi.returncode == 0, multi.stdout + multi.stderr
+    multi_ratio = read_pixels(output / "900x600_3-2" / "photo.webp")
+    multi_square = read_pixels(output / "300x300_1-1" / "photo.webp")
+    shutil.rmtree(output)
+
+    ratio = run_tool(RATIO_SCRIPT, "--no-cache")
+    assert ratio.returncode == 0, ratio.stdout + ratio.stderr
+    assert read_pixels(output / "photo.webp") == multi_ratio
+
+    square = run_tool(SQUARE_SCRIPT, "300", "--no-cache")
+    assert square.returncode == 0, square.stdout + square.stderr
+    assert read_pixels(output / "photo.webp") == multi_square
+
+@pytest.fixture
+def multi_ratio():
+    """multi_ratioのスクリプトをモジュールとして読み込む（mainは呼ぶまで実行しない）"""
+    spec = importlib.util.spec_from_file_location("multi_ratio_tool", os.path.join(PROJECT_ROOT, MULTI_SCRIPT))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_png_is_decoded_once_for_every_profile(multi_ratio, tmp_path, monkeypatch):
+    """draftのない形式は、Image.reduceの縮小率がプロファイルごとに違っても1回だけデコードする"""
+    (tmp_path / "0_input_images").mkdir()
+    path = tmp_path / "0_input_images" / "plan.png"
+    # 3:2は3分の1、4:3は2分の1に縮小してからリサイズする大きさ
+    img = Image.linear_gradient("L").resize((5400, 3600)).convert("RGB")
+    ImageDraw.Draw(img).line((0, 0, 5400, 3600), fill=(255, 0, 0), width=9)
+    img.save(path, compress_level=1)
+
+    calls = []
+    original = multi_ratio.open_decoded
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(multi_ratio, "open_decoded", counting)
+    monkeypatch.chdir(tmp_path)
+    multi_ratio.main(["--profiles", "3:2,4:3", "--no-cache", "--threads", "1"])
+    assert len(calls) == 1
+
+    # 各ツールと同じ縮小読み込み・切り取りの結果と一致する
+    for folder, size in (("900x600_3-2", (900, 600)), ("960x720_4-3", (960, 720))):
+        expected = crop_to_ratio(open_image(str(path), size), *size)
+        assert read_pixels(tmp_path / "2_output_images" / folder / "plan.webp") == (size, expected.tobytes())
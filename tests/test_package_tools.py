@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""打包器（Package_Tools）的部署包同步"""
+import os
+
+import Package_Tools as package_tools
+
+def write(path, data=b"binary"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+def deployed(tmp_path, mode):
+    root = tmp_path / package_tools.DEPLOY_DIR / mode
+    return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, files in os.walk(root) for f in files)
+
+def test_build_modes_do_not_remove_each_other(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    write(tmp_path / "dist" / "Facility_Resizer")
+    write(tmp_path / "dist" / "Route_Resizer")
+    write(tmp_path / "dist_onedir" / "Facility_Resizer" / "Facility_Resizer")
+    write(tmp_path / "dist_onedir" / "Facility_Resizer" / "_internal" / "base_library.zip")
+    # 以前的版本直接放在部署包顶层的可执行文件
+    write(tmp_path / package_tools.DEPLOY_DIR / "Route_Resizer")
+
+    package_tools.create_deployment_package("onefile")
+    package_tools.create_deployment_package("onedir")
+    assert deployed(tmp_path, "onefile") == ["Facility_Resizer", "Route_Resizer"]
+    assert deployed(tmp_path, "onedir") == [os.path.join("Facility_Resizer", "Facility_Resizer"),
+                                            os.path.join("Facility_Resizer", "_internal", "base_library.zip")]
+    assert not (tmp_path / package_tools.DEPLOY_DIR / "Route_Resizer").exists()
+
+    # 同一模式中不再构建的可执行文件作为旧文件删除，其他模式的文件保留
+    (tmp_path / "dist" / "Route_Resizer").unlink()
+    stats = package_tools.create_deployment_package("onefile")
+    assert stats["removed_files"] == 1
+    assert deployed(tmp_path, "onefile") == ["Facility_Resizer"]
+    assert len(deployed(tmp_path, "onedir")) == 2
+    assert (tmp_path / package_tools.DEPLOY_DIR / "README.md").exists()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""パイプライン（pipeline）のワーカープロセスでの実行"""
+import os
+
+import pytest
+
+from resize_common.dedup import new_dedup
+from resize_common.memory_budget import new_memory_budget
+from resize_common.pipeline import run_pipeline
+
+def read(job):
+    if job["source"].endswith("bad.txt"):
+        raise ValueError("読めません")
+    job["pid"] = os.getpid()
+    job["timings"]["decode"] = 0.0
+
+def transform(job):
+    job["value"] = job["source"].upper()
+
+def write(job):
+    job["written"] = True
+
+@pytest.fixture
+def sources(tmp_path):
+    """a・bと同じ内容のc、読み込みでエラーになるbad"""
+    paths = []
+    for name, content in (("a.txt", b"a"), ("b.txt", b"b"), ("bad.txt", b"x"), ("c.txt", b"a")):
+        (tmp_path / name).write_bytes(content)
+        paths.append(str(tmp_path / name))
+    return paths
+
+def test_processes_finish_in_input_order(sources):
+    jobs = [{"source": path, "relative_path": os.path.basename(path), "timings": {}, "memory": 1}
+            for path in sources]
+    finished = []
+
+    def finish(job, error):
+        finished.append((job["relative_path"], error))
+
+    def link(job, original):
+        job["value"] = original["value"]
+
+    budget = new_memory_budget(2)
+    run_pipeline(iter(jobs), read, transform, write, finish, 2, budget=budget, dedup=new_dedup("exact"), link=link,
+                 processes=True)
+    assert [name for name, _ in finished] == ["a.txt", "b.txt", "bad.txt", "c.txt"]
+    a, b, bad, c = jobs
+    # ワーカーで更新したjobがメインプロセスのjobに反映される
+    assert a["pid"] != os.getpid() and a["written"] and a["value"] == sources[0].upper()
+    assert "decode" in a["timings"] and "dedup" in a["timings"]
+    assert isinstance(finished[2][1], ValueError)
+    # 重複はワーカーに渡さず、元の画像の結果を共有する
+    assert c["duplicate_of"] == "a.txt" and c["value"] == a["value"] and "pid" not in c
+    assert budget["in_flight"] == 0 and budget["running"] == 0
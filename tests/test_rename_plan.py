@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""リネーム計画（rename_plan）と、Facilityの自動番号"""
+import importlib.util
+import os
+
+import pytest
+
+from conftest import PROJECT_ROOT
+from resize_common.rename_plan import add_to_plan, build_plan, find_collisions, skip_in_plan, stream_plan
+
+FACILITY_SCRIPT = "1_Facility_resize_rename_images/Facility_resize_rename_images.py"
+
+@pytest.fixture(scope="module")
+def facility():
+    """Facilityのスクリプトをモジュールとして読み込む（実行はしない）"""
+    spec = importlib.util.spec_from_file_location("facility_tool", os.path.join(PROJECT_ROOT, FACILITY_SCRIPT))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def scanned(*relative_paths):
+    """iter_image_filesと同じ (パス, ファイル名, 相対パス) の並び"""
+    return [(os.path.join("in", path), os.path.basename(path), path) for path in relative_paths]
+
+def plan_by_extension(plan, file_path, filename, relative_path):
+    if filename.endswith(".txt"):
+        skip_in_plan(plan, file_path, relative_path, "画像ではない")
+    else:
+        add_to_plan(plan, file_path, relative_path, os.path.splitext(filename)[0] + ".webp")
+
+def test_stream_plan_yields_planned_files_in_scan_order():
+    plan = {}
+    items = list(stream_plan(plan, scanned("b.png", "memo.txt", "a/c.jpg"), plan_by_extension))
+    assert [relative_path for relative_path, _ in items] == ["b.png", "a/c.jpg"]
+    assert items[1][1]["target"] == os.path.join("a", "c.webp")
+    # スキップしたファイルも計画には残る（--plan-onlyで表示する）
+    assert list(plan) == ["b.png", "memo.txt", "a/c.jpg"]
+    assert plan["memo.txt"]["skip_reason"] == "画像ではない"
+
+def test_same_name_in_different_folders_is_not_a_collision():
+    plan = build_plan(scanned("2134/a.png", "2135/a.png", "2135/a.jpg"), plan_by_extension)
+    assert find_collisions(plan) == {os.path.join("2135", "a.webp"): ["2135/a.png", "2135/a.jpg"]}
+
+def test_facility_auto_numbers_follow_scan_order(facility, capsys):
+    plan = build_plan(scanned("photo.png", "room_12.jpg", "Facility_top.png", "lobby.png", "x/v2_7.png"),
+                      facility.rename_planner("123"))
+    targets = {relative_path: entry["filename"] for relative_path, entry in plan.items()}
+    assert targets == {
+        "photo.png": "Facility_123_image_1.webp",
+        "room_12.jpg": "Facility_123_image_12.webp",
+        # Facility_で始まるファイルは名前を変えないが、自動番号は消費する
+        "Facility_top.png": "Facility_top.webp",
+        "lobby.png": "Facility_123_image_3.webp",
+        # 番号はファイル名の最後の数字
+        "x/v2_7.png": "Facility_123_image_7.webp",
+    }
+    assert plan["Facility_top.png"]["keep_original"]
+    assert "番号を抽出できませんでした" in capsys.readouterr().out
+
+def test_facility_planner_numbers_each_run_from_one(facility):
+    first = build_plan(scanned("a.png"), facility.rename_planner("1"))
+    second = build_plan(scanned("b.png"), facility.rename_planner("1"))
+    assert first["a.png"]["filename"] == second["b.png"]["filename"] == "Facility_1_image_1.webp"
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Route（7_Route_resize_rename_images）の帯単位の処理と差分処理"""
+from PIL import Image, ImageDraw
+
+ROUTE_SCRIPT = "7_Route_resize_rename_images/Route_resize_rename_images.py"
+
+def write_route(path):
+    """白い余白のある約1.9百万画素のルート図"""
+    img = Image.new("RGB", (1800, 1050), "white")
+    draw = ImageDraw.Draw(img)
+    for x in range(200, 1600, 7):
+        draw.line((x, 150, x + 40, 900), fill=(200, 30, 30), width=1)
+    img.save(path)
+
+def test_strip_megapixels_invalidates_incremental_run(run_tool, tmp_path):
+    """帯単位と全体のデコードで出力が変わる場合があるため、--strip-megapixels の変更で処理し直す"""
+    (tmp_path / "0_input_images").mkdir()
+    write_route(tmp_path / "0_input_images" / "route_01.png")
+    first = run_tool(ROUTE_SCRIPT, "123", "1", "--no-shrink-on-load", "--strip-megapixels", "1", "--no-cache")
+    assert first.returncode == 0, first.stdout + first.stderr
+    assert "帯単位で処理" in first.stdout
+
+    second = run_tool(ROUTE_SCRIPT, "123", "1", "--no-shrink-on-load", "--incremental", "--no-cache")
+    assert second.returncode == 0, second.stdout + second.stderr
+    assert "処理パラメータが前回と異なる" in second.stdout
+    assert "帯単位で処理" not in second.stdout
+    assert (tmp_path / "2_output_images" / "Route_123_1_01.webp").exists()
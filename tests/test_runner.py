@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""スクリプトの実行（runner）の後に、インタープリターの状態が元に戻ること"""
+import os
+import sys
+
+from conftest import PROJECT_ROOT
+from resize_common.runner import run_script
+
+def test_sys_path_is_restored(tmp_path, capsys):
+    # ツールはプロジェクトルートをsys.pathの先頭に追加してから引数を解析する
+    script = os.path.join(PROJECT_ROOT, "9_900x600(3:2)_resize", "3:2_resize_images.py")
+    saved_argv, saved_path = sys.argv, list(sys.path)
+    for _ in range(3):
+        assert run_script(script, ["--help"], str(tmp_path)) == 0
+    assert "--webp-profile" in capsys.readouterr().out
+    # 常駐ワーカー・一括実行でジョブごとにsys.pathが伸びない
+    assert sys.path == saved_path
+    assert sys.argv is saved_argv
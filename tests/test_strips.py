@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""巨大なPNGの帯単位の処理（strips）が画像全体のデコードと同じ結果になること"""
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from resize_common.strips import PNG_SIGNATURE, png_chunk, probe_strips, reduce_strips, strip_content_bbox
+from resize_common.trim import content_bbox
+
+def write_png(path, mode, size=(701, 523), seed=0):
+    """白地にランダムな図形を描いたPNG（行フィルターが混ざるよう、ノイズも入れる）"""
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x0, y0 = rng.randrange(60, size[0] - 60), rng.randrange(40, size[1] - 40)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle((x0, y0, x0 + rng.randrange(50), y0 + rng.randrange(30)), fill=color)
+    for _ in range(2000):
+        img.putpixel((rng.randrange(60, size[0] - 60), rng.randrange(40, size[1] - 40)),
+                     tuple(rng.randrange(256) for _ in range(3)))
+    if mode == "P":
+        img = img.quantize(64)
+    else:
+        img = img.convert(mode)
+    img.save(path, optimize=True)
+    return path
+
+def strip_header(path, rows_per_strip):
+    """しきい値を0にして帯単位で読み、帯の行数を小さくする（ブロックの途中で帯が切れるようにする）"""
+    header = probe_strips(path, max_pixels=0)
+    assert header is not None
+    header["rows_per_strip"] = rows_per_strip
+    return header
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "LA", "P"])
+@pytest.mark.parametrize("rows_per_strip, factor", [(7, 3), (16, 4), (5, 1), (1000, 2)])
+def test_reduce_strips_matches_full_decode(tmp_path, mode, rows_per_strip, factor):
+    path = write_png(tmp_path / "plan.png", mode)
+    header = strip_header(path, rows_per_strip)
+    with Image.open(path) as img:
+        full = img.convert("RGB")
+    for box in [(0, 0) + full.size, (33, 17, 650, 500), (0, 101, 701, 102)]:
+        expected = full.crop(box)
+        expected = expected.reduce(factor) if factor > 1 else expected
+        assert reduce_strips(path, header, box, factor).tobytes() == expected.tobytes()
+
+@pytest.mark.parametrize("mode", ["RGB", "L", "P"])
+def test_strip_content_bbox_matches_full_decode(tmp_path, mode):
+    path = write_png(tmp_path / "plan.png", mode, seed=3)
+    with Image.open(path) as img:
+        expected = content_bbox(img.convert("RGB"))
+    assert strip_content_bbox(path, strip_header(path, 9)) == expected
+
+def test_unsupported_png_is_decoded_whole(tmp_path):
+    # インターレースや16ビットのPNG、しきい値以下のPNGは帯単位にしない
+    path = tmp_path / "small.png"
+    Image.new("RGB", (100, 100), "white").save(path)
+    assert probe_strips(path) is None
+    # PillowはインターレースのPNGを書き出せないため、IHDRのインターレースの値だけ書き換える
+    data = path.read_bytes()
+    ihdr_end = len(PNG_SIGNATURE) + 8 + 13 + 4
+    ihdr = data[len(PNG_SIGNATURE) + 8:ihdr_end - 4]
+    path.write_bytes(PNG_SIGNATURE + png_chunk(b"IHDR", ihdr[:12] + b"\x01") + data[ihdr_end:])
+    assert probe_strips(path, max_pixels=0) is None
+    Image.new("I;16", (100, 100)).save(path)
+    assert probe_strips(path, max_pixels=0) is None
+    Image.new("RGB", (100, 100), "white").save(tmp_path / "photo.jpg")
+    assert probe_strips(tmp_path / "photo.jpg", max_pixels=0) is None
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""余白の自動トリミング（trim）が全画素の差分と同じ範囲を求めること"""
+import random
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+
+from resize_common.trim import content_bbox, dark_content_bbox, trim
+
+def full_frame_bbox(img, bg_color=(255, 255, 255)):
+    """背景画像との差分の範囲（最適化前の方法）"""
+    return ImageChops.difference(img, Image.new(img.mode, img.size, bg_color)).getbbox()
+
+def drawing(size, seed):
+    """白地にランダムな線と点を描いた画像（細い線はプロキシの間引きで見落とされることがある）"""
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    width, height = size
+    for _ in range(rng.randint(1, 4)):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = rng.randrange(width), rng.randrange(height)
+        draw.line((x0, y0, x1, y1), fill=(rng.randrange(200), 0, 0), width=rng.choice([1, 1, 3]))
+    for _ in range(rng.randint(0, 3)):
+        draw.point((rng.randrange(width), rng.randrange(height)), fill=(254, 255, 255))
+    return img
+
+@pytest.mark.parametrize("seed", range(12))
+@pytest.mark.parametrize("size", [(300, 200), (3000, 2100), (2500, 4100)])
+def test_content_bbox_matches_full_frame_diff(size, seed):
+    img = drawing(size, seed)
+    assert content_bbox(img) == full_frame_bbox(img)
+
+@pytest.mark.parametrize("point", [(0, 0), (2999, 2099), (1500, 0), (0, 1049), (1537, 1021)])
+def test_single_pixel_is_found(point):
+    # プロキシでは見えない1画素だけの内容も、外側の帯をフル解像度で調べて見つける
+    img = Image.new("RGB", (3000, 2100), "white")
+    img.putpixel(point, (0, 0, 0))
+    assert content_bbox(img) == (point[0], point[1], point[0] + 1, point[1] + 1)
+
+def test_blank_image_has_no_content():
+    img = Image.new("RGB", (2048, 2048), "white")
+    assert content_bbox(img) is None
+    assert trim(img) is img
+
+def test_tolerance_ignores_noise():
+    img = Image.new("RGB", (2000, 1500), (250, 250, 250))
+    img.paste((0, 0, 0), (400, 300, 900, 700))
+    assert content_bbox(img, (255, 255, 255), tolerance=5) == (400, 300, 900, 700)
+    assert content_bbox(img) == (0, 0, 2000, 1500)
+
+@pytest.mark.parametrize("seed", range(6))
+def test_dark_content_bbox_matches_threshold_mask(seed):
+    img = drawing((2600, 1800), seed)
+    expected = Image.eval(img.convert("L"), lambda v: 255 if v < 235 else 0).getbbox()
+    assert dark_content_bbox(img) == expected